@@ -1,28 +1,92 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, status
+from fastapi.responses import FileResponse, StreamingResponse, Response
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, func, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Iterator, Optional
+from urllib.parse import urlencode
+from datetime import datetime, timedelta
+import asyncio
+import json
+import os
+import tempfile
+import zlib
 
 from . import models, schemas
-from .database import get_db
-from .services import replay, analyzer, demo_data
+from .database import SessionLocal, get_db, get_async_db
+from .services import replay, demo_data, rollups, ingest, pagination, summaries, jobs, event_store, pubsub, correlation, compaction, serialization, archive, detection, search, export
+from .services.rules import load_rules
+from .services.cache import cache as response_cache, CACHE_MAX_VALUE_BYTES
+from . import metrics
 
 api_router = APIRouter()
 
+LIVE_KEEPALIVE_SECONDS = 15
+
+def _in_session(fn, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+async def _run_with_session(fn, *args):
+    # Blocking database work runs on a worker thread with its own sync session, off the event loop
+    return await run_in_threadpool(_in_session, fn, *args)
+
+# --- Shared response cache (see services/cache) ---
+
+def _cache_key(request: Request) -> str:
+    # Route path plus the sorted query string; the profiling flag does not change the result
+    params = sorted((k, v) for k, v in request.query_params.multi_items() if k != "profile")
+    return request.url.path + "?" + urlencode(params)
+
+async def _cached_response(incident_id: str, key: str, generation: int, body: bytes) -> Response:
+    await run_in_threadpool(response_cache.store, incident_id, key, generation, body)
+    return Response(body, media_type="application/json")
+
+def _cached_stream(incident_id: str, key: str, generation: int, chunks: Iterator[bytes]) -> StreamingResponse:
+    # Chunks are passed through as they are encoded and kept for the cache unless the body grows too large
+    def tee():
+        parts, size = [], 0
+        for chunk in chunks:
+            if parts is not None:
+                size += len(chunk)
+                if size <= CACHE_MAX_VALUE_BYTES:
+                    parts.append(chunk)
+                else:
+                    parts = None
+            yield chunk
+        if parts is not None:
+            response_cache.store(incident_id, key, generation, b"".join(parts))
+    return StreamingResponse(tee(), media_type="application/json")
+
 @api_router.post("/demo")
 def generate_demo_dataset(db: Session = Depends(get_db)):
     incident = demo_data.create_demo_incident(db)
-    
-    # Also generate the summary automatically for the demo dataset
-    events = db.query(models.Event).filter(models.Event.incident_id == incident.id).all()
-    summary = analyzer.analyze_incident(incident, events)
-    db.add(summary)
-    db.commit()
-    
-    return {"message": "Demo data generated successfully", "incident_id": incident.id}
+
+    # Also summarize the demo dataset, in the worker pool rather than in the request
+    job = jobs.submit("analysis", jobs.run_analysis, incident.id, incident_id=incident.id)
+
+    return {"message": "Demo data generated successfully", "incident_id": incident.id, "summary_job_id": job["id"]}
+
+async def _get_incident_or_404(db: AsyncSession, incident_id: str, *options) -> models.Incident:
+    result = await db.execute(select(models.Incident).options(*options).where(models.Incident.id == incident_id))
+    incident = result.scalars().first()
+    if not incident:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    return incident
+
+async def _get_writable_incident(db: AsyncSession, incident_id: str) -> models.Incident:
+    incident = await _get_incident_or_404(db, incident_id)
+    if incident.archived_at is not None:
+        raise HTTPException(status_code=409, detail="Incident is archived")
+    return incident
 
 @api_router.post("/incidents", response_model=schemas.IncidentResponse)
-def create_incident(incident: schemas.IncidentCreate, db: Session = Depends(get_db)):
+async def create_incident(incident: schemas.IncidentCreate, db: AsyncSession = Depends(get_async_db)):
     db_incident = models.Incident(
         title=incident.title,
         description=incident.description,
@@ -32,109 +96,664 @@ def create_incident(incident: schemas.IncidentCreate, db: Session = Depends(get_
         start_time=incident.start_time or datetime.utcnow()
     )
     db.add(db_incident)
-    db.commit()
-    db.refresh(db_incident)
-    return db_incident
+    await db.commit()
+    return await _get_incident_or_404(db, db_incident.id, selectinload(models.Incident.events), selectinload(models.Incident.summary))
+
+@api_router.get("/incidents", response_model=schemas.IncidentListPage)
+async def get_incidents(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Newest first, keyset-paginated on (created_at, id)
+    page = select(models.Incident.id)
+    if cursor is not None:
+        try:
+            created_at, incident_id = pagination.decode_keyset(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        page = page.where(or_(
+            models.Incident.created_at < created_at,
+            and_(models.Incident.created_at == created_at, models.Incident.id < incident_id)
+        ))
+    page = page.order_by(models.Incident.created_at.desc(), models.Incident.id.desc()).limit(limit).subquery()
+
+    # Event aggregates for the page from the coarsest rollup level (a handful of
+    # day buckets per incident rather than every event), in the same round trip
+    bucket = models.ReplayBucket
+    stats = (
+        select(
+            bucket.incident_id,
+            func.sum(bucket.event_count).label("event_count"),
+            func.min(bucket.first_timestamp).label("first_event_at"),
+            func.max(bucket.last_timestamp).label("last_event_at"),
+        )
+        .where(bucket.incident_id.in_(select(page.c.id)), bucket.bucket_size == rollups.ROLLUP_BUCKET_SIZES[-1])
+        .group_by(bucket.incident_id)
+        .subquery()
+    )
+    result = await db.execute(
+        select(
+            models.Incident,
+            stats.c.event_count,
+            stats.c.first_event_at,
+            stats.c.last_event_at,
+            models.IncidentSummary.probable_root_cause,
+        )
+        .join(page, page.c.id == models.Incident.id)
+        .outerjoin(stats, stats.c.incident_id == models.Incident.id)
+        .outerjoin(models.IncidentSummary, models.IncidentSummary.incident_id == models.Incident.id)
+        .order_by(models.Incident.created_at.desc(), models.Incident.id.desc())
+    )
+
+    items, event_stats = [], {}
+    for incident, event_count, first_event_at, last_event_at, headline in result.all():
+        item = schemas.IncidentListItem.model_validate(incident)
+        item.summary_headline = headline
+        items.append(item)
+        if event_count is not None:
+            event_stats[item.id] = (event_count, first_event_at, last_event_at)
+
+    # Incidents without that level: those without events, and those the rollup
+    # backfill has not reached yet (python -m app.services.rollups). Their stats
+    # come from the events, or from the retained STATS_BUCKET_SIZE rollup once archived.
+    missing = [item for item in items if item.id not in event_stats]
+    event_stats.update(await db.run_sync(archive.archived_event_stats, [item.id for item in missing if item.archived_at is not None]))
+    live = [item.id for item in missing if item.archived_at is None]
+    if live:
+        result = await db.execute(
+            select(
+                models.Event.incident_id,
+                func.sum(models.Event.occurrences),
+                func.min(models.Event.timestamp),
+                func.max(models.Event.timestamp),
+            )
+            .where(models.Event.incident_id.in_(live))
+            .group_by(models.Event.incident_id)
+        )
+        event_stats.update((incident_id, (count, first, last)) for incident_id, count, first, last in result.all())
+    for item in items:
+        item.event_count, item.first_event_at, item.last_event_at = event_stats.get(item.id, (0, None, None))
 
-@api_router.get("/incidents", response_model=List[schemas.IncidentResponse])
-def get_incidents(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    incidents = db.query(models.Incident).offset(skip).limit(limit).all()
-    return incidents
+    next_cursor = None
+    if len(items) == limit:
+        next_cursor = pagination.encode_keyset(items[-1].created_at, items[-1].id)
+    return schemas.IncidentListPage(items=items, next_cursor=next_cursor)
 
 @api_router.get("/incidents/{incident_id}", response_model=schemas.IncidentResponse)
-def get_incident(incident_id: str, db: Session = Depends(get_db)):
-    incident = db.query(models.Incident).filter(models.Incident.id == incident_id).first()
-    if not incident:
-        raise HTTPException(status_code=404, detail="Incident not found")
-    return incident
+async def get_incident(incident_id: str, db: AsyncSession = Depends(get_async_db)):
+    incident = await _get_incident_or_404(db, incident_id, selectinload(models.Incident.events), selectinload(models.Incident.summary))
+    if incident.archive_path is None:
+        return incident
+    response = schemas.IncidentResponse.model_validate(incident)
+    events = await run_in_threadpool(archive.read_events, incident.archive_path)
+    response.events = [schemas.EventResponse.model_validate(e._asdict()) for e in events]
+    return response
+
+@api_router.get("/incidents/{incident_id}/events", response_model=schemas.EventPage)
+async def get_events(
+    incident_id: str,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    source_type: Optional[str] = None,
+    event_type: Optional[str] = None,
+    actor_id: Optional[str] = None,
+    resource_id: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|columns)$", description="`columns`: one array per field"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Oldest first, keyset-paginated on (timestamp, id)
+    query = select(*serialization.EVENT_COLUMNS).where(models.Event.incident_id == incident_id)
+    if from_ is not None:
+        query = query.where(models.Event.timestamp >= replay.normalize_timestamp(from_))
+    if to is not None:
+        query = query.where(models.Event.timestamp < replay.normalize_timestamp(to))
+    for column, value in (
+        (models.Event.source_type, source_type),
+        (models.Event.event_type, event_type),
+        (models.Event.actor_id, actor_id),
+        (models.Event.resource_id, resource_id),
+    ):
+        if value is not None:
+            query = query.where(column == value)
+    if cursor is not None:
+        try:
+            after_ts, after_id = pagination.decode_keyset(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(or_(
+            models.Event.timestamp > after_ts,
+            and_(models.Event.timestamp == after_ts, models.Event.id > after_id)
+        ))
+
+    result = await db.execute(query.order_by(models.Event.timestamp.asc(), models.Event.id.asc()).limit(limit))
+    rows = result.all()
+    if not rows:
+        # An archived incident's events are served from its archive file
+        archive_path = await db.scalar(select(models.Incident.archive_path).where(models.Incident.id == incident_id))
+        if archive_path is not None:
+            events = await run_in_threadpool(archive.read_events, archive_path)
+            rows = archive.query_events(
+                events,
+                replay.normalize_timestamp(from_),
+                replay.normalize_timestamp(to),
+                {"source_type": source_type, "event_type": event_type, "actor_id": actor_id, "resource_id": resource_id},
+                (after_ts, after_id) if cursor is not None else None,
+                limit
+            )
 
-@api_router.get("/incidents/{incident_id}/events", response_model=List[schemas.EventResponse])
-def get_events(incident_id: str, db: Session = Depends(get_db)):
-    events = db.query(models.Event).filter(models.Event.incident_id == incident_id).order_by(models.Event.timestamp.asc()).all()
-    return events
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = pagination.encode_keyset(rows[-1].timestamp, rows[-1].id)
+    # Rows are encoded directly rather than through EventPage validation
+    if format == "columns":
+        return Response(serialization.event_page_columns(rows, incident_id, next_cursor), media_type="application/json")
+    return StreamingResponse(serialization.event_page_chunks(rows, next_cursor), media_type="application/json")
 
 @api_router.post("/incidents/{incident_id}/events/bulk")
-def ingest_events_bulk(incident_id: str, events: List[schemas.EventCreate], db: Session = Depends(get_db)):
-    # Verify incident exists
-    incident = db.query(models.Incident).filter(models.Incident.id == incident_id).first()
-    if not incident:
-        raise HTTPException(status_code=404, detail="Incident not found")
-    
-    db_events = []
-    for event_in in events:
-        db_event = models.Event(
-            incident_id=incident_id,
-            timestamp=event_in.timestamp,
-            source_type=event_in.source_type,
-            event_type=event_in.event_type,
-            actor_type=event_in.actor_type,
-            actor_id=event_in.actor_id,
-            resource_id=event_in.resource_id,
-            message=event_in.message,
-            event_metadata=event_in.event_metadata
-        )
-        db_events.append(db_event)
-        
-    db.add_all(db_events)
-    db.commit()
-    
-    return {"message": f"Successfully ingested {len(db_events)} events.", "count": len(db_events)}
+async def ingest_events_bulk(
+    incident_id: str,
+    events: List[schemas.EventCreate],
+    dedup: bool = Query(compaction.INGEST_DEDUP),
+    compact_window: int = Query(compaction.INGEST_COMPACT_WINDOW_SECONDS, ge=0, le=86400),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Verify incident exists and still accepts events
+    await _get_writable_incident(db, incident_id)
+    # The writes use their own session; don't hold this connection meanwhile
+    await db.close()
+
+    stats = await _run_with_session(ingest.write_events, incident_id, events, ingest.DEFAULT_BATCH_SIZE, dedup, compact_window)
+
+    return {"message": f"Successfully ingested {stats['accepted']} events.", "count": stats["accepted"], **stats}
+
+@api_router.post("/incidents/{incident_id}/events/stream")
+async def ingest_events_stream(
+    incident_id: str,
+    request: Request,
+    batch_size: int = Query(ingest.DEFAULT_BATCH_SIZE, ge=1, le=100000),
+    dedup: bool = Query(compaction.INGEST_DEDUP),
+    compact_window: int = Query(compaction.INGEST_COMPACT_WINDOW_SECONDS, ge=0, le=86400),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Ingest newline-delimited JSON events (optionally gzip-compressed, via
+    `Content-Encoding: gzip`). Rows are validated as they arrive and written in
+    fixed-size batches; invalid rows are rejected without failing the request.
+    `dedup` drops re-delivered events and `compact_window` (seconds) folds
+    bursts of identical events into one.
+    """
+    await _get_writable_incident(db, incident_id)
+    # Batches are written with their own sessions; don't hold this connection while the body streams in
+    await db.close()
+
+    gzipped = "gzip" in request.headers.get("content-encoding", "").lower()
+    batches = []
+    batch: List[schemas.EventCreate] = []
+    report = {"batch": 1, "accepted": 0, "rejected": 0, "errors": []}
+    line_number = 0
+
+    async def flush():
+        nonlocal batch, report
+        report.update(await _run_with_session(ingest.write_batch, incident_id, batch, dedup, compact_window))
+        batches.append(report)
+        batch = []
+        report = {"batch": report["batch"] + 1, "accepted": 0, "rejected": 0, "errors": []}
+
+    try:
+        async for line in ingest.iter_ndjson_lines(request.stream(), gzipped=gzipped):
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                batch.append(ingest.parse_event_line(line))
+            except ValueError as exc:
+                report["rejected"] += 1
+                if len(report["errors"]) < ingest.MAX_ERRORS_PER_BATCH:
+                    report["errors"].append({"line": line_number, "error": ingest.format_error(exc)})
+            if len(batch) >= batch_size:
+                await flush()
+    except zlib.error:
+        raise HTTPException(status_code=400, detail="Invalid gzip body")
+
+    if batch or report["rejected"]:
+        await flush()
+
+    accepted = sum(b["accepted"] for b in batches)
+    rejected = sum(b["rejected"] for b in batches)
+    return {
+        "message": f"Successfully ingested {accepted} events.",
+        "count": accepted,
+        "duplicates": sum(b["duplicates"] for b in batches),
+        "rejected": rejected,
+        "batches": batches
+    }
+
+@api_router.post("/events/bulk")
+async def ingest_global_events_bulk(events: List[schemas.EventCreate]):
+    """Feed events not tied to an incident to the stream detector (see services/detection)."""
+    return await _run_with_session(detection.detector.process, events)
+
+@api_router.post("/events/stream")
+async def ingest_global_events_stream(
+    request: Request,
+    batch_size: int = Query(ingest.DEFAULT_BATCH_SIZE, ge=1, le=100000)
+):
+    """
+    The global firehose: newline-delimited JSON events (optionally gzipped) for
+    any service. The detector opens an incident per service on onset, attaches
+    its lookback window and following events, and closes it on recovery.
+    """
+    gzipped = "gzip" in request.headers.get("content-encoding", "").lower()
+    totals = {"observed": 0, "attached": 0, "rejected": 0, "opened": [], "resolved": [], "errors": []}
+    batch: List[schemas.EventCreate] = []
+    line_number = 0
+
+    async def flush():
+        nonlocal batch
+        result = await _run_with_session(detection.detector.process, batch)
+        for key in ("observed", "attached", "opened", "resolved"):
+            totals[key] += result[key]
+        batch = []
+
+    try:
+        async for line in ingest.iter_ndjson_lines(request.stream(), gzipped=gzipped):
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                batch.append(ingest.parse_event_line(line))
+            except ValueError as exc:
+                totals["rejected"] += 1
+                if len(totals["errors"]) < ingest.MAX_ERRORS_PER_BATCH:
+                    totals["errors"].append({"line": line_number, "error": ingest.format_error(exc)})
+            if len(batch) >= batch_size:
+                await flush()
+    except zlib.error:
+        raise HTTPException(status_code=400, detail="Invalid gzip body")
+
+    if batch:
+        await flush()
+    return totals
+
+@api_router.get("/detection")
+def get_detection_status():
+    return detection.detector.stats()
 
 @api_router.get("/incidents/{incident_id}/replay", response_model=schemas.ReplayResponse)
-def get_incident_replay(incident_id: str, db: Session = Depends(get_db)):
+async def get_incident_replay(
+    incident_id: str,
+    request: Request,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    bucket_size: Optional[int] = Query(None, ge=1, description="Bucket size in seconds"),
+    max_events_per_bucket: Optional[int] = Query(None, ge=0),
+    max_buckets: Optional[int] = Query(None, ge=1, description="Page size, in buckets"),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|columns)$", description="`columns`: one array per field"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Served from the shared cache until the next ingest into this incident
+    cache_key = _cache_key(request)
+    cached, generation = await run_in_threadpool(response_cache.lookup, incident_id, cache_key)
+    if cached is not None:
+        return Response(cached, media_type="application/json")
+
+    incident = await _get_incident_or_404(db, incident_id)
+
+    async def respond(response: schemas.ReplayResponse):
+        if format == "columns":
+            body = serialization.replay_response_columns(response)
+        else:
+            body = response.model_dump_json().encode()
+        return await _cached_response(incident_id, cache_key, generation, body)
+
+    def stream(rows, **options):
+        # Events are encoded straight from rows, bucket by bucket
+        chunks = serialization.replay_chunks(incident_id, rows, bucket_seconds=bucket_size, max_events_per_bucket=max_events_per_bucket, format=format, **options)
+        return _cached_stream(incident_id, cache_key, generation, chunks)
+
+    windowed = from_ is not None or to is not None or max_buckets is not None or cursor is not None
+    counts_only = max_events_per_bucket == 0
+    async def archived_rows(start=None, end=None):
+        events = await run_in_threadpool(archive.read_events, incident.archive_path)
+        return archive.window(events, start, end)
+
+    if not windowed and not counts_only:
+        with metrics.stage("replay.query"):
+            if incident.archive_path:
+                rows = await archived_rows()
+            else:
+                result = await db.execute(select(*serialization.EVENT_COLUMNS).where(models.Event.incident_id == incident_id).order_by(models.Event.timestamp.asc()))
+                rows = result.all()
+        return stream(rows)
+
+    window_start = replay.normalize_timestamp(from_)
+    window_end = replay.normalize_timestamp(to)
+    if cursor is not None:
+        try:
+            window_start, bucket_size = replay.decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    with metrics.stage("replay.markers"):
+        markers = await _run_with_session(rollups.incident_markers, incident_id)
+    if markers["first_timestamp"] is None:
+        return await respond(replay.generate_replay(incident, [], bucket_seconds=bucket_size, markers=markers))
+
+    if bucket_size is None:
+        span_start = max(window_start, markers["first_timestamp"]) if window_start else markers["first_timestamp"]
+        span_end = min(window_end, markers["last_timestamp"]) if window_end else markers["last_timestamp"]
+        bucket_size = replay.choose_bucket_seconds(max((span_end - span_start).total_seconds(), 0))
+
+    page_start = replay.bucket_floor(max(window_start, markers["first_timestamp"]) if window_start else markers["first_timestamp"], bucket_size)
+    page_end = window_end
+    next_cursor = None
+    if max_buckets is not None:
+        page_limit = page_start + timedelta(seconds=bucket_size * max_buckets)
+        if (page_end is None or page_limit < page_end) and page_limit <= markers["last_timestamp"]:
+            page_end = page_limit
+            next_cursor = replay.encode_cursor(page_limit, bucket_size)
+
+    if counts_only and bucket_size in rollups.ROLLUP_BUCKET_SIZES and markers["rollup"]:
+        with metrics.stage("replay.query"):
+            rollup_buckets = await _run_with_session(rollups.load_buckets, incident_id, bucket_size, page_start, page_end)
+        return await respond(replay.replay_from_rollups(incident, rollup_buckets, bucket_size, markers, next_cursor=next_cursor))
+    if counts_only:
+        # Other bucket sizes (and incidents without a backfilled rollup) are counted straight off the in-memory columns
+        with metrics.stage("replay.columns_load"):
+            if incident.archive_path:
+                columns = await run_in_threadpool(archive.read_columns, incident.archive_path)
+            else:
+                columns = await _run_with_session(event_store.store.get, incident_id)
+        # Bucketing every event of the window is CPU-bound; keep it off the event loop
+        response = await run_in_threadpool(replay.replay_from_columns, incident, columns, bucket_size, page_start, page_end, markers, next_cursor=next_cursor)
+        return await respond(response)
+
+    query_start = window_start if window_start and window_start > page_start else page_start
+    with metrics.stage("replay.query"):
+        if incident.archive_path:
+            rows = await archived_rows(query_start, page_end)
+        else:
+            query = select(*serialization.EVENT_COLUMNS).where(
+                models.Event.incident_id == incident_id,
+                models.Event.timestamp >= query_start
+            )
+            if page_end is not None:
+                query = query.where(models.Event.timestamp < page_end)
+            result = await db.execute(query.order_by(models.Event.timestamp.asc()))
+            rows = result.all()
+
+    return stream(rows, markers=markers, next_cursor=next_cursor)
+
+@api_router.get("/incidents/{incident_id}/replay/overview", response_model=schemas.ReplayOverviewResponse)
+async def get_incident_replay_overview(
+    incident_id: str,
+    request: Request,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    target_buckets: int = Query(120, ge=1, le=1000, description="Most buckets to return; picks the rollup level"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Multi-resolution, counts-only replay. Without a window: the whole incident
+    at the finest rollup level that fits in `target_buckets`. Zoom in by
+    passing a bucket's start and end (or any window) as `from`/`to`, down to
+    one-second buckets. Every level is read from the rollup pyramid, so a zoom
+    step reads at most `target_buckets` rows however long the incident is.
+    """
+    window_start = replay.normalize_timestamp(from_)
+    window_end = replay.normalize_timestamp(to)
+    if window_start is not None and window_end is not None and window_end <= window_start:
+        raise HTTPException(status_code=400, detail="`to` must be after `from`")
+
+    cache_key = _cache_key(request)
+    cached, generation = await run_in_threadpool(response_cache.lookup, incident_id, cache_key)
+    if cached is not None:
+        return Response(cached, media_type="application/json")
+
+    incident = await _get_incident_or_404(db, incident_id)
+    with metrics.stage("replay.markers"):
+        markers = await _run_with_session(rollups.incident_markers, incident_id)
+    if markers["first_timestamp"] is None:
+        response = replay.replay_overview(incident, [], None, rollups.ROLLUP_BUCKET_SIZES, markers, window_start, window_end)
+        return await _cached_response(incident_id, cache_key, generation, response.model_dump_json().encode())
+
+    finest = rollups.ROLLUP_BUCKET_SIZES[0]
+    if window_start is None:
+        window_start = markers["first_timestamp"]
+    if window_end is None:
+        window_end = replay.bucket_floor(markers["last_timestamp"], finest) + timedelta(seconds=finest)
+    bucket_size = rollups.choose_level(window_start, window_end, target_buckets)
+    load = rollups.load_buckets if markers["rollup"] else rollups.compute_buckets
+    with metrics.stage("replay.query"):
+        rollup_buckets = await _run_with_session(load, incident_id, bucket_size, replay.bucket_floor(window_start, bucket_size), window_end)
+    response = replay.replay_overview(incident, rollup_buckets, bucket_size, rollups.ROLLUP_BUCKET_SIZES, markers, window_start, window_end)
+    return await _cached_response(incident_id, cache_key, generation, response.model_dump_json().encode())
+
+@api_router.get("/incidents/{incident_id}/replay/live")
+async def stream_incident_replay(
+    incident_id: str,
+    request: Request,
+    bucket_size: int = Query(60, description="Bucket size in seconds; must be a rollup size"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Server-Sent Events feed of an incident's replay: one `snapshot` event with
+    the current counts-only buckets, then a `delta` event per committed ingest
+    batch carrying the new events and the updated buckets. Clients that fall
+    too far behind receive a `dropped` event and are disconnected.
+    """
+    if bucket_size not in rollups.ROLLUP_BUCKET_SIZES:
+        raise HTTPException(status_code=400, detail=f"bucket_size must be one of {list(rollups.ROLLUP_BUCKET_SIZES)}")
+    incident = await _get_incident_or_404(db, incident_id)
+
+    # Subscribe before reading the snapshot so no batch falls in between
+    subscription = pubsub.broker.subscribe(pubsub.incident_topic(incident_id))
+    try:
+        markers = await _run_with_session(rollups.incident_markers, incident_id)
+        load = rollups.load_buckets if markers["rollup"] else rollups.compute_buckets
+        rollup_buckets = await _run_with_session(load, incident_id, bucket_size)
+        snapshot = replay.replay_from_rollups(incident, rollup_buckets, bucket_size, markers)
+    except Exception:
+        pubsub.broker.unsubscribe(subscription)
+        raise
+    # Don't hold a pooled connection for the lifetime of the stream
+    await db.close()
+
+    def sse(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    async def events():
+        try:
+            yield sse("snapshot", snapshot.model_dump(mode="json"))
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), timeout=LIVE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                if message is pubsub.DROPPED:
+                    yield sse("dropped", {"reason": "client too slow"})
+                    break
+                yield sse("delta", {
+                    "event_count": message["event_count"],
+                    "events": message["events"],
+                    "truncated": message["truncated"],
+                    "buckets": message["buckets"].get(bucket_size, []),
+                })
+        finally:
+            pubsub.broker.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@api_router.post("/incidents/{incident_id}/summarize", response_model=schemas.IncidentSummaryResponse)
+def summarize_incident(incident_id: str, force: bool = False, db: Session = Depends(get_db)):
+    # Shared cache first; otherwise recomputes only if events were ingested since the last summary (or force=true)
+    cached, generation = response_cache.lookup(incident_id, "summary")
+    if cached is not None and not force:
+        return Response(cached, media_type="application/json")
+    summary, _ = summaries.summarize(db, incident_id, force=force)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    body = schemas.IncidentSummaryResponse.model_validate(summary).model_dump_json().encode()
+    # A recomputed summary bumps the generation, so only an unchanged one is stored here
+    response_cache.store(incident_id, "summary", generation, body)
+    return Response(body, media_type="application/json")
+
+@api_router.post("/incidents/{incident_id}/summarize/jobs", response_model=schemas.JobResponse, status_code=status.HTTP_202_ACCEPTED)
+def submit_summarize_job(incident_id: str, force: bool = False, db: Session = Depends(get_db)):
     incident = db.query(models.Incident).filter(models.Incident.id == incident_id).first()
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
-        
-    events = db.query(models.Event).filter(models.Event.incident_id == incident_id).all()
-    return replay.generate_replay(incident, events)
 
-@api_router.post("/incidents/{incident_id}/summarize", response_model=schemas.IncidentSummaryResponse)
-def summarize_incident(incident_id: str, db: Session = Depends(get_db)):
+    # Serve fresh summaries without a round trip through the worker pool
+    if incident.archive_path:
+        fresh = incident.summary is not None
+    else:
+        fresh = summaries.is_fresh(incident.summary, event_store.event_watermark(db, incident_id))
+    if not force and fresh:
+        now = datetime.utcnow()
+        return schemas.JobResponse(
+            id="cached", kind="analysis", incident_id=incident_id, status="succeeded",
+            submitted_at=now, finished_at=now, result={"cache_hit": True}
+        )
+    return jobs.submit("analysis", jobs.run_analysis, incident_id, force, incident_id=incident_id)
+
+@api_router.post("/archive/jobs", response_model=schemas.JobResponse, status_code=status.HTTP_202_ACCEPTED)
+def submit_retention_job(older_than_days: int = Query(archive.RETENTION_DAYS, ge=0)):
+    """Archive the events of resolved incidents that ended more than `older_than_days` ago."""
+    return jobs.submit("retention", jobs.run_retention, older_than_days)
+
+@api_router.get("/correlations", response_model=schemas.CorrelationResponse)
+def get_correlations(
+    event_type: str,
+    actor_id: Optional[str] = None,
+    resource_id: Optional[str] = None,
+    exclude_incident_id: Optional[str] = None,
+    lookback_days: Optional[int] = Query(correlation.DEFAULT_LOOKBACK_DAYS, ge=1),
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    since = datetime.utcnow() - timedelta(days=lookback_days) if lookback_days else None
+    return correlation.lookup(db, actor_id, resource_id, event_type, exclude_incident_id=exclude_incident_id, since=since, limit=limit)
+
+@api_router.get("/incidents/{incident_id}/correlations", response_model=List[schemas.CorrelationResponse])
+def get_incident_correlations(
+    incident_id: str,
+    lookback_days: Optional[int] = Query(correlation.DEFAULT_LOOKBACK_DAYS, ge=1),
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    # Recurring triggers: this incident's trigger-type events seen in other incidents
     incident = db.query(models.Incident).filter(models.Incident.id == incident_id).first()
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
-        
-    events = db.query(models.Event).filter(models.Event.incident_id == incident_id).all()
-    
-    # Generate summary
-    summary_model = analyzer.analyze_incident(incident, events)
-    
-    # Store or update in DB
-    existing_summary = db.query(models.IncidentSummary).filter(models.IncidentSummary.incident_id == incident_id).first()
-    if existing_summary:
-        existing_summary.probable_root_cause = summary_model.probable_root_cause
-        existing_summary.causal_chain = summary_model.causal_chain
-        existing_summary.key_events = summary_model.key_events
-        existing_summary.recommendations = summary_model.recommendations
-        existing_summary.confidence_score = summary_model.confidence_score
-        existing_summary.generated_at = datetime.utcnow()
-        summary_to_return = existing_summary
-    else:
-        db.add(summary_model)
-        summary_to_return = summary_model
-        
-    db.commit()
-    db.refresh(summary_to_return)
-    return summary_to_return
+    since = incident.start_time - timedelta(days=lookback_days) if lookback_days else None
+    trigger_types = load_rules().trigger_by_event_type.keys()
+    return correlation.incident_correlations(db, incident_id, trigger_types, since=since, limit=limit)
+
+@api_router.get("/search", response_model=schemas.EventSearchResponse)
+def search_events(
+    q: Optional[str] = Query(None, description="Terms to find in message, event type, resource and metadata; all must match"),
+    metadata: Optional[str] = Query(None, description='JSON object the event metadata must contain, e.g. {"max_replicas": 10}'),
+    incident_id: Optional[str] = None,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    source_type: Optional[str] = None,
+    event_type: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=search.MAX_RESULTS),
+    db: Session = Depends(get_db)
+):
+    metadata_filter = None
+    if metadata is not None:
+        try:
+            metadata_filter = json.loads(metadata)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="metadata must be a JSON object")
+        if not isinstance(metadata_filter, dict):
+            raise HTTPException(status_code=400, detail="metadata must be a JSON object")
+    try:
+        rows = search.search_events(
+            db, q, metadata_filter, incident_id,
+            replay.normalize_timestamp(from_), replay.normalize_timestamp(to),
+            source_type, event_type, limit
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    fields = serialization.EVENT_FIELDS + ("rank",)
+    return schemas.EventSearchResponse(items=[schemas.EventSearchHit.model_validate(dict(zip(fields, row))) for row in rows])
+
+@api_router.get("/jobs/{job_id}", response_model=schemas.JobResponse)
+def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 @api_router.get("/incidents/{incident_id}/export")
-def export_incident_report(incident_id: str, db: Session = Depends(get_db)):
-    incident = db.query(models.Incident).filter(models.Incident.id == incident_id).first()
+def export_incident_report(
+    incident_id: str,
+    format: str = Query("report", pattern="^(report|ndjson|csv|parquet)$", description="`report`: headline summary; otherwise a full export (see services/export)"),
+    db: Session = Depends(get_db)
+):
+    incident, summary = export.load_incident(db, incident_id)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
-        
-    summary = db.query(models.IncidentSummary).filter(models.IncidentSummary.incident_id == incident_id).first()
-    
-    return {
-        "incident_id": incident.id,
-        "title": incident.title,
-        "environment": incident.environment,
-        "severity": incident.severity,
-        "duration_minutes": ((incident.end_time - incident.start_time).total_seconds() / 60) if incident.end_time else None,
-        "summary": {
-            "root_cause": summary.probable_root_cause if summary else "Not generated",
-            "recommendations": summary.recommendations if summary else [],
-            "key_events": summary.key_events if summary else []
+
+    if format == "report":
+        return {
+            "incident_id": incident.id,
+            "title": incident.title,
+            "environment": incident.environment,
+            "severity": incident.severity,
+            "duration_minutes": ((incident.end_time - incident.start_time).total_seconds() / 60) if incident.end_time else None,
+            "summary": {
+                "root_cause": summary.probable_root_cause if summary else "Not generated",
+                "recommendations": summary.recommendations if summary else [],
+                "key_events": summary.key_events if summary else []
+            }
         }
-    }
+
+    try:
+        export.check_format(format)
+    except ValueError as exc:
+        raise HTTPException(status_code=501, detail=str(exc))
+    filename = f"{incident_id}.{format}"
+    if format == "parquet":
+        # Parquet needs a seekable file: written to a temp file batch by batch, removed once sent
+        fd, path = tempfile.mkstemp(suffix=".parquet")
+        os.close(fd)
+        export.write_parquet(db, incident, summary, path)
+        return FileResponse(path, media_type=export.MEDIA_TYPES[format], filename=filename, background=BackgroundTask(os.unlink, path))
+
+    chunks = export.ndjson_chunks if format == "ndjson" else export.csv_chunks
+
+    def body():
+        # The request's session is closed before the body streams, so the cursor gets its own
+        stream_db = SessionLocal()
+        try:
+            yield from chunks(stream_db, incident, summary)
+        finally:
+            stream_db.close()
+    return StreamingResponse(body(), media_type=export.MEDIA_TYPES[format], headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@api_router.post("/exports", response_model=schemas.BatchExportResponse, status_code=status.HTTP_202_ACCEPTED)
+def submit_batch_export(request: schemas.BatchExportRequest, db: Session = Depends(get_db)):
+    """Export many incidents in parallel on the worker pool, one file per incident under EXPORT_DIR."""
+    try:
+        export.check_format(request.format)
+    except ValueError as exc:
+        raise HTTPException(status_code=501, detail=str(exc))
+    return export.submit_batch(db, request)
+
+@api_router.get("/exports/{batch_id}", response_model=schemas.BatchExportResponse)
+def get_batch_export(batch_id: str = Path(..., pattern="^[0-9a-f-]{36}$")):
+    batch = export.batch_status(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return batch
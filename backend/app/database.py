@@ -1,22 +1,88 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from . import metrics
 
 SQLALCHEMY_DATABASE_URL = os.getenv(
-    "SYNC_DATABASE_URL", 
+    "SYNC_DATABASE_URL",
     "sqlite:///./incident_recorder.db"
 )
 
-# SQLite needs specific connect_args to avoid thread issues
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+def to_async_url(url: str) -> str:
+    # Derive the async driver URL from a sync one (sqlite -> aiosqlite, postgres -> asyncpg)
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2:", "postgresql:", "postgres:"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg:" + url[len(prefix):]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("DATABASE_URL", to_async_url(SQLALCHEMY_DATABASE_URL))
+
+# Connection pool sizing (ignored for SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    # Queue pools time checkout waits for /metrics (in-memory SQLite keeps its singleton pool)
+    options = {}
+    if ":memory:" not in url:
+        options["poolclass"] = metrics.TimedAsyncAdaptedQueuePool if is_async else metrics.TimedQueuePool
+    # SQLite needs specific connect_args to avoid thread issues
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False}
+        return options
+    options.update({
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": True,
+    })
+    return options
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True))
+metrics.instrument_engine(engine, "sync")
+metrics.instrument_engine(async_engine.sync_engine, "async")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
 
 Base = declarative_base()
 
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_migrations(revision: str = "head"):
+    """`alembic upgrade head` from code (benchmarks, scripts). Run once per deploy, never from a worker."""
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "migrations"))
+    command.upgrade(config, revision)
+
+def upsert(db, table):
+    """An INSERT supporting on_conflict_do_update/do_nothing on the session's dialect (SQLite or Postgres)."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+def least(db, a, b):
+    """LEAST(a, b) ignoring NULLs on both dialects (SQLite's scalar min() is NULL if either is)."""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.least(a, b)
+    return func.min(func.coalesce(a, b), func.coalesce(b, a))
+
+def greatest(db, a, b):
+    """GREATEST(a, b) ignoring NULLs on both dialects."""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.greatest(a, b)
+    return func.max(func.coalesce(a, b), func.coalesce(b, a))
+
 # Dependency
 def get_db():
     db = SessionLocal()
@@ -24,3 +90,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
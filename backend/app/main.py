@@ -1,15 +1,27 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, Base
+from fastapi.responses import PlainTextResponse
 from .api import api_router
+from .metrics import registry, MetricsMiddleware, Gauge
+from .profiler import profiler
+from .services import jobs, event_store, detection
 
-# Create all tables in the database
-Base.metadata.create_all(bind=engine)
+# The schema is managed by Alembic as a separate deploy step (`alembic upgrade
+# head`, run once before starting any worker), so starting N workers never
+# races on DDL. Startup itself does no I/O: engines, the job pool, the
+# response cache and the stream detector all connect on first use.
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    jobs.shutdown()
 
 app = FastAPI(
     title="Incident Flight Recorder API",
     description="API for ingesting and replaying cloud incidents",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # Set all CORS enabled origins
@@ -19,10 +31,38 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Profile-Id"],
 )
+# Outermost, so latency includes CORS handling and the full streamed body
+app.add_middleware(MetricsMiddleware, profiler=profiler)
 
 app.include_router(api_router, prefix="/api")
 
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
+
+registry.register(Gauge(
+    "ifr_event_store_bytes", "Estimated size of the in-process columnar event store.",
+    lambda: {(): event_store.store.stats()["bytes"]}
+))
+registry.register(Gauge(
+    "ifr_event_store_incidents", "Incidents held in the in-process columnar event store.",
+    lambda: {(): event_store.store.stats()["incidents"]}
+))
+registry.register(Gauge(
+    "ifr_detection_windows", "Service windows tracked by the stream detector.",
+    lambda: {(): len(detection.detector.windows)}
+))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/profiles/{profile_id}", response_class=PlainTextResponse)
+def profile_report(profile_id: str):
+    # Folded stacks of a request sampled with `X-Profile: 1` (PROFILING_ENABLED only)
+    session = profiler.get(profile_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(session.folded())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Integer, Float, ForeignKey, JSON
+from sqlalchemy import Column, String, DateTime, Integer, Float, ForeignKey, JSON, Index, event
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 import sqlalchemy.types as types
@@ -23,15 +23,28 @@ class Incident(Base):
     status = Column(String, default="open", nullable=False) # open, resolved
     severity = Column(Integer, default=3, nullable=False) # 1-5
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # Set once the retention job has moved the events to a compressed archive file
+    archived_at = Column(DateTime, nullable=True)
+    archive_path = Column(String, nullable=True)
+    # resource_id the stream detector opened this incident for; None for manually created incidents
+    detection_key = Column(String, nullable=True)
 
     events = relationship("Event", back_populates="incident", cascade="all, delete-orphan")
     summary = relationship("IncidentSummary", back_populates="incident", uselist=False, cascade="all, delete-orphan")
+    replay_buckets = relationship("ReplayBucket", back_populates="incident", cascade="all, delete-orphan")
+    correlation_postings = relationship("CorrelationPosting", back_populates="incident", cascade="all, delete-orphan")
+    event_hashes = relationship("EventHash", back_populates="incident", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_incidents_created_at_id", "created_at", "id"), # keyset pagination of the incident list
+        Index("ix_incidents_detection_key_status", "detection_key", "status"), # detector restores open incidents
+    )
 
 class Event(Base):
     __tablename__ = "events"
 
     id = Column(String, primary_key=True, default=generate_uuid, index=True)
-    incident_id = Column(String, ForeignKey("incidents.id"), index=True)
+    incident_id = Column(String, ForeignKey("incidents.id"))
     timestamp = Column(DateTime, nullable=False, index=True)
     source_type = Column(String, nullable=False) # e.g. cloud, cicd, app, iam, k8s
     event_type = Column(String, nullable=False) # e.g. deploy_started, config_change, pod_crash
@@ -39,10 +52,81 @@ class Event(Base):
     actor_id = Column(String, nullable=True) 
     resource_id = Column(String, nullable=True)
     message = Column(String, nullable=True)
-    event_metadata = Column(JSON, nullable=True) # JSON column for arbitrary data
+    event_metadata = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True) # JSON column for arbitrary data (JSONB on Postgres)
+    # Ingest dedup/compaction: content hash (or burst hash for compacted rows),
+    # and for a compacted burst the number of events folded in and the last one's time
+    content_hash = Column(String, nullable=True)
+    occurrences = Column(Integer, default=1, server_default="1", nullable=False)
+    last_timestamp = Column(DateTime, nullable=True)
 
     incident = relationship("Incident", back_populates="events")
 
+    __table_args__ = (
+        # Keyset pagination within an incident, plus the common drill-down filters
+        Index("ix_events_incident_timestamp_id", "incident_id", "timestamp", "id"),
+        Index("ix_events_incident_event_type_timestamp", "incident_id", "event_type", "timestamp"),
+        Index("ix_events_incident_resource_timestamp", "incident_id", "resource_id", "timestamp"),
+        # One stored row per content or burst hash. Postgres partitions require the
+        # partition key in unique indexes, so there migration 0009 keeps `timestamp`
+        # in it (content hashes cover the timestamp; bursts rely on the ingest lookup)
+        Index("ux_events_incident_content_hash", "incident_id", "content_hash", unique=True),
+    )
+
+class EventHash(Base):
+    __tablename__ = "event_hashes"
+
+    # Ledger of the content hashes (dedup/compaction) and burst hashes (compaction)
+    # ingested per incident. Unpartitioned, so its key is the same on every backend
+    # and concurrent ingests claim a hash with INSERT ... ON CONFLICT. Burst hashes
+    # point at the stored burst row and its timestamp; content hashes only mark an
+    # event as seen, whether it was stored as is or folded into a burst.
+    incident_id = Column(String, ForeignKey("incidents.id"), primary_key=True)
+    content_hash = Column(String, primary_key=True)
+    event_id = Column(String, nullable=True)
+    timestamp = Column(DateTime, nullable=True)
+
+    incident = relationship("Incident", back_populates="event_hashes")
+
+# Full-text index over message, event type, resource and metadata, kept up to
+# date by the database at insert/update/delete (see services/search.py and
+# migrations 0008, 0011): an external-content FTS5 table plus triggers on SQLite, a
+# generated tsvector column with GIN indexes on Postgres. The FTS5 rows are keyed
+# on events.search_rowid, an integer the insert trigger assigns, rather than the
+# implicit rowid of the String-keyed events table, which VACUUM and batch
+# migrations that recreate the table may renumber. Such batch migrations must
+# still recreate the triggers; the index itself stays valid.
+EVENT_SEARCH_COLUMNS = "message, event_type, resource_id, event_metadata"
+EVENT_SEARCH_DDL = {
+    "sqlite": (
+        "ALTER TABLE events ADD COLUMN search_rowid INTEGER",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_events_search_rowid ON events (search_rowid)",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5({EVENT_SEARCH_COLUMNS}, content='events', content_rowid='search_rowid')",
+        f"""CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN
+            UPDATE events SET search_rowid = (SELECT coalesce(max(search_rowid), 0) + 1 FROM events) WHERE rowid = new.rowid;
+            INSERT INTO events_fts(rowid, {EVENT_SEARCH_COLUMNS}) SELECT search_rowid, {EVENT_SEARCH_COLUMNS} FROM events WHERE rowid = new.rowid;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN
+            INSERT INTO events_fts(events_fts, rowid, {EVENT_SEARCH_COLUMNS}) VALUES ('delete', old.search_rowid, old.message, old.event_type, old.resource_id, old.event_metadata);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE OF {EVENT_SEARCH_COLUMNS} ON events BEGIN
+            INSERT INTO events_fts(events_fts, rowid, {EVENT_SEARCH_COLUMNS}) VALUES ('delete', old.search_rowid, old.message, old.event_type, old.resource_id, old.event_metadata);
+            INSERT INTO events_fts(rowid, {EVENT_SEARCH_COLUMNS}) VALUES (new.search_rowid, new.message, new.event_type, new.resource_id, new.event_metadata);
+        END""",
+    ),
+    "postgresql": (
+        """ALTER TABLE events ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+            to_tsvector('simple', coalesce(message, '') || ' ' || event_type || ' ' || coalesce(resource_id, '') || ' ' || coalesce(event_metadata::text, ''))
+        ) STORED""",
+        "CREATE INDEX IF NOT EXISTS ix_events_search_vector ON events USING gin (search_vector)",
+        "CREATE INDEX IF NOT EXISTS ix_events_metadata ON events USING gin (event_metadata jsonb_path_ops)",
+    ),
+}
+
+@event.listens_for(Event.__table__, "after_create")
+def create_event_search_index(target, connection, **kw):
+    for statement in EVENT_SEARCH_DDL.get(connection.dialect.name, ()):
+        connection.exec_driver_sql(statement)
+
 class IncidentSummary(Base):
     __tablename__ = "incident_summaries"
 
@@ -53,5 +137,47 @@ class IncidentSummary(Base):
     key_events = Column(JSON, nullable=True)
     recommendations = Column(JSON, nullable=True)
     confidence_score = Column(Float, nullable=True) # 0 to 1
+    # Ingest watermark of the events the summary was computed from
+    source_event_count = Column(Integer, nullable=True)
+    source_last_event_at = Column(DateTime, nullable=True)
 
     incident = relationship("Incident", back_populates="summary")
+
+class ReplayBucket(Base):
+    __tablename__ = "replay_buckets"
+
+    # Rollup of events per (incident, bucket size, bucket start), maintained at ingest
+    incident_id = Column(String, ForeignKey("incidents.id"), primary_key=True)
+    bucket_size = Column(Integer, primary_key=True) # seconds
+    bucket_start = Column(DateTime, primary_key=True) # aligned to multiples of bucket_size since the epoch
+    event_count = Column(Integer, default=0, nullable=False)
+    counts_by_source = Column(JSON, nullable=True)
+    counts_by_event_type = Column(JSON, nullable=True)
+    flags = Column(Integer, default=0, nullable=False) # OR of replay.classify_event_type over the bucket
+    phase = Column(String, nullable=False, default="pre-incident")
+    first_timestamp = Column(DateTime, nullable=True)
+    last_timestamp = Column(DateTime, nullable=True)
+    first_error_at = Column(DateTime, nullable=True)
+    first_alert_at = Column(DateTime, nullable=True)
+    first_recovery_at = Column(DateTime, nullable=True)
+
+    incident = relationship("Incident", back_populates="replay_buckets")
+
+class CorrelationPosting(Base):
+    __tablename__ = "correlation_postings"
+
+    # Inverted index: (actor_id, resource_id, event_type) -> incidents it occurred in.
+    # Missing actor/resource ids are stored as "" so they can be part of the key.
+    actor_id = Column(String, primary_key=True)
+    resource_id = Column(String, primary_key=True)
+    event_type = Column(String, primary_key=True)
+    incident_id = Column(String, ForeignKey("incidents.id"), primary_key=True)
+    first_seen = Column(DateTime, nullable=False)
+    last_seen = Column(DateTime, nullable=False)
+    occurrences = Column(Integer, default=0, nullable=False)
+
+    incident = relationship("Incident", back_populates="correlation_postings")
+
+    __table_args__ = (
+        Index("ix_correlation_postings_incident_id", "incident_id"),
+    )
@@ -0,0 +1,91 @@
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, Counter
+from typing import Dict, Optional
+
+# Opt-in sampling profiler. When PROFILING_ENABLED is set, a request carrying
+# `X-Profile: 1` (or `?profile=1`) is sampled: a background thread snapshots
+# the stacks of all busy threads every PROFILE_INTERVAL_MS while the request
+# runs. The response carries an X-Profile-Id header; the folded stacks
+# (flamegraph.pl / speedscope input) are served at /metrics/profiles/{id}.
+# Samples are process-wide, so concurrent requests show up in each other's profiles.
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0").lower() in ("1", "true", "yes")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+MAX_STORED_PROFILES = 20
+MAX_STACK_DEPTH = 64
+
+# Leaf frames in these modules mean the thread is parked, not working
+_IDLE_MODULES = ("threading.py", "selectors.py", "queue.py", "base_events.py", "thread.py")
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+class ProfileSession:
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.id[:8]}", daemon=True)
+
+    def _run(self):
+        interval = PROFILE_INTERVAL_MS / 1000.0
+        own = threading.get_ident()
+        while not self._stop.wait(interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or frame.f_code.co_filename.endswith(_IDLE_MODULES):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def folded(self) -> str:
+        header = f"# {self.method} {self.path} {self.elapsed * 1000:.1f}ms, {self.sample_count} samples every {PROFILE_INTERVAL_MS}ms\n"
+        return header + "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+class Profiler:
+    def __init__(self, enabled: bool = PROFILING_ENABLED):
+        self.enabled = enabled
+        self._profiles: "OrderedDict[str, ProfileSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, scope) -> Optional[ProfileSession]:
+        if not self.enabled or not self._requested(scope):
+            return None
+        session = ProfileSession(scope["method"], scope["path"])
+        session._thread.start()
+        return session
+
+    def stop(self, session: ProfileSession):
+        session._stop.set()
+        session._thread.join()
+        session.elapsed = time.perf_counter() - session.started
+        with self._lock:
+            self._profiles[session.id] = session
+            while len(self._profiles) > MAX_STORED_PROFILES:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[ProfileSession]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def _requested(self, scope) -> bool:
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile" and value in (b"1", b"true"):
+                return True
+        query = scope.get("query_string", b"").split(b"&")
+        return b"profile=1" in query or b"profile=true" in query
+
+profiler = Profiler()
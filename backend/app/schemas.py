@@ -14,6 +14,8 @@ class EventBase(BaseModel):
     resource_id: Optional[str] = None
     message: Optional[str] = None
     event_metadata: Optional[Dict[str, Any]] = None
+    occurrences: int = Field(1, ge=1) # > 1 for a compacted burst of identical events
+    last_timestamp: Optional[datetime] = None # last event of a compacted burst
 
 class EventCreate(EventBase):
     pass
@@ -24,6 +26,16 @@ class EventResponse(EventBase):
 
     model_config = ConfigDict(from_attributes=True, populate_by_name=True)
 
+class EventPage(BaseModel):
+    items: List[EventResponse]
+    next_cursor: Optional[str] = None # pass back as `cursor` to fetch the next page
+
+class EventSearchHit(EventResponse):
+    rank: Optional[float] = None # relevance, higher is better; None for metadata-only searches
+
+class EventSearchResponse(BaseModel):
+    items: List[EventSearchHit]
+
 # --- INCIDENT SUMMARY SCHEMAS ---
 
 class IncidentSummaryResponse(BaseModel):
@@ -34,9 +46,63 @@ class IncidentSummaryResponse(BaseModel):
     key_events: Optional[List[Any]] = None
     recommendations: Optional[List[str]] = None
     confidence_score: Optional[float] = None
+    source_event_count: Optional[int] = None
+    source_last_event_at: Optional[datetime] = None
 
     model_config = ConfigDict(from_attributes=True)
 
+# --- CORRELATION SCHEMAS ---
+
+class CorrelatedIncident(BaseModel):
+    incident_id: str
+    title: str
+    first_seen: datetime
+    last_seen: datetime
+    occurrences: int
+
+class CorrelationResponse(BaseModel):
+    actor_id: Optional[str] = None
+    resource_id: Optional[str] = None
+    event_type: str
+    total: int # other incidents with this (actor_id, resource_id, event_type)
+    matches: List[CorrelatedIncident]
+
+# --- JOB SCHEMAS ---
+
+class JobResponse(BaseModel):
+    id: str
+    kind: str
+    incident_id: Optional[str] = None
+    status: str # pending, running, succeeded, failed
+    submitted_at: datetime
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+
+# --- EXPORT SCHEMAS ---
+
+class BatchExportRequest(BaseModel):
+    # Incidents to export: the listed ids and/or those matching the filters
+    incident_ids: Optional[List[str]] = None
+    status: Optional[str] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    format: str = Field("ndjson", pattern="^(ndjson|csv|parquet)$")
+
+class ExportFile(BaseModel):
+    name: str
+    bytes: int
+
+class BatchExportResponse(BaseModel):
+    id: str
+    format: str
+    directory: str
+    status: str # running, succeeded, failed
+    incident_count: int
+    submitted_at: datetime
+    jobs: List[JobResponse]
+    files: List[ExportFile] = []
+
 # --- INCIDENT SCHEMAS ---
 
 class IncidentBase(BaseModel):
@@ -55,12 +121,31 @@ class IncidentResponse(IncidentBase):
     start_time: datetime
     end_time: Optional[datetime] = None
     created_at: datetime
+    archived_at: Optional[datetime] = None # events moved to the archive tier
     
     events: List[EventResponse] = []
     summary: Optional[IncidentSummaryResponse] = None
 
     model_config = ConfigDict(from_attributes=True)
 
+class IncidentListItem(IncidentBase):
+    # Card fields for the incident list; no events are loaded
+    id: str
+    start_time: datetime
+    end_time: Optional[datetime] = None
+    created_at: datetime
+    archived_at: Optional[datetime] = None
+    event_count: int = 0
+    first_event_at: Optional[datetime] = None
+    last_event_at: Optional[datetime] = None
+    summary_headline: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class IncidentListPage(BaseModel):
+    items: List[IncidentListItem]
+    next_cursor: Optional[str] = None # pass back as `cursor` to fetch the next page
+
 # --- REPLAY SCHEMA ---
 
 class TimelineBucket(BaseModel):
@@ -68,6 +153,9 @@ class TimelineBucket(BaseModel):
     timestamp_end: datetime
     events: List[EventResponse]
     phase: str # e.g., pre-incident, onset, escalation, mitigation, recovery
+    event_count: int = 0
+    counts_by_source: Dict[str, int] = {}
+    truncated: bool = False # events is a sample of event_count events
 
 class ReplayResponse(BaseModel):
     incident_id: str
@@ -75,3 +163,13 @@ class ReplayResponse(BaseModel):
     mttd_minutes: Optional[float] = None
     mttr_minutes: Optional[float] = None
     current_phase: str
+    bucket_size_seconds: Optional[int] = None
+    next_cursor: Optional[str] = None # pass back as `cursor` to fetch the next page
+
+class ReplayOverviewResponse(ReplayResponse):
+    # bucket_size_seconds is the rollup level chosen for the window
+    window_start: Optional[datetime] = None
+    window_end: Optional[datetime] = None
+    levels: List[int] = [] # available bucket sizes (seconds), finest first
+    counts_by_phase: Dict[str, int] = {} # event counts by bucket phase at this level
+    counts_by_source: Dict[str, int] = {}
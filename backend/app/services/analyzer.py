@@ -1,65 +1,83 @@
-from typing import List, Dict, Any, Tuple
-from datetime import timedelta
-from .. import models, schemas
-import json
+from typing import List, Callable
+from .. import models, metrics
+from .event_store import ColumnarEvents
+from .rules import CompiledRules, TriggerIndex, find_onsets, key_event_rows, load_rules
 
-def analyze_incident(incident: models.Incident, events: List[models.Event]) -> models.IncidentSummary:
+def _format(template: str, columns: ColumnarEvents, trigger: int, effect: int) -> str:
+    return template.format(
+        time=columns.timestamp_at(trigger).strftime('%H:%M:%S'),
+        event_type=columns.value_at("event_type", trigger),
+        actor_id=columns.value_at("actor_id", trigger),
+        resource_id=columns.value_at("resource_id", trigger),
+        effect_event_type=columns.value_at("event_type", effect)
+    )
+
+def _key_event(columns: ColumnarEvents, i: int) -> dict:
+    return {"event_id": columns.id_at(i), "event_type": columns.value_at("event_type", i), "timestamp": columns.timestamp_at(i).isoformat()}
+
+def analyze_incident(incident: models.Incident, events: List[models.Event], rules: CompiledRules = None, correlate: Callable = None) -> models.IncidentSummary:
+    return analyze_columns(incident, ColumnarEvents.from_events(events), rules, correlate)
+
+def analyze_columns(incident: models.Incident, columns: ColumnarEvents, rules: CompiledRules = None, correlate: Callable = None) -> models.IncidentSummary:
     """
-    Rule-based root cause analysis for MVP-0.1.
+    Rule-based root cause analysis over timestamp-sorted columnar events.
+
+    Every error onset is matched against the closest preceding trigger (per the
+    loaded rule set); the highest-confidence match, earliest first on ties,
+    becomes the probable root cause. If given, `correlate(actor_id, resource_id,
+    event_type, timestamp)` returns the other incidents that saw the same
+    trigger (a correlation.lookup result), which is added to the causal chain.
     """
-    sorted_events = sorted(events, key=lambda e: e.timestamp)
-    
+    rules = rules or load_rules()
+
     probable_root_cause = "Unknown"
     recommendations = []
     causal_chain = []
     confidence = 0.0
-    
+
     # Simple Hypothesis Engine
-    # Look for triggers before the first error spike
-    first_error = next((e for e in sorted_events if "error" in e.event_type.lower() or "crash" in e.event_type.lower()), None)
-    
-    if first_error:
-        # Check for config_change or deploy_started within 15 minutes before first_error
-        cutoff_time = first_error.timestamp
-        start_search = cutoff_time - timedelta(minutes=15)
-        
-        candidates = [e for e in sorted_events if start_search <= e.timestamp < cutoff_time and e.event_type in ["config_change", "deploy_started", "role_assigned", "policy_changed", "permission_change"]]
-        
-        if candidates:
-            top_candidate = candidates[-1] # closest to error
-            if top_candidate.event_type in ["config_change", "deploy_started"]:
-                probable_root_cause = f"Bad deployment or configuration change at {top_candidate.timestamp.strftime('%H:%M:%S')}"
-                confidence = 0.85
-                recommendations = [
-                    "Implement stricter pre-deployment health checks.",
-                    "Review configuration validation hooks in CI/CD.",
-                    "Set up automated progressive delivery (canary deployments)."
-                ]
-                causal_chain = [
-                    {"event_id": top_candidate.id, "desc": f"Trigger: {top_candidate.event_type}"},
-                    {"event_id": first_error.id, "desc": f"Effect: {first_error.event_type} observed"}
-                ]
-            elif top_candidate.event_type in ["role_assigned", "policy_changed", "permission_change"]:
-                probable_root_cause = f"Identity risk: unexpected permission change at {top_candidate.timestamp.strftime('%H:%M:%S')}"
-                confidence = 0.90
-                recommendations = [
-                    "Audit service principal permissions.",
-                    "Enforce 'Just-In-Time' access for critical role assignments."
-                ]
-                causal_chain = [
-                    {"event_id": top_candidate.id, "desc": f"Trigger: Identity permission modified by {top_candidate.actor_id}"},
-                    {"event_id": first_error.id, "desc": f"Effect: Anomalous behavior or access failure"}
-                ]
-    
+    # Look for triggers before each error onset
+    with metrics.stage("analyzer.hypotheses"):
+        index = TriggerIndex(rules, columns)
+        hypotheses = []
+        for onset in find_onsets(rules, columns):
+            match = index.closest_before(columns.timestamps[onset])
+            if match:
+                hypotheses.append((match[0], match[1], onset))
+
+    if hypotheses:
+        # Highest confidence wins; hypotheses are in onset order, so ties keep the earliest
+        best_rule, best_trigger, best_onset = hypotheses[0]
+        for rule, trigger, onset in hypotheses[1:]:
+            if rule.confidence > best_rule.confidence:
+                best_rule, best_trigger, best_onset = rule, trigger, onset
+        probable_root_cause = _format(best_rule.root_cause, columns, best_trigger, best_onset)
+        confidence = best_rule.confidence
+        recommendations = list(best_rule.recommendations)
+        for rule, trigger, onset in hypotheses:
+            causal_chain.append({"event_id": columns.id_at(trigger), "desc": _format(rule.trigger_desc, columns, trigger, onset)})
+            causal_chain.append({"event_id": columns.id_at(onset), "desc": _format(rule.effect_desc, columns, trigger, onset)})
+
+        if correlate is not None:
+            actor_id = columns.value_at("actor_id", best_trigger)
+            resource_id = columns.value_at("resource_id", best_trigger)
+            event_type = columns.value_at("event_type", best_trigger)
+            with metrics.stage("analyzer.correlate"):
+                related = correlate(actor_id, resource_id, event_type, columns.timestamp_at(best_trigger))
+            if related and related["total"]:
+                causal_chain.append({
+                    "event_id": columns.id_at(best_trigger),
+                    "desc": f"Recurring trigger: {event_type} by {actor_id} on {resource_id} also occurred in {related['total']} other incident(s)",
+                    "related_incident_ids": [m["incident_id"] for m in related["matches"]]
+                })
+
     # Generate generic key events
-    key_events = []
-    for e in sorted_events:
-        if e.event_type in ["deploy_started", "config_change", "alert_fired", "rollback", "permission_change"]:
-            key_events.append({"event_id": e.id, "event_type": e.event_type, "timestamp": e.timestamp.isoformat()})
-            
-    if not key_events and sorted_events:
-        key_events = [{"event_id": e.id, "event_type": e.event_type, "timestamp": e.timestamp.isoformat()} for e in sorted_events[:3]]
-        
+    with metrics.stage("analyzer.key_events"):
+        key_events = [_key_event(columns, i) for i in key_event_rows(rules, columns)]
+
+    if not key_events and len(columns):
+        key_events = [_key_event(columns, i) for i in range(min(3, len(columns)))]
+
     summary = models.IncidentSummary(
         incident_id=incident.id,
         probable_root_cause=probable_root_cause,
@@ -68,5 +86,5 @@ def analyze_incident(incident: models.Incident, events: List[models.Event]) -> m
         recommendations=recommendations,
         confidence_score=confidence
     )
-    
+
     return summary
@@ -0,0 +1,150 @@
+import gzip
+import os
+import threading
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Iterator, Tuple
+import orjson
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from .. import models
+from . import event_store, serialization
+from .event_store import ColumnarEvents
+from .rollups import STATS_BUCKET_SIZE
+from .cache import cache as response_cache
+
+# Archive tier: the retention job moves the events of old resolved incidents
+# out of the events table into one gzip-compressed NDJSON file per incident.
+# Rollups, correlation postings and the summary stay in the database, so the
+# incident list, counts-only replay and correlation keep working unchanged;
+# event-level replay, /events and re-analysis read the file on demand.
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "90"))
+ARCHIVE_CACHE_INCIDENTS = 4 # decoded archives kept in memory
+
+ArchivedEvent = namedtuple("ArchivedEvent", serialization.EVENT_FIELDS)
+
+_cache: "OrderedDict[Tuple[str, float], List[ArchivedEvent]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def archive_path(incident_id: str) -> str:
+    return os.path.join(ARCHIVE_DIR, f"{incident_id}.ndjson.gz")
+
+def write_archive(db: Session, incident_id: str, path: str) -> int:
+    """Write the incident's events, oldest first, to `path` atomically. Returns the row count."""
+    rows = db.query(*serialization.EVENT_COLUMNS).filter(models.Event.incident_id == incident_id).order_by(
+        models.Event.timestamp.asc(), models.Event.id.asc()
+    ).execution_options(yield_per=10000)
+    count = 0
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+        for row in rows:
+            f.write(orjson.dumps(dict(zip(serialization.EVENT_FIELDS, row))) + b"\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+def archive_incident(db: Session, incident: models.Incident) -> int:
+    """Move an incident's events to its archive file and drop them from the events table. Commits."""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = archive_path(incident.id)
+    count = write_archive(db, incident.id, path)
+    db.query(models.Event).filter(models.Event.incident_id == incident.id).delete(synchronize_session=False)
+    incident.archived_at = datetime.utcnow()
+    incident.archive_path = path
+    db.commit()
+    event_store.store.invalidate(incident.id)
+    response_cache.invalidate(incident.id)
+    return count
+
+def retention_candidates(db: Session, older_than_days: int = RETENTION_DAYS) -> List[str]:
+    """Resolved, not yet archived incidents that ended more than `older_than_days` ago."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    rows = db.query(models.Incident.id).filter(
+        models.Incident.status == "resolved",
+        models.Incident.archived_at.is_(None),
+        func.coalesce(models.Incident.end_time, models.Incident.start_time) < cutoff
+    ).all()
+    return [incident_id for (incident_id,) in rows]
+
+def _parse(line: bytes) -> ArchivedEvent:
+    fields = orjson.loads(line)
+    for name in serialization.TIMESTAMP_FIELDS:
+        if fields[name] is not None:
+            fields[name] = datetime.fromisoformat(fields[name])
+    return ArchivedEvent(**fields)
+
+def iter_events(path: str) -> Iterator[ArchivedEvent]:
+    """Events of an archive file, oldest first, decoded line by line (bypasses the cache)."""
+    with gzip.open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield _parse(line)
+
+def read_events(path: str) -> List[ArchivedEvent]:
+    """All events of an archive file, oldest first (recently read archives are cached)."""
+    key = (path, os.path.getmtime(path))
+    with _cache_lock:
+        events = _cache.get(key)
+        if events is not None:
+            _cache.move_to_end(key)
+            return events
+    events = list(iter_events(path))
+    with _cache_lock:
+        _cache[key] = events
+        while len(_cache) > ARCHIVE_CACHE_INCIDENTS:
+            _cache.popitem(last=False)
+    return events
+
+def read_columns(path: str) -> ColumnarEvents:
+    return ColumnarEvents.from_events(read_events(path))
+
+def window(events: List[ArchivedEvent], start: datetime = None, end: datetime = None) -> List[ArchivedEvent]:
+    """Events with start <= timestamp < end, by bisection."""
+    lo = bisect_left(events, start, key=lambda e: e.timestamp) if start is not None else 0
+    hi = bisect_left(events, end, key=lambda e: e.timestamp) if end is not None else len(events)
+    return events[lo:hi]
+
+def query_events(
+    events: List[ArchivedEvent],
+    start: datetime = None,
+    end: datetime = None,
+    filters: Dict[str, Any] = None,
+    after: Tuple[datetime, str] = None,
+    limit: int = 1000
+) -> List[ArchivedEvent]:
+    """The /events query (equality filters, keyset on (timestamp, id)) over archived events."""
+    if after is not None:
+        start = max(start, after[0]) if start is not None else after[0]
+    filters = {name: value for name, value in (filters or {}).items() if value is not None}
+    page = []
+    for e in window(events, start, end):
+        if after is not None and (e.timestamp, e.id) <= after:
+            continue
+        if any(getattr(e, name) != value for name, value in filters.items()):
+            continue
+        page.append(e)
+        if len(page) >= limit:
+            break
+    return page
+
+def archived_event_stats(db: Session, incident_ids: List[str]) -> Dict[str, Tuple[int, datetime, datetime]]:
+    """(event count, first, last event time) of archived incidents, from their retained rollup."""
+    if not incident_ids:
+        return {}
+    bucket = models.ReplayBucket
+    rows = db.query(
+        bucket.incident_id, func.sum(bucket.event_count), func.min(bucket.first_timestamp), func.max(bucket.last_timestamp)
+    ).filter(
+        bucket.incident_id.in_(incident_ids),
+        bucket.bucket_size == STATS_BUCKET_SIZE
+    ).group_by(bucket.incident_id).all()
+    return {incident_id: (count, first, last) for incident_id, count, first, last in rows}
+
+if __name__ == "__main__":
+    # Run the retention job once, e.g. from cron: python -m app.services.archive
+    from .jobs import run_retention
+
+    print(run_retention(RETENTION_DAYS))
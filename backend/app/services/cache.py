@@ -0,0 +1,260 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# Response cache for replay and summary results, shared by every worker
+# process when backed by a local file tree or SQLite file. Entries are bytes,
+# namespaced by incident. Each incident has a generation; ingest (and anything
+# else that changes an incident's results) calls invalidate(), which bumps it.
+# A result computed under an older generation is never served, so a request
+# racing an ingest cannot store a stale result under the new generation.
+#
+# CACHE_BACKEND: none, memory (per process), file or sqlite (shared).
+# The default is memory for a single worker and sqlite when WEB_CONCURRENCY > 1.
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND") or ("sqlite" if int(os.getenv("WEB_CONCURRENCY", "1")) > 1 else "memory")
+CACHE_PATH = os.getenv("CACHE_PATH") # directory (file) or database file (sqlite)
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "3600"))
+CACHE_MAX_VALUE_BYTES = int(os.getenv("CACHE_MAX_VALUE_BYTES", str(16 * 1024 * 1024)))
+CACHE_MEMORY_MAX_BYTES = int(os.getenv("CACHE_MEMORY_MAX_BYTES", str(256 * 1024 * 1024)))
+PRUNE_EVERY_STORES = 1000
+
+class Cache(ABC):
+    @abstractmethod
+    def lookup(self, namespace: str, key: str) -> Tuple[Optional[bytes], int]:
+        """(value or None, current generation of `namespace`)."""
+
+    @abstractmethod
+    def store(self, namespace: str, key: str, generation: int, value: bytes):
+        """Store `value` if `generation` (from lookup) is still current."""
+
+    @abstractmethod
+    def invalidate(self, namespace: str):
+        """Bump the generation of `namespace`, so its stored values are no longer served."""
+
+class NullCache(Cache):
+    def lookup(self, namespace: str, key: str) -> Tuple[Optional[bytes], int]:
+        return None, 0
+
+    def store(self, namespace: str, key: str, generation: int, value: bytes):
+        pass
+
+    def invalidate(self, namespace: str):
+        pass
+
+class MemoryCache(Cache):
+    """In-process LRU, bounded by total value bytes. Not shared between workers."""
+
+    def __init__(self, max_bytes: int = CACHE_MEMORY_MAX_BYTES, ttl: int = CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[int, float, bytes]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, namespace: str, key: str) -> Tuple[Optional[bytes], int]:
+        with self._lock:
+            generation = self._generations.get(namespace, 0)
+            entry = self._entries.get((namespace, key))
+            if entry is None or entry[0] != generation or entry[1] < time.time():
+                return None, generation
+            self._entries.move_to_end((namespace, key))
+            return entry[2], generation
+
+    def store(self, namespace: str, key: str, generation: int, value: bytes):
+        with self._lock:
+            if generation != self._generations.get(namespace, 0):
+                return
+            self._pop((namespace, key))
+            self._entries[(namespace, key)] = (generation, time.time() + self.ttl, value)
+            self.bytes += len(value)
+            while self.bytes > self.max_bytes and self._entries:
+                self._pop(next(iter(self._entries)))
+
+    def invalidate(self, namespace: str):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            for entry_key in [k for k in self._entries if k[0] == namespace]:
+                self._pop(entry_key)
+
+    def _pop(self, entry_key: Tuple[str, str]):
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self.bytes -= len(entry[2])
+
+class FileCache(Cache):
+    """
+    One directory per namespace holding a `generation` file and one file per
+    entry, written via rename so readers never see partial values. Generations
+    are nanosecond timestamps so concurrent invalidations need no lock.
+    """
+
+    def __init__(self, path: str, ttl: int = CACHE_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        os.makedirs(path, exist_ok=True)
+
+    def _dir(self, namespace: str) -> str:
+        return os.path.join(self.path, hashlib.sha1(namespace.encode()).hexdigest())
+
+    def _generation(self, directory: str) -> int:
+        try:
+            with open(os.path.join(directory, "generation")) as f:
+                return int(f.read() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _entry_path(self, directory: str, key: str, generation: int) -> str:
+        return os.path.join(directory, f"{generation}-{hashlib.sha1(key.encode()).hexdigest()}")
+
+    def lookup(self, namespace: str, key: str) -> Tuple[Optional[bytes], int]:
+        directory = self._dir(namespace)
+        generation = self._generation(directory)
+        path = self._entry_path(directory, key, generation)
+        try:
+            if os.path.getmtime(path) + self.ttl < time.time():
+                self._unlink(path)
+                return None, generation
+            with open(path, "rb") as f:
+                return f.read(), generation
+        except FileNotFoundError:
+            return None, generation
+
+    def store(self, namespace: str, key: str, generation: int, value: bytes):
+        directory = self._dir(namespace)
+        os.makedirs(directory, exist_ok=True)
+        path = self._entry_path(directory, key, generation)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+        # Lost a race with invalidate(): the entry is unreachable, remove it
+        if self._generation(directory) != generation:
+            self._unlink(path)
+
+    def invalidate(self, namespace: str):
+        directory = self._dir(namespace)
+        os.makedirs(directory, exist_ok=True)
+        generation = time.time_ns()
+        tmp_path = os.path.join(directory, f"generation.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(str(generation))
+        os.replace(tmp_path, os.path.join(directory, "generation"))
+        prefix = f"{generation}-"
+        for name in os.listdir(directory):
+            if name != "generation" and not name.startswith(prefix) and not name.endswith(".tmp"):
+                self._unlink(os.path.join(directory, name))
+
+    def _unlink(self, path: str):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+class SQLiteCache(Cache):
+    """A SQLite file in WAL mode; one connection per thread."""
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS cache_generations (namespace TEXT PRIMARY KEY, generation INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS cache_entries ("
+        " namespace TEXT NOT NULL, key TEXT NOT NULL, generation INTEGER NOT NULL,"
+        " value BLOB NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))",
+        "CREATE INDEX IF NOT EXISTS ix_cache_entries_expires_at ON cache_entries (expires_at)",
+    )
+    CURRENT_GENERATION = "(SELECT coalesce(max(generation), 0) FROM cache_generations WHERE namespace = ?)"
+
+    def __init__(self, path: str, ttl: int = CACHE_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self.stores = 0
+        self._local = threading.local()
+        db = self._connect()
+        for statement in self.SCHEMA:
+            db.execute(statement)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def lookup(self, namespace: str, key: str) -> Tuple[Optional[bytes], int]:
+        db = self._connect()
+        (generation,) = db.execute(f"SELECT {self.CURRENT_GENERATION}", (namespace,)).fetchone()
+        row = db.execute(
+            "SELECT value FROM cache_entries WHERE namespace = ? AND key = ? AND generation = ? AND expires_at > ?",
+            (namespace, key, generation, time.time())
+        ).fetchone()
+        return (row[0] if row else None), generation
+
+    def store(self, namespace: str, key: str, generation: int, value: bytes):
+        db = self._connect()
+        db.execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, generation, value, expires_at) "
+            f"SELECT ?, ?, ?, ?, ? WHERE ? = {self.CURRENT_GENERATION}",
+            (namespace, key, generation, value, time.time() + self.ttl, generation, namespace)
+        )
+        self.stores += 1
+        if self.stores % PRUNE_EVERY_STORES == 0:
+            db.execute("DELETE FROM cache_entries WHERE expires_at < ?", (time.time(),))
+
+    def invalidate(self, namespace: str):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute(
+                "INSERT INTO cache_generations (namespace, generation) VALUES (?, 1) "
+                "ON CONFLICT (namespace) DO UPDATE SET generation = generation + 1",
+                (namespace,)
+            )
+            db.execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+def create_cache(backend: str = CACHE_BACKEND, path: str = CACHE_PATH) -> Cache:
+    if backend == "none":
+        return NullCache()
+    if backend == "memory":
+        return MemoryCache()
+    if backend == "file":
+        return FileCache(path or "./cache")
+    if backend == "sqlite":
+        return SQLiteCache(path or "./cache.db")
+    raise ValueError(f"Unknown CACHE_BACKEND {backend!r} (none, memory, file, sqlite)")
+
+class LazyCache(Cache):
+    # The backend is opened on first use, so importing the app stays free of file IO
+    def __init__(self):
+        self._backend: Optional[Cache] = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self) -> Cache:
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = create_cache()
+        return self._backend
+
+    def lookup(self, namespace: str, key: str) -> Tuple[Optional[bytes], int]:
+        return self.backend.lookup(namespace, key)
+
+    def store(self, namespace: str, key: str, generation: int, value: bytes):
+        if len(value) <= CACHE_MAX_VALUE_BYTES:
+            self.backend.store(namespace, key, generation, value)
+
+    def invalidate(self, namespace: str):
+        self.backend.invalidate(namespace)
+
+cache = LazyCache()
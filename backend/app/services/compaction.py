@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import List, Dict, Any, Iterable, Tuple
+from .. import schemas
+from . import replay
+
+# Optional ingest stage, off by default (INGEST_DEDUP / INGEST_COMPACT_WINDOW_SECONDS
+# or per request). Deduplication drops events whose content hash was already
+# seen, so a re-delivered batch is a no-op. Compaction folds bursts of
+# the same (source_type, event_type, actor_id, resource_id) into one event per
+# tumbling window, carrying occurrences and first (timestamp) / last timestamps.
+# Windows are aligned to epoch multiples of the window size, so a burst maps to
+# the same stored row across batches and requests and later events merge into it,
+# adding occurrences and moving last_timestamp but never the row's timestamp, so
+# the burst's rollup contribution stays in one bucket.
+# Compaction deduplicates first: a folded event is only known by its content hash.
+# Hashes are claimed in the event_hashes ledger (see ingest.write_batch).
+
+INGEST_DEDUP = os.getenv("INGEST_DEDUP", "0").lower() in ("1", "true", "yes")
+INGEST_COMPACT_WINDOW_SECONDS = int(os.getenv("INGEST_COMPACT_WINDOW_SECONDS", "0"))
+
+def _digest(parts: Iterable[Any]) -> str:
+    return hashlib.sha1(json.dumps(list(parts), sort_keys=True, default=str).encode()).hexdigest()
+
+def content_hash(event: schemas.EventCreate) -> str:
+    return _digest((
+        replay.normalize_timestamp(event.timestamp).isoformat(),
+        event.source_type, event.event_type, event.actor_type, event.actor_id, event.resource_id,
+        event.message, event.event_metadata,
+    ))
+
+def burst_key(event: schemas.EventCreate, window_seconds: int) -> Tuple:
+    window_start = replay.bucket_floor(replay.normalize_timestamp(event.timestamp), window_seconds)
+    return (window_seconds, window_start.isoformat(), event.source_type, event.event_type, event.actor_id, event.resource_id)
+
+def burst_hash(key: Tuple) -> str:
+    return _digest(("burst",) + key)
+
+def occurrences(event: Any) -> int:
+    # Works for schemas, ORM rows (None before flush) and plain query rows
+    return getattr(event, "occurrences", None) or 1
+
+def last_seen(event: Any) -> datetime:
+    return replay.normalize_timestamp(getattr(event, "last_timestamp", None) or event.timestamp)
+
+def dedup(events: Iterable[schemas.EventCreate]) -> Tuple[List[Tuple[str, schemas.EventCreate]], int]:
+    """(hash, event) pairs with in-batch duplicates dropped, and the number dropped."""
+    seen = set()
+    unique = []
+    duplicates = 0
+    for event in events:
+        digest = content_hash(event)
+        if digest in seen:
+            duplicates += 1
+            continue
+        seen.add(digest)
+        unique.append((digest, event))
+    return unique, duplicates
+
+def compact(events: Iterable[schemas.EventCreate], window_seconds: int) -> List[Tuple[str, schemas.EventCreate]]:
+    """
+    Fold events into one per burst window, as (burst hash, event) pairs. The
+    earliest event of a burst supplies the timestamp, message and metadata.
+    """
+    bursts: Dict[Tuple, List[schemas.EventCreate]] = {}
+    for event in events:
+        bursts.setdefault(burst_key(event, window_seconds), []).append(event)
+
+    compacted = []
+    for key, group in bursts.items():
+        first = min(group, key=lambda e: replay.normalize_timestamp(e.timestamp))
+        compacted.append((burst_hash(key), first.model_copy(update={
+            "occurrences": sum(e.occurrences for e in group),
+            "last_timestamp": max(last_seen(e) for e in group),
+        })))
+    return compacted
@@ -0,0 +1,166 @@
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from datetime import datetime
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session, aliased
+from .. import models
+from ..database import upsert, least, greatest
+from . import replay, compaction
+
+# Inverted index over (actor_id, resource_id, event_type) -> postings of the
+# incidents the combination occurred in. Maintained at ingest, so "where else
+# did this change happen?" is an index lookup rather than an events scan.
+
+DEFAULT_LOOKBACK_DAYS = 90
+MAX_RELATED_INCIDENTS = 5 # related incidents attached to a causal chain entry
+
+Key = Tuple[str, str, str]
+
+def posting_key(actor_id: Optional[str], resource_id: Optional[str], event_type: str) -> Key:
+    return (actor_id or "", resource_id or "", event_type)
+
+def apply_events(db: Session, incident_id: str, events: Iterable[Any]):
+    """Fold events into the incident's postings. The caller commits."""
+    deltas: Dict[Key, Dict[str, Any]] = {}
+    for e in events:
+        ts = replay.normalize_timestamp(e.timestamp)
+        last = compaction.last_seen(e)
+        key = posting_key(e.actor_id, e.resource_id, e.event_type)
+        delta = deltas.get(key)
+        if delta is None:
+            deltas[key] = {"first_seen": ts, "last_seen": last, "occurrences": compaction.occurrences(e)}
+        else:
+            delta["first_seen"] = min(delta["first_seen"], ts)
+            delta["last_seen"] = max(delta["last_seen"], last)
+            delta["occurrences"] += compaction.occurrences(e)
+    if not deltas:
+        return
+
+    table = models.CorrelationPosting.__table__
+    stmt = upsert(db, table)
+    new = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.actor_id, table.c.resource_id, table.c.event_type, table.c.incident_id],
+        set_={
+            "first_seen": least(db, table.c.first_seen, new.first_seen),
+            "last_seen": greatest(db, table.c.last_seen, new.last_seen),
+            "occurrences": table.c.occurrences + new.occurrences,
+        },
+    )
+    # Fixed key order, so concurrent writers lock shared postings in the same order
+    db.execute(stmt, [
+        {"actor_id": key[0], "resource_id": key[1], "event_type": key[2], "incident_id": incident_id, **delta}
+        for key, delta in sorted(deltas.items())
+    ])
+
+def rebuild(db: Session, incident_id: str):
+    """Recompute an incident's postings from its raw events. The caller commits."""
+    db.query(models.CorrelationPosting).filter(models.CorrelationPosting.incident_id == incident_id).delete(synchronize_session=False)
+    rows = db.query(
+        models.Event.timestamp, models.Event.actor_id, models.Event.resource_id, models.Event.event_type,
+        models.Event.occurrences, models.Event.last_timestamp
+    ).filter(
+        models.Event.incident_id == incident_id
+    ).execution_options(yield_per=10000)
+    apply_events(db, incident_id, rows)
+
+def lookup(
+    db: Session,
+    actor_id: Optional[str],
+    resource_id: Optional[str],
+    event_type: str,
+    exclude_incident_id: str = None,
+    since: datetime = None,
+    limit: int = 20
+) -> Dict[str, Any]:
+    """
+    Other incidents in which the same actor changed the same resource the same
+    way (optionally only those seen since `since`), most recent first.
+    """
+    posting = models.CorrelationPosting
+    key = posting_key(actor_id, resource_id, event_type)
+    query = db.query(posting).filter(
+        posting.actor_id == key[0],
+        posting.resource_id == key[1],
+        posting.event_type == key[2],
+    )
+    if exclude_incident_id is not None:
+        query = query.filter(posting.incident_id != exclude_incident_id)
+    if since is not None:
+        query = query.filter(posting.last_seen >= since)
+
+    total = query.count()
+    rows = query.join(models.Incident, models.Incident.id == posting.incident_id).with_entities(
+        posting, models.Incident.title
+    ).order_by(posting.last_seen.desc()).limit(limit).all()
+    return _result(key, total, rows)
+
+def _result(key: Key, total: int, rows: Iterable[Tuple[models.CorrelationPosting, str]]) -> Dict[str, Any]:
+    return {
+        "actor_id": key[0] or None,
+        "resource_id": key[1] or None,
+        "event_type": key[2],
+        "total": total,
+        "matches": [
+            {
+                "incident_id": row.incident_id,
+                "title": title,
+                "first_seen": row.first_seen,
+                "last_seen": row.last_seen,
+                "occurrences": row.occurrences,
+            }
+            for row, title in rows
+        ],
+    }
+
+def incident_correlations(db: Session, incident_id: str, event_types: Iterable[str], since: datetime = None, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Lookups for every posting of `incident_id` whose event_type is one of
+    `event_types`, most correlated first. Two queries for all keys: the totals
+    grouped by key, and each key's `limit` most recent matches ranked by a
+    window function.
+    """
+    posting = models.CorrelationPosting
+    own = db.query(posting.actor_id, posting.resource_id, posting.event_type).filter(
+        posting.incident_id == incident_id,
+        posting.event_type.in_(list(event_types))
+    ).subquery()
+    other = aliased(posting)
+    key_columns = (other.actor_id, other.resource_id, other.event_type)
+    on_key = and_(*(column == own.c[column.key] for column in key_columns))
+    filters = [other.incident_id != incident_id]
+    if since is not None:
+        filters.append(other.last_seen >= since)
+
+    totals = {
+        (actor_id, resource_id, event_type): total
+        for actor_id, resource_id, event_type, total in db.query(*key_columns, func.count()).join(own, on_key).filter(*filters).group_by(*key_columns)
+    }
+    if not totals:
+        return []
+
+    rank = func.row_number().over(partition_by=key_columns, order_by=(other.last_seen.desc(), other.incident_id)).label("rank")
+    ranked = db.query(other, rank).join(own, on_key).filter(*filters).subquery()
+    match = aliased(posting, ranked)
+    rows = db.query(match, models.Incident.title).join(
+        models.Incident, models.Incident.id == match.incident_id
+    ).filter(ranked.c.rank <= limit).order_by(match.last_seen.desc(), match.incident_id)
+
+    matches: Dict[Key, List[Tuple[models.CorrelationPosting, str]]] = {key: [] for key in totals}
+    for row, title in rows:
+        matches[(row.actor_id, row.resource_id, row.event_type)].append((row, title))
+    results = [_result(key, total, matches[key]) for key, total in totals.items()]
+    return sorted(results, key=lambda r: r["total"], reverse=True)
+
+if __name__ == "__main__":
+    # Backfill postings for incidents ingested before the index existed
+    from ..database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        incident_ids = [incident_id for (incident_id,) in db.query(models.Incident.id).all()]
+        for incident_id in incident_ids:
+            rebuild(db, incident_id)
+            db.commit()
+        print(f"Indexed {len(incident_ids)} incidents")
+    finally:
+        db.close()
@@ -1,8 +1,9 @@
 from datetime import datetime, timedelta
 import uuid
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 from sqlalchemy.orm import Session
 from .. import models, schemas
+from . import rollups, correlation, ingest, partitions
 import random
 
 def create_demo_incident(db: Session, title: str = "Bad deploy + misconfigured scaling") -> models.Incident:
@@ -76,7 +77,120 @@ def create_demo_incident(db: Session, title: str = "Bad deploy + misconfigured s
     # T=50: Recovery observed
     add_event(50, "app", "recovery", "system", "datadog", "svc:cart", "Error rate back to baseline (<1%)")
     
+    partitions.ensure_partitions(db, [e.timestamp for e in events])
     db.add_all(events)
+    rollups.apply_events(db, incident.id, events)
+    correlation.apply_events(db, incident.id, events)
     db.commit()
     
     return incident
+
+
+# --- Synthetic large incidents ---
+
+# Background event types per source; none of them classify as error/alert/recovery
+SOURCE_EVENT_TYPES = {
+    "app": ["request_completed", "latency_sample", "cache_miss"],
+    "k8s": ["pod_scheduled", "pod_ready", "hpa_evaluated"],
+    "cicd": ["pipeline_started", "artifact_published", "deploy_succeeded"],
+    "cloud": ["resource_read", "metric_sample", "config_read"],
+    "iam": ["token_issued", "role_assumed"],
+}
+DEFAULT_SOURCE_MIX = {"app": 0.5, "k8s": 0.25, "cloud": 0.15, "cicd": 0.05, "iam": 0.05}
+SYNTHETIC_START = datetime(2024, 5, 10, 12, 0, 0)
+
+def synthetic_events(
+    event_count: int,
+    duration: timedelta = timedelta(hours=2),
+    source_mix: Dict[str, float] = None,
+    services: int = 10,
+    bursts: int = 5,
+    burst_size: int = 1000,
+    burst_seconds: int = 120,
+    seed: int = 42,
+    start_time: datetime = SYNTHETIC_START
+) -> Iterator[schemas.EventCreate]:
+    """
+    Yield `event_count` events for a reproducible large incident: weighted
+    background noise across `services`, a bad config change followed by an
+    error onset, alert, rollback and recovery, and `bursts` alert storms of
+    `burst_size` identical error events within `burst_seconds` each. Events
+    are yielded unsorted so arbitrarily large incidents stream in constant memory.
+    """
+    rng = random.Random(seed)
+    span = duration.total_seconds()
+    mix = source_mix or DEFAULT_SOURCE_MIX
+    sources = [s for s in mix if s in SOURCE_EVENT_TYPES]
+    weights = [mix[s] for s in sources]
+    service_ids = [f"svc:service-{i}" for i in range(max(services, 1))]
+
+    def event(offset_seconds: float, source: str, event_type: str, actor_type: str, actor_id: str, resource_id: str, message: str = None):
+        # model_construct skips validation; generated fields are known-good
+        return schemas.EventCreate.model_construct(
+            timestamp=start_time + timedelta(seconds=offset_seconds),
+            source_type=source, event_type=event_type, actor_type=actor_type,
+            actor_id=actor_id, resource_id=resource_id, message=message, event_metadata=None,
+        )
+
+    target = service_ids[0]
+    scenario = [
+        event(span * 0.20, "cicd", "deploy_started", "human", "dev-jdoe", f"repo/{target[4:]}", "Triggered deployment to prod"),
+        event(span * 0.22, "cloud", "config_change", "service_principal", "spn-infra-deployer", target, "Updated auto-scaling thresholds"),
+        event(span * 0.25, "app", "error_rate_spike", "system", "datadog", target, "500 errors/min detected"),
+        event(span * 0.26, "k8s", "pod_crash", "system", "kubelet", target, "OOMKilled pod"),
+        event(span * 0.27, "iam", "alert_fired", "system", "pagerduty", target, "SEV2: High Error Rate"),
+        event(span * 0.60, "cicd", "rollback", "human", "dev-oncall", f"repo/{target[4:]}", "Reverting deployment"),
+        event(span * 0.70, "app", "recovery", "system", "datadog", target, "Error rate back to baseline"),
+    ]
+    scenario = scenario[:event_count]
+    yield from scenario
+
+    burst_total = min(bursts * burst_size, event_count - len(scenario))
+    for b in range(bursts):
+        size = min(burst_size, burst_total - b * burst_size)
+        if size <= 0:
+            break
+        resource = rng.choice(service_ids)
+        # Storms start after the onset and stay within the incident
+        burst_start = rng.uniform(span * 0.25, max(span * 0.25, span - burst_seconds))
+        for _ in range(size):
+            yield event(burst_start + rng.random() * burst_seconds, "app", "error_rate_spike", "system", "datadog", resource, "500 errors/min detected")
+
+    for _ in range(event_count - len(scenario) - burst_total):
+        source = rng.choices(sources, weights)[0]
+        yield event(
+            rng.random() * span, source, rng.choice(SOURCE_EVENT_TYPES[source]),
+            "system", f"{source}-agent", rng.choice(service_ids)
+        )
+
+def create_synthetic_incident(
+    db: Session,
+    event_count: int,
+    duration: timedelta = timedelta(hours=2),
+    title: str = None,
+    compact_window: int = 0,
+    **options: Any
+) -> models.Incident:
+    """
+    Create an incident filled by synthetic_events (see there for `options`),
+    written through the batched ingest path.
+    """
+    start_time = options.get("start_time", SYNTHETIC_START)
+    incident = models.Incident(
+        title=title or f"Synthetic incident ({event_count} events)",
+        description="Generated load-test incident.",
+        environment="prod",
+        status="resolved",
+        severity=2,
+        start_time=start_time,
+        end_time=start_time + duration
+    )
+    db.add(incident)
+    db.commit()
+    db.refresh(incident)
+
+    ingest.write_events(
+        db, incident.id, synthetic_events(event_count, duration, **options),
+        dedup=False, compact_window=compact_window
+    )
+    return incident
@@ -0,0 +1,242 @@
+import os
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Deque, Iterable
+from sqlalchemy.orm import Session
+from .. import models, schemas, metrics
+from . import replay, ingest
+from .cache import cache as response_cache
+
+# Incident auto-detection over the global event stream. Events are grouped by
+# service (resource_id) into sliding windows holding the last
+# DETECT_LOOKBACK_SECONDS of event time (at most DETECT_MAX_WINDOW_EVENTS).
+# With the replay event classes, a service's window opens an incident when an
+# alert fires or DETECT_ERROR_THRESHOLD errors/crashes land within
+# DETECT_ERROR_WINDOW_SECONDS; the lookback becomes the incident's first
+# events. While the incident is open, the service's events are attached as they
+# arrive, and a recovery/resolve event sets its end_time. Windows of services
+# that went quiet are dropped, so memory is bounded by recently active services.
+
+DETECT_LOOKBACK_SECONDS = int(os.getenv("DETECT_LOOKBACK_SECONDS", "900"))
+DETECT_ERROR_WINDOW_SECONDS = int(os.getenv("DETECT_ERROR_WINDOW_SECONDS", "300"))
+DETECT_ERROR_THRESHOLD = max(int(os.getenv("DETECT_ERROR_THRESHOLD", "5")), 1)
+DETECT_MAX_WINDOW_EVENTS = int(os.getenv("DETECT_MAX_WINDOW_EVENTS", "2000"))
+DETECT_ENVIRONMENT = os.getenv("DETECT_ENVIRONMENT", "prod")
+EVICT_EVERY_EVENTS = 10000
+
+ONSET_FLAGS = replay.ERROR | replay.CRASH
+CLOSE_FLAGS = replay.RECOVERY | replay.RESOLVE
+
+class ServiceWindow:
+    __slots__ = ("events", "errors", "incident_id", "last_seen")
+
+    def __init__(self):
+        self.events: Deque[schemas.EventCreate] = deque(maxlen=DETECT_MAX_WINDOW_EVENTS)
+        # Only the latest THRESHOLD error times matter for the onset test
+        self.errors: Deque[datetime] = deque(maxlen=DETECT_ERROR_THRESHOLD)
+        self.incident_id: Optional[str] = None
+        self.last_seen: Optional[datetime] = None
+
+def empty_changes() -> Dict[str, Dict[str, Any]]:
+    # opened: incident_id -> new Incident; events: incident_id -> events to attach; resolved: incident_id -> end_time;
+    # windows: service -> its incident_id before the batch (services whose incident changed)
+    return {"opened": {}, "events": {}, "resolved": {}, "windows": {}}
+
+class Detector:
+    def __init__(self):
+        self.windows: Dict[str, ServiceWindow] = {}
+        self.watermark: Optional[datetime] = None # latest event time seen
+        self.observed = 0
+        self.unattributed = 0
+        self._restored = False
+        # Guards the in-memory windows only; database work happens outside it
+        self._lock = threading.Lock()
+        # Set once the latest batch's changes are committed
+        self._applied = threading.Event()
+        self._applied.set()
+
+    def restore(self, db: Session):
+        """Re-attach services whose detected incidents are still open (e.g. after a restart)."""
+        rows = db.query(models.Incident.id, models.Incident.detection_key).filter(
+            models.Incident.detection_key.isnot(None),
+            models.Incident.status == "open"
+        ).all()
+        with self._lock:
+            if self._restored:
+                return
+            for incident_id, key in rows:
+                self.windows.setdefault(key, ServiceWindow()).incident_id = incident_id
+            self._restored = True
+
+    def observe(self, event_in: schemas.EventCreate, changes: Dict[str, Dict[str, Any]]):
+        key = event_in.resource_id
+        if key is None:
+            self.unattributed += 1
+            return
+        self.observed += 1
+        ts = event_in.timestamp = replay.normalize_timestamp(event_in.timestamp)
+        if self.watermark is None or ts > self.watermark:
+            self.watermark = ts
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = ServiceWindow()
+        if window.last_seen is None or ts > window.last_seen:
+            window.last_seen = ts
+        flags = replay.classify_event_type(event_in.event_type)
+
+        if window.incident_id is not None:
+            changes["events"].setdefault(window.incident_id, []).append(event_in)
+            if flags & CLOSE_FLAGS:
+                changes["windows"].setdefault(key, window.incident_id)
+                changes["resolved"][window.incident_id] = ts
+                window.incident_id = None
+                window.errors.clear()
+            return
+
+        window.events.append(event_in)
+        cutoff = ts - timedelta(seconds=DETECT_LOOKBACK_SECONDS)
+        while window.events[0].timestamp < cutoff:
+            window.events.popleft()
+        if flags & ONSET_FLAGS:
+            window.errors.extend([ts] * min(event_in.occurrences, DETECT_ERROR_THRESHOLD))
+        error_onset = (
+            len(window.errors) == DETECT_ERROR_THRESHOLD
+            and (ts - window.errors[0]).total_seconds() <= DETECT_ERROR_WINDOW_SECONDS
+        )
+        if flags & replay.ALERT or error_onset:
+            self._open(key, window, event_in, flags, cutoff, changes)
+
+    def _open(self, key: str, window: ServiceWindow, trigger: schemas.EventCreate, flags: int, cutoff: datetime, changes: Dict[str, Dict[str, Any]]):
+        incident_id = models.generate_uuid()
+        first_error = next((t for t in window.errors if t >= cutoff), trigger.timestamp)
+        changes["opened"][incident_id] = models.Incident(
+            id=incident_id,
+            title=f"{trigger.event_type} on {key}",
+            description=f"Auto-detected from the event stream: {trigger.message or trigger.event_type}",
+            environment=DETECT_ENVIRONMENT,
+            status="open",
+            severity=2 if flags & replay.CRASH else 3,
+            start_time=min(first_error, trigger.timestamp),
+            detection_key=key,
+        )
+        changes["events"][incident_id] = list(window.events)
+        changes["windows"].setdefault(key, window.incident_id)
+        window.incident_id = incident_id
+        window.events.clear()
+        window.errors.clear()
+
+    def evict(self):
+        """Drop idle windows of services without an open incident."""
+        if self.watermark is None:
+            return
+        cutoff = self.watermark - timedelta(seconds=DETECT_LOOKBACK_SECONDS)
+        idle = [key for key, w in self.windows.items() if w.incident_id is None and w.last_seen is not None and w.last_seen < cutoff]
+        for key in idle:
+            del self.windows[key]
+
+    def apply(self, db: Session, changes: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Create opened incidents, attach events and close resolved incidents. Commits."""
+        opened, attach, resolved = changes["opened"], changes["events"], changes["resolved"]
+        if opened:
+            db.add_all(opened.values())
+            db.commit()
+
+        # Incidents resolved or archived by hand (or never created, by a failed
+        # batch) stop receiving events; release their services
+        existing = [incident_id for incident_id in attach if incident_id not in opened]
+        if existing:
+            closed = set(existing) - {incident_id for (incident_id,) in db.query(models.Incident.id).filter(
+                models.Incident.id.in_(existing),
+                models.Incident.status == "open"
+            )}
+            with self._lock:
+                for window in self.windows.values():
+                    if window.incident_id in closed:
+                        window.incident_id = None
+            for incident_id in closed:
+                attach.pop(incident_id)
+                resolved.pop(incident_id, None)
+
+        attached = 0
+        for incident_id, events in attach.items():
+            attached += ingest.write_batch(db, incident_id, events)["accepted"]
+        for incident_id, end_time in resolved.items():
+            db.query(models.Incident).filter(models.Incident.id == incident_id).update(
+                {"end_time": end_time, "status": "resolved"}, synchronize_session=False
+            )
+        db.commit()
+        for incident_id in resolved:
+            response_cache.invalidate(incident_id)
+        return {"attached": attached, "opened": list(opened), "resolved": list(resolved)}
+
+    def revert(self, db: Session, changes: Dict[str, Dict[str, Any]], left: Dict[str, Optional[str]]):
+        """
+        After a failed apply, point the batch's services back at what was
+        committed: an opened incident if it exists, otherwise the previous
+        incident if it is still open. `left` is where the batch left each
+        service; services a later batch moved on since are left alone.
+        """
+        db.rollback()
+        candidates = {i for i in list(changes["windows"].values()) + list(left.values()) if i is not None}
+        try:
+            still_open = {incident_id for (incident_id,) in db.query(models.Incident.id).filter(
+                models.Incident.id.in_(candidates),
+                models.Incident.status == "open"
+            )} if candidates else set()
+        except Exception:
+            # Unknown: fall back to no incident, restore() re-attaches open ones on restart
+            db.rollback()
+            still_open = set()
+        with self._lock:
+            for key, before in changes["windows"].items():
+                window = self.windows.get(key)
+                if window is None or window.incident_id != left[key]:
+                    continue
+                if window.incident_id not in still_open:
+                    window.incident_id = before if before in still_open else None
+
+    def process(self, db: Session, events: Iterable[schemas.EventCreate]) -> Dict[str, Any]:
+        """Run a batch of stream events through the detector and persist what it decided.
+
+        Blocking: call it from a worker thread with its own session, never on the event loop.
+        """
+        if not self._restored:
+            self.restore(db)
+        changes = empty_changes()
+        with self._lock:
+            observed = self.observed
+            with metrics.stage("detect.observe"):
+                for event_in in events:
+                    self.observe(event_in, changes)
+                    if self.observed % EVICT_EVERY_EVENTS == 0:
+                        self.evict()
+            observed = self.observed - observed
+            left = {key: self.windows[key].incident_id if key in self.windows else None for key in changes["windows"]}
+            previous, applied = self._applied, threading.Event()
+            self._applied = applied
+        # Batches commit in the order they were observed: an incident must exist
+        # before a later batch attaches to it, and a detector resolve must not
+        # look like a manual one to an earlier batch
+        try:
+            previous.wait()
+            with metrics.stage("detect.apply"):
+                result = self.apply(db, changes)
+        except Exception:
+            self.revert(db, changes, left)
+            raise
+        finally:
+            applied.set()
+        result["observed"] = observed
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "windows": len(self.windows),
+            "open_incidents": sum(1 for w in self.windows.values() if w.incident_id is not None),
+            "observed": self.observed,
+            "unattributed": self.unattributed,
+            "watermark": self.watermark,
+        }
+
+detector = Detector()
@@ -0,0 +1,227 @@
+import os
+import sys
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from .. import models
+
+# In-process, columnar cache of hot incidents. Events are held as parallel
+# arrays: int64 epoch-microsecond timestamps, 16-byte packed ids and
+# dictionary-encoded string columns, roughly 50 bytes per event instead of
+# kilobytes per ORM instance. Replay counts and analysis run directly on it.
+
+EVENT_STORE_MAX_BYTES = int(os.getenv("EVENT_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+# A cached incident is checked against the database watermark at most this
+# often; in between, hits trust this process's append/invalidate hooks. Bounds
+# how long events ingested by another worker can go unseen.
+EVENT_STORE_REVALIDATE_SECONDS = float(os.getenv("EVENT_STORE_REVALIDATE_SECONDS", "5"))
+
+EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+def to_micros(ts: datetime) -> int:
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return (ts - EPOCH) // _MICROSECOND
+
+def from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=micros)
+
+def event_watermark(db: Session, incident_id: str) -> Tuple[int, Optional[datetime]]:
+    """
+    Event count (compacted bursts count all their occurrences, so merging into
+    a burst moves the watermark) and latest event timestamp.
+    """
+    count, last_event_at = db.query(
+        func.coalesce(func.sum(models.Event.occurrences), 0), func.max(models.Event.timestamp)
+    ).filter(models.Event.incident_id == incident_id).one()
+    return int(count), last_event_at
+
+class StringDictionary:
+    """Dictionary encoding for a low-cardinality string column (None is code 0)."""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = [None]
+        self.codes: Dict[Optional[str], int] = {None: 0}
+
+    def encode(self, value: Optional[str]) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(sys.intern(value))
+        return code
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.values) + sys.getsizeof(self.codes) + sum(sys.getsizeof(v) for v in self.values[1:])
+
+# Columns fetched from the database, in order
+COLUMNS = (
+    models.Event.id,
+    models.Event.timestamp,
+    models.Event.source_type,
+    models.Event.event_type,
+    models.Event.actor_type,
+    models.Event.actor_id,
+    models.Event.resource_id,
+    models.Event.occurrences,
+)
+
+class ColumnarEvents:
+    """Events of one incident as timestamp-sorted parallel arrays."""
+
+    ENCODED = ("source_type", "event_type", "actor_type", "actor_id", "resource_id")
+
+    def __init__(self):
+        self.timestamps = array("q")
+        self.id_bytes = bytearray()
+        self.other_ids: Dict[int, str] = {} # ids that are not UUIDs, by row
+        self.dictionaries = {name: StringDictionary() for name in self.ENCODED}
+        self.codes = {name: array("I") for name in self.ENCODED}
+        self.occurrences = array("I") # 1 unless the row is a compacted burst
+        self.total_occurrences = 0
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple]) -> "ColumnarEvents":
+        columns = cls()
+        columns.extend(sorted(rows, key=lambda r: r[1]))
+        return columns
+
+    @classmethod
+    def from_events(cls, events: Iterable[Any]) -> "ColumnarEvents":
+        return cls.from_rows(
+            (e.id, e.timestamp, e.source_type, e.event_type, e.actor_type, e.actor_id, e.resource_id, e.occurrences)
+            for e in events
+        )
+
+    def extend(self, rows: Iterable[Tuple]):
+        """Append rows (id, timestamp, source_type, event_type, actor_type, actor_id, resource_id, occurrences) in timestamp order."""
+        for row in rows:
+            try:
+                self.id_bytes += uuid.UUID(row[0]).bytes
+            except ValueError:
+                self.other_ids[len(self.timestamps)] = row[0]
+                self.id_bytes += bytes(16)
+            self.timestamps.append(to_micros(row[1]))
+            for name, value in zip(self.ENCODED, row[2:7]):
+                self.codes[name].append(self.dictionaries[name].encode(value))
+            occurrences = row[7] or 1
+            self.occurrences.append(occurrences)
+            self.total_occurrences += occurrences
+
+    def id_at(self, i: int) -> str:
+        if i in self.other_ids:
+            return self.other_ids[i]
+        return str(uuid.UUID(bytes=bytes(self.id_bytes[i * 16:(i + 1) * 16])))
+
+    def timestamp_at(self, i: int) -> datetime:
+        return from_micros(self.timestamps[i])
+
+    def value_at(self, name: str, i: int) -> Optional[str]:
+        return self.dictionaries[name].values[self.codes[name][i]]
+
+    def last_timestamp(self) -> Optional[datetime]:
+        return self.timestamp_at(len(self) - 1) if len(self) else None
+
+    def nbytes(self) -> int:
+        total = sys.getsizeof(self.id_bytes) + (self.timestamps.itemsize + self.occurrences.itemsize) * len(self.timestamps)
+        for name in self.ENCODED:
+            total += self.codes[name].itemsize * len(self.codes[name]) + self.dictionaries[name].nbytes()
+        return total
+
+class EventStore:
+    """LRU of ColumnarEvents per incident, bounded by an estimated byte budget."""
+
+    def __init__(self, max_bytes: int = EVENT_STORE_MAX_BYTES, revalidate_seconds: float = EVENT_STORE_REVALIDATE_SECONDS):
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self._entries: "OrderedDict[str, ColumnarEvents]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._checked: Dict[str, float] = {} # monotonic time an entry last matched the database watermark
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, incident_id: str, watermark: Tuple[int, Optional[datetime]] = None) -> ColumnarEvents:
+        """
+        Cached columns for an incident, reloaded when the database watermark
+        shows events this process has not seen (e.g. ingested by another worker).
+        An entry carries its own watermark (its occurrence total and last
+        timestamp, kept current by append): a passed `watermark` is compared
+        with it directly, and without one the database is only queried once the
+        entry's last check is older than revalidate_seconds.
+        """
+        if watermark is None:
+            with self._lock:
+                columns = self._entries.get(incident_id)
+                if columns is not None and time.monotonic() - self._checked[incident_id] < self.revalidate_seconds:
+                    self._entries.move_to_end(incident_id)
+                    return columns
+            watermark = event_watermark(db, incident_id)
+        with self._lock:
+            columns = self._entries.get(incident_id)
+            if columns is not None and (columns.total_occurrences, columns.last_timestamp()) == watermark:
+                self._checked[incident_id] = time.monotonic()
+                self._entries.move_to_end(incident_id)
+                return columns
+
+        rows = db.query(*COLUMNS).filter(models.Event.incident_id == incident_id).order_by(
+            models.Event.timestamp.asc()
+        ).execution_options(yield_per=10000)
+        columns = ColumnarEvents()
+        columns.extend(rows)
+        self._put(incident_id, columns)
+        return columns
+
+    def append(self, incident_id: str, rows: List[Dict[str, Any]]):
+        """Keep a cached incident in sync with rows just inserted by this process."""
+        with self._lock:
+            columns = self._entries.get(incident_id)
+            if columns is None:
+                return
+            rows = sorted(rows, key=lambda r: r["timestamp"])
+            if rows and len(columns) and to_micros(rows[0]["timestamp"]) < columns.timestamps[-1]:
+                # Out-of-order backfill: cheaper to reload on next access than to re-sort
+                self._evict(incident_id)
+                return
+            columns.extend(tuple(r[c.key] for c in COLUMNS) for r in rows)
+            self._account(incident_id, columns)
+
+    def invalidate(self, incident_id: str):
+        with self._lock:
+            self._evict(incident_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"incidents": len(self._entries), "bytes": self._total, "max_bytes": self.max_bytes}
+
+    def _put(self, incident_id: str, columns: ColumnarEvents):
+        with self._lock:
+            self._evict(incident_id)
+            self._entries[incident_id] = columns
+            self._checked[incident_id] = time.monotonic()
+            self._account(incident_id, columns)
+
+    def _account(self, incident_id: str, columns: ColumnarEvents):
+        size = columns.nbytes()
+        self._total += size - self._sizes.get(incident_id, 0)
+        self._sizes[incident_id] = size
+        self._entries.move_to_end(incident_id)
+        # Evict least recently used incidents, but always keep the newest one
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            self._evict(oldest)
+
+    def _evict(self, incident_id: str):
+        if self._entries.pop(incident_id, None) is not None:
+            self._total -= self._sizes.pop(incident_id, 0)
+            self._checked.pop(incident_id, None)
+
+store = EventStore()
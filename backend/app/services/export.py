@@ -0,0 +1,211 @@
+import csv
+import gzip
+import importlib.util
+import io
+import os
+from datetime import datetime
+from typing import List, Dict, Any, Iterator, Optional, Sequence
+import orjson
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from .. import models, schemas
+from . import archive, jobs, replay
+from .serialization import EVENT_COLUMNS, EVENT_FIELDS
+
+# Full incident exports: the incident, every event (oldest first) and the
+# summary. Events are read in EXPORT_BATCH_SIZE partitions from a server-side
+# cursor (yield_per), or line by line from an archive file, and encoded batch
+# by batch, so memory stays flat however large the incident is.
+#
+#   ndjson   {"type": "incident", ...}, one {"type": "event", ...} per event, {"type": "summary", ...}
+#   csv      the event timeline only, one row per event (metadata as JSON)
+#   parquet  the events as a table; incident and summary as JSON in the file metadata
+#
+# Batch exports split the selected incidents over the job worker pool; each
+# job writes one file per incident (ndjson/csv gzip-compressed) to
+# EXPORT_DIR/<batch id>/ next to a batch.json manifest.
+
+EXPORT_FORMATS = ("ndjson", "csv", "parquet")
+EXPORT_BATCH_SIZE = 5000
+EXPORT_DIR = os.getenv("EXPORT_DIR", "./exports")
+MAX_BATCH_INCIDENTS = 1000
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+FILE_SUFFIXES = {"ndjson": ".ndjson.gz", "csv": ".csv.gz", "parquet": ".parquet"}
+
+def check_format(format: str):
+    """Raise ValueError if `format` cannot be written by this server."""
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {format!r}")
+    if format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise ValueError("Parquet export requires pyarrow")
+
+def incident_record(incident: models.Incident) -> Dict[str, Any]:
+    return {c.key: getattr(incident, c.key) for c in models.Incident.__table__.columns if c.key != "archive_path"}
+
+def summary_record(summary: Optional[models.IncidentSummary]) -> Optional[Dict[str, Any]]:
+    return schemas.IncidentSummaryResponse.model_validate(summary).model_dump(mode="json") if summary else None
+
+def load_incident(db: Session, incident_id: str):
+    """(incident, summary) in one query; (None, None) if the incident does not exist."""
+    row = db.query(models.Incident, models.IncidentSummary).outerjoin(
+        models.IncidentSummary, models.IncidentSummary.incident_id == models.Incident.id
+    ).filter(models.Incident.id == incident_id).first()
+    return row if row is not None else (None, None)
+
+def event_batches(db: Session, incident: models.Incident, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Sequence[Any]]:
+    """The incident's events as EVENT_COLUMNS rows, oldest first, in batches."""
+    if incident.archive_path:
+        batch = []
+        for event in archive.iter_events(incident.archive_path):
+            batch.append(event)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        return
+    result = db.execute(
+        select(*EVENT_COLUMNS).where(models.Event.incident_id == incident.id).order_by(
+            models.Event.timestamp.asc(), models.Event.id.asc()
+        ).execution_options(yield_per=batch_size)
+    )
+    yield from result.partitions()
+
+def ndjson_chunks(db: Session, incident: models.Incident, summary: Optional[models.IncidentSummary]) -> Iterator[bytes]:
+    yield orjson.dumps({"type": "incident", **incident_record(incident)}) + b"\n"
+    for rows in event_batches(db, incident):
+        yield b"".join(orjson.dumps({"type": "event", **dict(zip(EVENT_FIELDS, row))}) + b"\n" for row in rows)
+    yield orjson.dumps({"type": "summary", **(summary_record(summary) or {})}) + b"\n"
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return orjson.dumps(value).decode()
+    return value
+
+def csv_chunks(db: Session, incident: models.Incident, summary: Optional[models.IncidentSummary] = None) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EVENT_FIELDS)
+    for rows in event_batches(db, incident):
+        writer.writerows([_csv_value(v) for v in row] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def write_parquet(db: Session, incident: models.Incident, summary: Optional[models.IncidentSummary], path: str) -> int:
+    """Write the events as a zstd-compressed Parquet file, one row group per batch. Returns the event row count."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    string_fields = [name for name in EVENT_FIELDS if name not in ("timestamp", "last_timestamp", "occurrences")]
+    schema = pa.schema(
+        [pa.field(name, pa.timestamp("us")) for name in ("timestamp", "last_timestamp")]
+        + [pa.field("occurrences", pa.int32())]
+        + [pa.field(name, pa.string()) for name in string_fields],
+        metadata={
+            b"incident": orjson.dumps(incident_record(incident)),
+            b"summary": orjson.dumps(summary_record(summary)),
+        },
+    )
+    count = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for rows in event_batches(db, incident):
+            columns = {name: [] for name in schema.names}
+            for row in rows:
+                for name, value in zip(EVENT_FIELDS, row):
+                    columns[name].append(orjson.dumps(value).decode() if name == "event_metadata" and value is not None else value)
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            count += len(rows)
+    return count
+
+def export_filename(incident_id: str, format: str) -> str:
+    return f"{incident_id}{FILE_SUFFIXES[format]}"
+
+def write_export(db: Session, incident_id: str, format: str, directory: str) -> Optional[str]:
+    """Export one incident into `directory` (written via rename). Returns the file path, or None if not found."""
+    incident, summary = load_incident(db, incident_id)
+    if incident is None:
+        return None
+    path = os.path.join(directory, export_filename(incident_id, format))
+    tmp_path = path + ".tmp"
+    if format == "parquet":
+        write_parquet(db, incident, summary, tmp_path)
+    else:
+        chunks = ndjson_chunks if format == "ndjson" else csv_chunks
+        with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+            for chunk in chunks(db, incident, summary):
+                f.write(chunk)
+    os.replace(tmp_path, path)
+    return path
+
+# --- Batch exports ---
+
+def batch_directory(batch_id: str) -> str:
+    return os.path.join(EXPORT_DIR, batch_id)
+
+def select_incidents(db: Session, request: schemas.BatchExportRequest) -> List[str]:
+    query = db.query(models.Incident.id)
+    if request.incident_ids is not None:
+        query = query.filter(models.Incident.id.in_(request.incident_ids))
+    if request.status is not None:
+        query = query.filter(models.Incident.status == request.status)
+    if request.created_from is not None:
+        query = query.filter(models.Incident.created_at >= replay.normalize_timestamp(request.created_from))
+    if request.created_to is not None:
+        query = query.filter(models.Incident.created_at < replay.normalize_timestamp(request.created_to))
+    return [incident_id for (incident_id,) in query.order_by(models.Incident.created_at.asc()).limit(MAX_BATCH_INCIDENTS)]
+
+def submit_batch(db: Session, request: schemas.BatchExportRequest) -> Dict[str, Any]:
+    """Split the selected incidents over the worker pool and record the batch manifest."""
+    incident_ids = select_incidents(db, request)
+    batch_id = models.generate_uuid()
+    directory = batch_directory(batch_id)
+    os.makedirs(directory, exist_ok=True)
+    # Round-robin, so each worker gets a similar mix of old and new incidents
+    chunk_count = max(min(jobs.JOB_WORKERS, len(incident_ids)), 1)
+    chunks = [incident_ids[i::chunk_count] for i in range(chunk_count)]
+    submitted = [jobs.submit("export", jobs.run_export, chunk, request.format, directory) for chunk in chunks if chunk]
+    manifest = {
+        "id": batch_id,
+        "format": request.format,
+        "incident_ids": incident_ids,
+        "job_ids": [job["id"] for job in submitted],
+        "submitted_at": datetime.utcnow(),
+    }
+    with open(os.path.join(directory, "batch.json"), "wb") as f:
+        f.write(orjson.dumps(manifest))
+    return batch_status(batch_id)
+
+def batch_status(batch_id: str) -> Optional[Dict[str, Any]]:
+    directory = batch_directory(batch_id)
+    try:
+        with open(os.path.join(directory, "batch.json"), "rb") as f:
+            manifest = orjson.loads(f.read())
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    suffix = FILE_SUFFIXES[manifest["format"]]
+    files = [
+        {"name": entry.name, "bytes": entry.stat().st_size}
+        for entry in os.scandir(directory) if entry.name.endswith(suffix)
+    ]
+    batch_jobs = [job for job in (jobs.get(job_id) for job_id in manifest["job_ids"]) if job is not None]
+    if any(job["status"] == "failed" for job in batch_jobs):
+        status = "failed"
+    elif len(files) >= len(manifest["incident_ids"]) or (batch_jobs and all(job["status"] == "succeeded" for job in batch_jobs)):
+        status = "succeeded"
+    else:
+        status = "running"
+    return {
+        "id": batch_id,
+        "format": manifest["format"],
+        "directory": directory,
+        "status": status,
+        "incident_count": len(manifest["incident_ids"]),
+        "submitted_at": manifest["submitted_at"],
+        "jobs": batch_jobs,
+        "files": sorted(files, key=lambda f: f["name"]),
+    }
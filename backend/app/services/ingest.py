@@ -0,0 +1,222 @@
+import zlib
+from typing import List, Dict, Any, AsyncIterator, Iterable, Set
+from pydantic import ValidationError
+from sqlalchemy import DateTime, bindparam, func, insert, update
+from sqlalchemy.orm import Session
+from .. import models, schemas, metrics
+from ..database import upsert, greatest
+from . import replay, rollups, event_store, pubsub, correlation, compaction, partitions
+from .cache import cache as response_cache
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_ERRORS_PER_BATCH = 10
+LIVE_MAX_EVENTS_PER_MESSAGE = 1000
+
+def event_row(incident_id: str, event_in: schemas.EventCreate, content_hash: str = None) -> Dict[str, Any]:
+    return {
+        "id": models.generate_uuid(),
+        "incident_id": incident_id,
+        "timestamp": replay.normalize_timestamp(event_in.timestamp),
+        "source_type": event_in.source_type,
+        "event_type": event_in.event_type,
+        "actor_type": event_in.actor_type,
+        "actor_id": event_in.actor_id,
+        "resource_id": event_in.resource_id,
+        "message": event_in.message,
+        "event_metadata": event_in.event_metadata,
+        "content_hash": content_hash,
+        "occurrences": event_in.occurrences,
+        "last_timestamp": replay.normalize_timestamp(event_in.last_timestamp),
+    }
+
+def empty_stats() -> Dict[str, int]:
+    # accepted/duplicates count events; inserted/merged count stored rows
+    return {"accepted": 0, "duplicates": 0, "inserted": 0, "merged": 0}
+
+def claim_hashes(db: Session, incident_id: str, hashes: List[str]) -> Set[str]:
+    """Record content hashes in the ledger; the ones no earlier ingest had claimed."""
+    if not hashes:
+        return set()
+    stmt = upsert(db, models.EventHash.__table__).on_conflict_do_nothing().returning(models.EventHash.content_hash)
+    rows = db.execute(stmt, [{"incident_id": incident_id, "content_hash": digest} for digest in hashes])
+    return {row.content_hash for row in rows}
+
+def claim_bursts(db: Session, incident_id: str, bursts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Record burst rows (dicts with content_hash, id and timestamp) in the ledger,
+    as {hash: (event_id, timestamp)}. A burst that is already stored maps to
+    the stored row; a concurrent ingest of the same burst waits for the first
+    to commit and then gets its row.
+    """
+    if not bursts:
+        return {}
+    table = models.EventHash.__table__
+    stmt = upsert(db, table)
+    # A no-op update, so the existing row is returned (and locked)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.incident_id, table.c.content_hash],
+        set_={"event_id": table.c.event_id},
+    ).returning(table.c.content_hash, table.c.event_id, table.c.timestamp)
+    rows = db.execute(stmt, [
+        {"incident_id": incident_id, "content_hash": b["content_hash"], "event_id": b["id"], "timestamp": b["timestamp"]}
+        for b in bursts
+    ])
+    return {row.content_hash: (row.event_id, row.timestamp) for row in rows}
+
+def merge_statement(db: Session):
+    """Adds a burst's occurrences to a stored row: executemany with merge_id, added and merge_last."""
+    table = models.Event.__table__
+    return update(table).where(table.c.id == bindparam("merge_id")).values(
+        occurrences=table.c.occurrences + bindparam("added"),
+        last_timestamp=greatest(db, func.coalesce(table.c.last_timestamp, table.c.timestamp), bindparam("merge_last", type_=DateTime)),
+    )
+
+def write_batch(
+    db: Session,
+    incident_id: str,
+    events: List[schemas.EventCreate],
+    dedup: bool = None,
+    compact_window: int = None
+) -> Dict[str, int]:
+    """
+    Insert one batch with a single Core executemany, update the replay rollup
+    for the touched buckets and commit.
+
+    With `dedup`, events whose content hash was already ingested are dropped;
+    with a `compact_window` (seconds), the remaining events are also folded into
+    one row per burst window and merged into that window's stored row if there
+    is one (see compaction). Both claim their hashes in the event_hashes ledger
+    with INSERT ... ON CONFLICT, so concurrent deliveries of the same events
+    neither double count nor fail on a unique key.
+    Defaults come from INGEST_DEDUP / INGEST_COMPACT_WINDOW_SECONDS.
+    """
+    stats = empty_stats()
+    if not events:
+        return stats
+    dedup = compaction.INGEST_DEDUP if dedup is None else dedup
+    compact_window = compaction.INGEST_COMPACT_WINDOW_SECONDS if compact_window is None else compact_window
+
+    with metrics.stage("ingest.prepare"):
+        if dedup or compact_window:
+            hashed, stats["duplicates"] = compaction.dedup(events)
+            claimed = claim_hashes(db, incident_id, [digest for digest, _ in hashed])
+            stats["duplicates"] += sum(e.occurrences for digest, e in hashed if digest not in claimed)
+            hashed = [(digest, e) for digest, e in hashed if digest in claimed]
+        else:
+            hashed = [(None, e) for e in events]
+        if compact_window:
+            compacted = compaction.compact((e for _, e in hashed), compact_window)
+            bursts = [event_row(incident_id, e, digest) for digest, e in compacted]
+            stored = claim_bursts(db, incident_id, bursts)
+            rows, merges, accepted = [], [], []
+            for row, (_, event_in) in zip(bursts, compacted):
+                event_id, timestamp = stored[row["content_hash"]]
+                if event_id == row["id"]:
+                    rows.append(row)
+                    accepted.append(event_in)
+                    continue
+                merges.append({"merge_id": event_id, "added": event_in.occurrences, "merge_last": compaction.last_seen(event_in)})
+                # The rollup counts a burst in the bucket of the stored row's timestamp
+                accepted.append(event_in.model_copy(update={"timestamp": timestamp}))
+        else:
+            rows = [event_row(incident_id, e, digest) for digest, e in hashed]
+            merges = []
+            accepted = [e for _, e in hashed]
+
+    with metrics.stage("ingest.insert"):
+        if rows:
+            partitions.ensure_partitions(db, [row["timestamp"] for row in rows])
+            db.execute(insert(models.Event), rows)
+        if merges:
+            db.execute(merge_statement(db), merges)
+    with metrics.stage("ingest.rollups"):
+        touched = rollups.apply_events(db, incident_id, accepted)
+    with metrics.stage("ingest.correlation"):
+        correlation.apply_events(db, incident_id, accepted)
+    topic = pubsub.incident_topic(incident_id)
+    live_update = live_update_message(rows, touched) if accepted and pubsub.broker.has_subscribers(topic) else None
+    with metrics.stage("ingest.commit"):
+        db.commit()
+    if accepted:
+        response_cache.invalidate(incident_id)
+    if merges:
+        # Stored rows changed in place; reload on next access
+        event_store.store.invalidate(incident_id)
+    else:
+        event_store.store.append(incident_id, rows)
+    if live_update is not None:
+        pubsub.broker.publish(topic, live_update)
+
+    stats["accepted"] = sum(e.occurrences for e in accepted)
+    stats["inserted"] = len(rows)
+    stats["merged"] = len(merges)
+    return stats
+
+def live_update_message(rows: List[Dict[str, Any]], touched: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """The new events and the rollup buckets they changed, for live replay subscribers."""
+    sample = sorted(rows, key=lambda r: r["timestamp"])[:LIVE_MAX_EVENTS_PER_MESSAGE]
+    buckets: Dict[int, List[Dict[str, Any]]] = {}
+    for row in sorted(touched, key=lambda b: b["bucket_start"]):
+        buckets.setdefault(row["bucket_size"], []).append(
+            replay.rollup_bucket(models.ReplayBucket(**row)).model_dump(mode="json")
+        )
+    return {
+        "type": "delta",
+        "event_count": sum(r["occurrences"] for r in rows),
+        "events": [schemas.EventResponse.model_validate(r).model_dump(mode="json") for r in sample],
+        "truncated": len(sample) < len(rows),
+        "buckets": buckets,
+    }
+
+def write_events(
+    db: Session,
+    incident_id: str,
+    events: Iterable[schemas.EventCreate],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    dedup: bool = None,
+    compact_window: int = None
+) -> Dict[str, int]:
+    totals = empty_stats()
+    batch = []
+
+    def flush():
+        for key, value in write_batch(db, incident_id, batch, dedup, compact_window).items():
+            totals[key] += value
+
+    for event_in in events:
+        batch.append(event_in)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    flush()
+    return totals
+
+async def iter_ndjson_lines(chunks: AsyncIterator[bytes], gzipped: bool = False) -> AsyncIterator[bytes]:
+    """
+    Split a (optionally gzip-compressed) byte stream into lines without
+    buffering more than one partial line.
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+    pending = b""
+    async for chunk in chunks:
+        if decompressor is not None:
+            chunk = decompressor.decompress(chunk)
+        pending += chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line
+    if decompressor is not None:
+        pending += decompressor.flush()
+    if pending:
+        yield pending
+
+def parse_event_line(line: bytes) -> schemas.EventCreate:
+    return schemas.EventCreate.model_validate_json(line)
+
+def format_error(exc: Exception) -> str:
+    if isinstance(exc, ValidationError):
+        first = exc.errors()[0]
+        location = ".".join(str(part) for part in first.get("loc", ())) or "line"
+        return f"{location}: {first.get('msg')}"
+    return str(exc)
@@ -0,0 +1,161 @@
+import os
+import threading
+import uuid
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import orjson
+from .cache import cache as response_cache
+
+# Background jobs run in a local process pool so CPU-heavy work (analysis,
+# exports) never holds the GIL of the API process. Job state lives in memory
+# in the API process and is polled via GET /jobs/{id}; it is also written to
+# the shared cache so any worker can answer the poll.
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+MAX_TRACKED_JOBS = 1000
+JOBS_NAMESPACE = "jobs" # cache namespace; never invalidated, entries expire with CACHE_TTL_SECONDS
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_jobs_lock = threading.Lock()
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: workers start clean instead of inheriting the API process's
+            # event loop, threads and pooled DB connections
+            _executor = ProcessPoolExecutor(max_workers=JOB_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+def _on_done(job_id: str, future: Future):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        job["finished_at"] = datetime.utcnow()
+        exc = future.exception()
+        if exc is not None:
+            job["status"] = "failed"
+            job["error"] = f"{type(exc).__name__}: {exc}"
+        else:
+            job["status"] = "succeeded"
+            job["result"] = future.result()
+        touched = [job["incident_id"]] if job["incident_id"] else (job["result"] or {}).get("incident_ids", [])
+        snapshot = _snapshot(job)
+    # Jobs change results in another process; a per-process cache only hears about it here
+    for incident_id in touched:
+        response_cache.invalidate(incident_id)
+    _share(snapshot)
+
+def _snapshot(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in job.items() if k != "future"}
+
+def _share(snapshot: Dict[str, Any]):
+    response_cache.store(JOBS_NAMESPACE, snapshot["id"], 0, orjson.dumps(snapshot))
+
+def submit(kind: str, fn: Callable[..., Dict[str, Any]], *args, incident_id: str = None) -> Dict[str, Any]:
+    """Run `fn(*args)` (a picklable, module-level function) in the worker pool."""
+    job_id = str(uuid.uuid4())
+    job = {
+        "id": job_id,
+        "kind": kind,
+        "incident_id": incident_id,
+        "status": "pending",
+        "submitted_at": datetime.utcnow(),
+        "finished_at": None,
+        "error": None,
+        "result": None,
+        "future": None,
+    }
+    with _jobs_lock:
+        _jobs[job_id] = job
+        while len(_jobs) > MAX_TRACKED_JOBS:
+            _jobs.popitem(last=False)
+    # Shared before the job can finish, so the pending state never overwrites the result
+    _share(_snapshot(job))
+    future = _get_executor().submit(fn, *args)
+    job["future"] = future
+    future.add_done_callback(lambda f: _on_done(job_id, f))
+    return get(job_id)
+
+def get(job_id: str) -> Optional[Dict[str, Any]]:
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            snapshot = _snapshot(job)
+            future = job["future"]
+    if job is None:
+        # Submitted to another worker process
+        shared, _ = response_cache.lookup(JOBS_NAMESPACE, job_id)
+        return orjson.loads(shared) if shared is not None else None
+    if snapshot["status"] == "pending" and future is not None and future.running():
+        snapshot["status"] = "running"
+    return snapshot
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+# --- JOB FUNCTIONS (executed in worker processes) ---
+
+def run_analysis(incident_id: str, force: bool = False) -> Dict[str, Any]:
+    from ..database import SessionLocal
+    from . import summaries
+
+    db = SessionLocal()
+    try:
+        summary, cache_hit = summaries.summarize(db, incident_id, force=force)
+        if summary is None:
+            raise LookupError(f"Incident {incident_id} not found")
+        return {
+            "cache_hit": cache_hit,
+            "probable_root_cause": summary.probable_root_cause,
+            "confidence_score": summary.confidence_score,
+            "source_event_count": summary.source_event_count,
+        }
+    finally:
+        db.close()
+
+def run_retention(older_than_days: int) -> Dict[str, Any]:
+    """Archive resolved incidents older than `older_than_days`, freezing each summary first."""
+    from ..database import SessionLocal
+    from .. import models
+    from . import archive, summaries
+
+    db = SessionLocal()
+    try:
+        archived = {}
+        for incident_id in archive.retention_candidates(db, older_than_days):
+            # The summary must reflect the full event set before the rows leave the table
+            summaries.summarize(db, incident_id)
+            incident = db.query(models.Incident).filter(models.Incident.id == incident_id).one()
+            archived[incident_id] = archive.archive_incident(db, incident)
+        return {"archived_incidents": len(archived), "archived_events": sum(archived.values()), "incident_ids": list(archived)}
+    finally:
+        db.close()
+
+def run_export(incident_ids: List[str], format: str, directory: str) -> Dict[str, Any]:
+    """Write one export file per incident into `directory` (a batch export chunk)."""
+    from ..database import SessionLocal
+    from . import export
+
+    db = SessionLocal()
+    try:
+        files = []
+        for incident_id in incident_ids:
+            path = export.write_export(db, incident_id, format, directory)
+            if path is not None:
+                files.append(os.path.basename(path))
+            # Each export reads a fresh cursor; don't keep its rows in the identity map
+            db.expunge_all()
+        return {"exported": len(files), "files": files}
+    finally:
+        db.close()
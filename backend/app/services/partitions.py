@@ -0,0 +1,89 @@
+import argparse
+import threading
+from datetime import datetime
+from typing import Iterable, Set
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from .. import models
+
+# Monthly range partitions of the events table (Postgres only; see migration
+# 0006), so a month's rows land in their own partition instead of the DEFAULT
+# one, and old months can be detached or dropped without touching the hot
+# indexes. Partitions are meant to be created ahead of time (the CLI below, from
+# a cron); ingest creates a missing one on demand. Either way the DDL runs in
+# its own short transaction on a separate connection, never in an ingest
+# transaction, which would hold the partition locks until it commits.
+
+_known: Set[datetime] = set()
+_lock = threading.Lock()
+
+def month_start(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, 1)
+
+def next_month(month: datetime) -> datetime:
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def partition_name(month: datetime) -> str:
+    return f"events_y{month.year:04d}m{month.month:02d}"
+
+def is_partitioned(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+def create_partition(connection: Connection, month: datetime):
+    """Create the month's partition if missing, in its own transaction on `connection`."""
+    name = partition_name(month)
+    # DDL takes no bind parameters; names and bounds are generated from dates
+    bounds = f"FROM ('{month:%Y-%m-%d}') TO ('{next_month(month):%Y-%m-%d}')"
+    in_range = f"\"timestamp\" >= '{month:%Y-%m-%d}' AND \"timestamp\" < '{next_month(month):%Y-%m-%d}'"
+    with connection.begin():
+        # One partition change at a time across processes
+        connection.execute(text("SELECT pg_advisory_xact_lock(hashtext('events_partitions'))"))
+        if connection.scalar(text("SELECT to_regclass(:name)"), {"name": name}) is not None:
+            return
+        if not connection.scalar(text(f"SELECT EXISTS (SELECT 1 FROM events_default WHERE {in_range})")):
+            connection.execute(text(f"CREATE TABLE {name} PARTITION OF events FOR VALUES {bounds}"))
+            return
+        # The month's rows went to DEFAULT while its partition was missing, and
+        # creating the partition fails while DEFAULT holds rows in its range:
+        # detach DEFAULT, create the partition, move the rows over and reattach
+        columns = ", ".join(f'"{column.name}"' for column in models.Event.__table__.columns)
+        connection.execute(text("ALTER TABLE events DETACH PARTITION events_default"))
+        connection.execute(text(f"CREATE TABLE {name} PARTITION OF events FOR VALUES {bounds}"))
+        connection.execute(text(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM events_default WHERE {in_range}"))
+        connection.execute(text(f"DELETE FROM events_default WHERE {in_range}"))
+        connection.execute(text("ALTER TABLE events ATTACH PARTITION events_default DEFAULT"))
+
+def ensure_partitions(db: Session, timestamps: Iterable[datetime]):
+    """Create the monthly partitions covering `timestamps` if missing. Commits them separately from the caller's transaction."""
+    if not is_partitioned(db):
+        return
+    months = {month_start(ts) for ts in timestamps}
+    with _lock:
+        months -= _known
+    if not months:
+        return
+    with db.get_bind().connect() as connection:
+        for month in sorted(months):
+            create_partition(connection, month)
+    with _lock:
+        _known.update(months)
+
+if __name__ == "__main__":
+    # Pre-create partitions, e.g. from a monthly cron: python -m app.services.partitions --months-ahead 3
+    from ..database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Create upcoming monthly event partitions")
+    parser.add_argument("--months-ahead", type=int, default=3)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        month = month_start(datetime.utcnow())
+        months = [month]
+        for _ in range(args.months_ahead):
+            months.append(next_month(months[-1]))
+        ensure_partitions(db, months)
+        print(", ".join(partition_name(m) for m in months) if is_partitioned(db) else "Not a partitioned (Postgres) database")
+    finally:
+        db.close()
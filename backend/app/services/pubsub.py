@@ -0,0 +1,75 @@
+import asyncio
+import os
+import threading
+from typing import Any, Dict, Set
+
+# In-process fan-out of live incident updates: one ingest publish reaches every
+# subscriber of the incident. Each subscriber has a bounded queue; a client
+# that falls behind is dropped rather than buffering without limit.
+
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("LIVE_SUBSCRIBER_QUEUE_SIZE", "100"))
+
+DROPPED = {"type": "dropped"}
+
+class Subscription:
+    def __init__(self, topic: str, loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.topic = topic
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def _deliver(self, message: Dict[str, Any]):
+        # Runs on the subscriber's event loop
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(DROPPED)
+
+class Broker:
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: str) -> Subscription:
+        subscription = Subscription(topic, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.topic]
+
+    def has_subscribers(self, topic: str) -> bool:
+        with self._lock:
+            return bool(self._subscribers.get(topic))
+
+    def publish(self, topic: str, message: Dict[str, Any]) -> int:
+        """Deliver to every subscriber of `topic`. Safe to call from any thread."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscription in subscribers:
+            if subscription.dropped:
+                self.unsubscribe(subscription)
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, message)
+            except RuntimeError:
+                # Subscriber's loop is closed
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+broker = Broker()
+
+def incident_topic(incident_id: str) -> str:
+    return f"incident:{incident_id}"
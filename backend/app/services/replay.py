@@ -1,86 +1,354 @@
-from typing import List, Dict, Any
-from datetime import datetime, timedelta
-from .. import models, schemas
+import time
+from typing import List, Dict, Any, Tuple, Iterable, Iterator
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from bisect import bisect_left
+from .. import models, schemas, metrics
+from .event_store import ColumnarEvents, to_micros
 
-def generate_replay(incident: models.Incident, events: List[models.Event]) -> schemas.ReplayResponse:
-    if not events:
-        return schemas.ReplayResponse(
-            incident_id=incident.id,
-            buckets=[],
-            mttd_minutes=None,
-            mttr_minutes=None,
-            current_phase="pre-incident"
-        )
-        
-    # Sort events
-    sorted_events = sorted(events, key=lambda e: e.timestamp)
-    start_ts = sorted_events[0].timestamp
-    end_ts = sorted_events[-1].timestamp
-    
-    # Calculate MTTR / MTTD if possible
+EPOCH = datetime(1970, 1, 1)
+
+# Event type categories, encoded as bit flags so a bucket's phase can be
+# derived from the OR of its events' flags instead of rescanning the bucket.
+ERROR = 1
+ALERT = 2
+MITIGATION = 4
+RECOVERY = 8
+CRASH = 16
+RESOLVE = 32
+
+@lru_cache(maxsize=4096)
+def classify_event_type(event_type: str) -> int:
+    lowered = event_type.lower()
+    flags = 0
+    if "error" in lowered:
+        flags |= ERROR
+    if "crash" in lowered:
+        flags |= CRASH
+    if "alert" in lowered:
+        flags |= ALERT
+    if "rollback" in lowered or "mitigat" in lowered:
+        flags |= MITIGATION
+    if "recover" in lowered:
+        flags |= RECOVERY
+    if "resolve" in lowered:
+        flags |= RESOLVE
+    return flags
+
+# A bucket's phase is that of the first flag it carries, in this order
+PHASE_FLAGS = ((ERROR, "onset"), (ALERT, "escalation"), (MITIGATION, "mitigation"), (RECOVERY, "recovery"))
+
+def phase_for_flags(flags: int) -> str:
+    for flag, phase in PHASE_FLAGS:
+        if flags & flag:
+            return phase
+    return "pre-incident"
+
+def choose_bucket_seconds(duration_seconds: float) -> int:
+    # Bucket events by 5 minutes or 1 minute depending on duration
+    return 60 if duration_seconds < 3600 else 300
+
+def compute_mttd_mttr(first_error: datetime = None, first_alert: datetime = None, first_recovery: datetime = None):
     # Heuristics:
     # MTTD = time from first error/crash to first alert
     # MTTR = time from first alert to last recovery
-    first_error = next((e for e in sorted_events if "error" in e.event_type.lower() or "crash" in e.event_type.lower()), None)
-    first_alert = next((e for e in sorted_events if "alert" in e.event_type.lower()), None)
-    first_recovery = next((e for e in sorted_events if "recover" in e.event_type.lower() or "resolve" in e.event_type.lower()), None)
-    
     mttd = None
-    if first_error and first_alert and first_alert.timestamp >= first_error.timestamp:
-        mttd = (first_alert.timestamp - first_error.timestamp).total_seconds() / 60.0
-        
+    if first_error and first_alert and first_alert >= first_error:
+        mttd = (first_alert - first_error).total_seconds() / 60.0
+
     mttr = None
-    if first_alert and first_recovery and first_recovery.timestamp >= first_alert.timestamp:
-        mttr = (first_recovery.timestamp - first_alert.timestamp).total_seconds() / 60.0
+    if first_alert and first_recovery and first_recovery >= first_alert:
+        mttr = (first_recovery - first_alert).total_seconds() / 60.0
 
-    # Bucket events by 5 minutes or 1 minute depending on duration
-    duration = (end_ts - start_ts).total_seconds()
-    bucket_size_min = 1 if duration < 3600 else 5
-    bucket_delta = timedelta(minutes=bucket_size_min)
-    
+    return (round(mttd, 2) if mttd else None, round(mttr, 2) if mttr else None)
+
+def normalize_timestamp(ts: datetime) -> datetime:
+    # Events are stored as naive UTC; fold aware query parameters into that form
+    if ts is not None and ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+def bucket_floor(ts: datetime, bucket_seconds: int) -> datetime:
+    # Buckets are aligned to multiples of bucket_seconds since the epoch so that
+    # windows and pages of the same incident always line up.
+    delta = timedelta(seconds=bucket_seconds)
+    return EPOCH + delta * ((ts - EPOCH) // delta)
+
+def encode_cursor(bucket_start: datetime, bucket_seconds: int) -> str:
+    return f"{int((bucket_start - EPOCH).total_seconds())}:{bucket_seconds}"
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    start, _, size = cursor.partition(":")
+    bucket_start = EPOCH + timedelta(seconds=int(start))
+    bucket_seconds = int(size)
+    if bucket_seconds <= 0:
+        raise ValueError("bucket size must be positive")
+    return bucket_start, bucket_seconds
+
+def iter_buckets(sorted_events: Iterable[Any], bucket_seconds: int, markers: Dict[str, Any]) -> Iterator[Tuple[datetime, datetime, List[Any], int, int, Dict[str, int]]]:
+    """
+    Group timestamp-sorted events (ORM rows or result rows with the same
+    attribute names) into (start, end, events, flags, event_count,
+    counts_by_source) buckets. Fills `markers` with the first error, alert and
+    recovery timestamps as a side effect, complete once the iterator is exhausted.
+    """
+    bucket_delta = timedelta(seconds=bucket_seconds)
+    first_error = first_alert = first_recovery = None
+
+    # Single pass: each event lands in bucket (offset // bucket_seconds). Only
+    # non-empty buckets are materialized, so gaps between events cost nothing.
+    current_index = None
+    current_events = []
+    current_count = 0
+    current_flags = 0
+    current_sources: Dict[str, int] = {}
+
+    for e in sorted_events:
+        flags = classify_event_type(e.event_type)
+        if flags:
+            if first_error is None and flags & (ERROR | CRASH):
+                first_error = e.timestamp
+            if first_alert is None and flags & ALERT:
+                first_alert = e.timestamp
+            if first_recovery is None and flags & (RECOVERY | RESOLVE):
+                first_recovery = e.timestamp
+
+        index = (e.timestamp - EPOCH) // bucket_delta
+        if index != current_index:
+            if current_events:
+                bucket_start = EPOCH + bucket_delta * current_index
+                yield bucket_start, bucket_start + bucket_delta, current_events, current_flags, current_count, current_sources
+            current_index = index
+            current_events = []
+            current_count = 0
+            current_flags = 0
+            current_sources = {}
+        weight = e.occurrences or 1 # compacted bursts count every occurrence
+        current_events.append(e)
+        current_count += weight
+        current_flags |= flags
+        current_sources[e.source_type] = current_sources.get(e.source_type, 0) + weight
+
+    markers.update(first_error=first_error, first_alert=first_alert, first_recovery=first_recovery)
+    if current_events:
+        bucket_start = EPOCH + bucket_delta * current_index
+        yield bucket_start, bucket_start + bucket_delta, current_events, current_flags, current_count, current_sources
+
+def build_buckets(sorted_events: List[models.Event], bucket_seconds: int, max_events_per_bucket: int = None) -> Tuple[List[schemas.TimelineBucket], Dict[str, Any]]:
+    started = time.perf_counter()
+    serialize_seconds = 0.0 # EventResponse validation, reported as its own stage
+    markers: Dict[str, Any] = {}
     buckets = []
-    current_start = start_ts
-    while current_start <= end_ts:
-        current_end = current_start + bucket_delta
-        bucket_events = [e for e in sorted_events if current_start <= e.timestamp < current_end]
-        
-        # Determine phase for bucket
-        phase = "pre-incident"
-        if any("error" in e.event_type.lower() for e in bucket_events):
-            phase = "onset"
-        elif any("alert" in e.event_type.lower() for e in bucket_events):
-            phase = "escalation"
-        elif any("rollback" in e.event_type.lower() or "mitigat" in e.event_type.lower() for e in bucket_events):
-            phase = "mitigation"
-        elif any("recover" in e.event_type.lower() for e in bucket_events):
-            phase = "recovery"
-        
-        # Propagate last phase if empty
-        if not bucket_events and len(buckets) > 0:
-            phase = buckets[-1].phase
-
-        # Only add bucket if not empty (or if we want to fill gaps, let's keep gaps for now)
-        if bucket_events:
-            buckets.append(
-                schemas.TimelineBucket(
-                    timestamp_start=current_start,
-                    timestamp_end=current_end,
-                    events=[schemas.EventResponse.model_validate(e) for e in bucket_events],
-                    phase=phase
-                )
+
+    for bucket_start, bucket_end, bucket_events, flags, count, sources in iter_buckets(sorted_events, bucket_seconds, markers):
+        sample = bucket_events if max_events_per_bucket is None else bucket_events[:max_events_per_bucket]
+        serialize_started = time.perf_counter()
+        sample_events = [schemas.EventResponse.model_validate(e) for e in sample]
+        serialize_seconds += time.perf_counter() - serialize_started
+        buckets.append(
+            schemas.TimelineBucket(
+                timestamp_start=bucket_start,
+                timestamp_end=bucket_end,
+                events=sample_events,
+                phase=phase_for_flags(flags),
+                event_count=count,
+                counts_by_source=sources,
+                truncated=len(sample) < len(bucket_events)
             )
-            
-        current_start = current_end
-        
-    # Edge case: if last event matches current_start exactly
-    if end_ts == current_start and sorted_events[-1].timestamp == end_ts:
-         # already handled if we use <= but need to make sure we don't duplicate
-         pass
+        )
+
+    metrics.observe_stage("replay.serialize", serialize_seconds)
+    metrics.observe_stage("replay.bucketing", time.perf_counter() - started - serialize_seconds)
+    return buckets, markers
+
+def generate_replay(
+    incident: models.Incident,
+    events: List[models.Event],
+    bucket_seconds: int = None,
+    max_events_per_bucket: int = None,
+    markers: Dict[str, Any] = None,
+    next_cursor: str = None
+) -> schemas.ReplayResponse:
+    """
+    Build the replay timeline for `events`.
+
+    `markers` carries incident-wide first error/alert/recovery timestamps when
+    `events` is only a window of the incident; otherwise they are taken from
+    `events` themselves.
+    """
+    if not events:
+        mttd, mttr = compute_mttd_mttr(**_marker_args(markers)) if markers else (None, None)
+        return schemas.ReplayResponse(
+            incident_id=incident.id,
+            buckets=[],
+            mttd_minutes=mttd,
+            mttr_minutes=mttr,
+            current_phase="pre-incident",
+            bucket_size_seconds=bucket_seconds,
+            next_cursor=next_cursor
+        )
+
+    # Sort events (timsort is linear when the query already ordered them)
+    sorted_events = sorted(events, key=lambda e: e.timestamp)
+    if bucket_seconds is None:
+        bucket_seconds = choose_bucket_seconds((sorted_events[-1].timestamp - sorted_events[0].timestamp).total_seconds())
+
+    buckets, window_markers = build_buckets(sorted_events, bucket_seconds, max_events_per_bucket)
+    mttd, mttr = compute_mttd_mttr(**_marker_args(markers or window_markers))
+
+    return schemas.ReplayResponse(
+        incident_id=incident.id,
+        buckets=buckets,
+        mttd_minutes=mttd,
+        mttr_minutes=mttr,
+        current_phase=buckets[-1].phase if buckets else "pre-incident",
+        bucket_size_seconds=bucket_seconds,
+        next_cursor=next_cursor
+    )
+
+def rollup_bucket(row: models.ReplayBucket) -> schemas.TimelineBucket:
+    return schemas.TimelineBucket(
+        timestamp_start=row.bucket_start,
+        timestamp_end=row.bucket_start + timedelta(seconds=row.bucket_size),
+        events=[],
+        phase=row.phase,
+        event_count=row.event_count,
+        counts_by_source=row.counts_by_source or {},
+        truncated=row.event_count > 0
+    )
+
+def replay_from_rollups(
+    incident: models.Incident,
+    rollup_buckets: List[models.ReplayBucket],
+    bucket_seconds: int,
+    markers: Dict[str, Any],
+    next_cursor: str = None
+) -> schemas.ReplayResponse:
+    """
+    Build a counts-only replay from precomputed rollup rows, without touching
+    the events table.
+    """
+    with metrics.stage("replay.rollups"):
+        buckets = [rollup_bucket(row) for row in rollup_buckets]
+    mttd, mttr = compute_mttd_mttr(**_marker_args(markers))
 
     return schemas.ReplayResponse(
         incident_id=incident.id,
         buckets=buckets,
-        mttd_minutes=round(mttd, 2) if mttd else None,
-        mttr_minutes=round(mttr, 2) if mttr else None,
-        current_phase=buckets[-1].phase if buckets else "pre-incident"
+        mttd_minutes=mttd,
+        mttr_minutes=mttr,
+        current_phase=buckets[-1].phase if buckets else "pre-incident",
+        bucket_size_seconds=bucket_seconds,
+        next_cursor=next_cursor
     )
+
+def replay_overview(
+    incident: models.Incident,
+    rollup_buckets: List[models.ReplayBucket],
+    bucket_seconds: int,
+    levels: Iterable[int],
+    markers: Dict[str, Any],
+    window_start: datetime,
+    window_end: datetime
+) -> schemas.ReplayOverviewResponse:
+    """
+    A counts-only replay of one rollup level over [window_start, window_end),
+    with totals by phase and source. Buckets are whole rollup buckets, so the
+    first and last may reach past the window.
+    """
+    with metrics.stage("replay.rollups"):
+        buckets = [rollup_bucket(row) for row in rollup_buckets]
+        counts_by_phase: Dict[str, int] = {}
+        counts_by_source: Dict[str, int] = {}
+        for bucket in buckets:
+            counts_by_phase[bucket.phase] = counts_by_phase.get(bucket.phase, 0) + bucket.event_count
+            for source, count in bucket.counts_by_source.items():
+                counts_by_source[source] = counts_by_source.get(source, 0) + count
+    mttd, mttr = compute_mttd_mttr(**_marker_args(markers))
+
+    return schemas.ReplayOverviewResponse(
+        incident_id=incident.id,
+        buckets=buckets,
+        mttd_minutes=mttd,
+        mttr_minutes=mttr,
+        current_phase=buckets[-1].phase if buckets else "pre-incident",
+        bucket_size_seconds=bucket_seconds,
+        window_start=window_start,
+        window_end=window_end,
+        levels=list(levels),
+        counts_by_phase=counts_by_phase,
+        counts_by_source=counts_by_source
+    )
+
+def replay_from_columns(
+    incident: models.Incident,
+    columns: ColumnarEvents,
+    bucket_seconds: int,
+    start: datetime = None,
+    end: datetime = None,
+    markers: Dict[str, Any] = None,
+    next_cursor: str = None
+) -> schemas.ReplayResponse:
+    """
+    Build a counts-only replay for any bucket size from columnar events,
+    locating the window by bisection and bucketing on integer timestamps.
+    """
+    started = time.perf_counter()
+    timestamps = columns.timestamps
+    lo = bisect_left(timestamps, to_micros(start)) if start is not None else 0
+    hi = bisect_left(timestamps, to_micros(end)) if end is not None else len(timestamps)
+
+    flags_by_code = [classify_event_type(t) if t is not None else 0 for t in columns.dictionaries["event_type"].values]
+    source_values = columns.dictionaries["source_type"].values
+    event_type_codes = columns.codes["event_type"]
+    source_codes = columns.codes["source_type"]
+    occurrences = columns.occurrences
+    bucket_micros = bucket_seconds * 1_000_000
+    bucket_delta = timedelta(seconds=bucket_seconds)
+
+    buckets = []
+    current_index = None
+    count = flags = 0
+    sources: Dict[str, int] = {}
+
+    def flush():
+        bucket_start = EPOCH + bucket_delta * current_index
+        buckets.append(schemas.TimelineBucket(
+            timestamp_start=bucket_start,
+            timestamp_end=bucket_start + bucket_delta,
+            events=[],
+            phase=phase_for_flags(flags),
+            event_count=count,
+            counts_by_source=sources,
+            truncated=True
+        ))
+
+    for i in range(lo, hi):
+        index = timestamps[i] // bucket_micros
+        if index != current_index:
+            if count:
+                flush()
+            current_index = index
+            count = flags = 0
+            sources = {}
+        count += occurrences[i]
+        flags |= flags_by_code[event_type_codes[i]]
+        source = source_values[source_codes[i]]
+        sources[source] = sources.get(source, 0) + occurrences[i]
+    if count:
+        flush()
+    metrics.observe_stage("replay.columns", time.perf_counter() - started)
+
+    mttd, mttr = compute_mttd_mttr(**_marker_args(markers)) if markers else (None, None)
+    return schemas.ReplayResponse(
+        incident_id=incident.id,
+        buckets=buckets,
+        mttd_minutes=mttd,
+        mttr_minutes=mttr,
+        current_phase=buckets[-1].phase if buckets else "pre-incident",
+        bucket_size_seconds=bucket_seconds,
+        next_cursor=next_cursor
+    )
+
+def _marker_args(markers: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: markers.get(key) for key in ("first_error", "first_alert", "first_recovery")}
@@ -0,0 +1,296 @@
+from typing import List, Dict, Any, Iterable, Tuple
+from datetime import datetime, timedelta
+from sqlalchemy import case, func, literal_column, or_, select
+from sqlalchemy.orm import Session
+from .. import models
+from ..database import upsert, least, greatest
+from . import replay, compaction
+
+# Bucket sizes (seconds) kept materialized in replay_buckets, finest first: a
+# pyramid of zoom levels from one second to one day. Each size divides the
+# next, so every level is folded from the one below it rather than from the
+# events. It includes the sizes replay.choose_bucket_seconds picks, so default
+# counts-only replays hit the rollup too.
+ROLLUP_BUCKET_SIZES = (1, 5, 15, 60, 300, 900, 3600, 14400, 86400)
+# Present in every incident's rollup, including those built before the pyramid
+STATS_BUCKET_SIZE = 300
+
+_MARKER_FIELDS = ("first_timestamp", "first_error_at", "first_alert_at", "first_recovery_at")
+
+def _earliest(current: datetime, ts: datetime) -> datetime:
+    return ts if current is None or ts < current else current
+
+def _empty_delta() -> Dict[str, Any]:
+    return {
+        "event_count": 0, "sources": {}, "event_types": {}, "flags": 0,
+        "first_timestamp": None, "last_timestamp": None,
+        "first_error_at": None, "first_alert_at": None, "first_recovery_at": None,
+    }
+
+def _fold(target: Dict[str, Any], delta: Dict[str, Any]):
+    target["event_count"] += delta["event_count"]
+    for field in ("sources", "event_types"):
+        counts = target[field]
+        for key, count in delta[field].items():
+            counts[key] = counts.get(key, 0) + count
+    target["flags"] |= delta["flags"]
+    for field in _MARKER_FIELDS:
+        if delta[field] is not None:
+            target[field] = _earliest(target[field], delta[field])
+    if target["last_timestamp"] is None or delta["last_timestamp"] > target["last_timestamp"]:
+        target["last_timestamp"] = delta["last_timestamp"]
+
+def accumulate(events: Iterable[Any]) -> Dict[Tuple[int, datetime], Dict[str, Any]]:
+    """
+    Fold events (anything with timestamp/source_type/event_type) into per-bucket
+    deltas for every rollup size. A compacted burst counts all its occurrences
+    in the bucket of its first event.
+    """
+    finest = ROLLUP_BUCKET_SIZES[0]
+    level: Dict[datetime, Dict[str, Any]] = {}
+    for e in events:
+        ts = replay.normalize_timestamp(e.timestamp)
+        flags = replay.classify_event_type(e.event_type)
+        weight = compaction.occurrences(e)
+        start = replay.bucket_floor(ts, finest)
+        delta = level.get(start)
+        if delta is None:
+            delta = level[start] = _empty_delta()
+        delta["event_count"] += weight
+        delta["sources"][e.source_type] = delta["sources"].get(e.source_type, 0) + weight
+        delta["event_types"][e.event_type] = delta["event_types"].get(e.event_type, 0) + weight
+        delta["flags"] |= flags
+        delta["first_timestamp"] = _earliest(delta["first_timestamp"], ts)
+        if delta["last_timestamp"] is None or ts > delta["last_timestamp"]:
+            delta["last_timestamp"] = ts
+        if flags & (replay.ERROR | replay.CRASH):
+            delta["first_error_at"] = _earliest(delta["first_error_at"], ts)
+        if flags & replay.ALERT:
+            delta["first_alert_at"] = _earliest(delta["first_alert_at"], ts)
+        if flags & (replay.RECOVERY | replay.RESOLVE):
+            delta["first_recovery_at"] = _earliest(delta["first_recovery_at"], ts)
+
+    # Per event only the finest level is touched; each coarser level folds the
+    # buckets of the level below, which all fall inside one of its buckets
+    deltas = {(finest, start): delta for start, delta in level.items()}
+    for size in ROLLUP_BUCKET_SIZES[1:]:
+        coarser: Dict[datetime, Dict[str, Any]] = {}
+        for start, delta in level.items():
+            coarse_start = replay.bucket_floor(start, size)
+            target = coarser.get(coarse_start)
+            if target is None:
+                target = coarser[coarse_start] = _empty_delta()
+            _fold(target, delta)
+        deltas.update(((size, start), delta) for start, delta in coarser.items())
+        level = coarser
+    return deltas
+
+def _row_values(incident_id: str, size: int, start: datetime, delta: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "incident_id": incident_id, "bucket_size": size, "bucket_start": start,
+        "event_count": delta["event_count"],
+        "counts_by_source": delta["sources"],
+        "counts_by_event_type": delta["event_types"],
+        "flags": delta["flags"],
+        "phase": replay.phase_for_flags(delta["flags"]),
+        "last_timestamp": delta["last_timestamp"],
+        **{field: delta[field] for field in _MARKER_FIELDS},
+    }
+
+def _merged_counts(db: Session, column: str):
+    # Per-key sum of the stored and the incoming JSON count maps, in SQL
+    if db.get_bind().dialect.name == "postgresql":
+        return literal_column(f"""(SELECT coalesce(json_object_agg(key, total), '{{}}') FROM (
+            SELECT key, sum(value::bigint) AS total FROM (
+                SELECT * FROM json_each_text(coalesce(replay_buckets.{column}, '{{}}'))
+                UNION ALL SELECT * FROM json_each_text(coalesce(excluded.{column}, '{{}}'))
+            ) AS counts GROUP BY key
+        ) AS merged)""")
+    return literal_column(f"""(SELECT json_group_object(key, total) FROM (
+        SELECT key, sum(value) AS total FROM (
+            SELECT key, value FROM json_each(coalesce(replay_buckets.{column}, '{{}}'))
+            UNION ALL SELECT key, value FROM json_each(coalesce(excluded.{column}, '{{}}'))
+        ) GROUP BY key
+    ))""")
+
+def apply_events(db: Session, incident_id: str, events: Iterable[Any]) -> List[Dict[str, Any]]:
+    """
+    Incrementally update the rollup rows touched by `events`: one additive
+    INSERT ... ON CONFLICT DO UPDATE, so concurrent ingests into the same
+    buckets add up instead of overwriting each other. Counts, per-source and
+    per-type counts, flags, phase and markers are merged in SQL. Returns the
+    touched rows as column dicts, as stored after the merge; the caller commits.
+    """
+    deltas = accumulate(events)
+    if not deltas:
+        return []
+
+    table = models.ReplayBucket.__table__
+    stmt = upsert(db, table)
+    new = stmt.excluded
+    flags = table.c.flags.op("|")(new.flags)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.incident_id, table.c.bucket_size, table.c.bucket_start],
+        set_={
+            "event_count": table.c.event_count + new.event_count,
+            "counts_by_source": _merged_counts(db, "counts_by_source"),
+            "counts_by_event_type": _merged_counts(db, "counts_by_event_type"),
+            "flags": flags,
+            "phase": case(*((flags.op("&")(flag) != 0, phase) for flag, phase in replay.PHASE_FLAGS), else_="pre-incident"),
+            "last_timestamp": greatest(db, table.c.last_timestamp, new.last_timestamp),
+            **{field: least(db, table.c[field], new[field]) for field in _MARKER_FIELDS},
+        },
+    ).returning(*table.c)
+    # Fixed key order, so concurrent writers lock shared buckets in the same order
+    rows = [_row_values(incident_id, size, start, delta) for (size, start), delta in sorted(deltas.items())]
+    return [dict(row._mapping) for row in db.execute(stmt, rows)]
+
+def _event_rows(db: Session, incident_id: str) -> Iterable[Any]:
+    # Raw events of an incident for rollup folding: its archive file once archived
+    from . import archive # archive imports this module
+
+    archive_path = db.query(models.Incident.archive_path).filter(models.Incident.id == incident_id).scalar()
+    if archive_path:
+        return archive.iter_events(archive_path)
+    return db.query(models.Event.timestamp, models.Event.source_type, models.Event.event_type, models.Event.occurrences).filter(
+        models.Event.incident_id == incident_id
+    ).execution_options(yield_per=10000)
+
+def rebuild(db: Session, incident_id: str) -> int:
+    """
+    Recompute an incident's rollup from its raw events (or its archive file),
+    e.g. for incidents ingested before the rollup or one of its levels
+    existed. The caller commits.
+    """
+    db.query(models.ReplayBucket).filter(models.ReplayBucket.incident_id == incident_id).delete(synchronize_session=False)
+    return len(apply_events(db, incident_id, _event_rows(db, incident_id)))
+
+def missing_incidents(db: Session) -> List[str]:
+    """Incidents with events (or an archive) but no coarsest rollup level, i.e. not backfilled yet."""
+    bucket = models.ReplayBucket
+    has_level = select(bucket.incident_id).where(bucket.incident_id == models.Incident.id, bucket.bucket_size == ROLLUP_BUCKET_SIZES[-1]).exists()
+    has_events = select(models.Event.id).where(models.Event.incident_id == models.Incident.id).exists()
+    return [incident_id for (incident_id,) in db.query(models.Incident.id).filter(
+        ~has_level, or_(models.Incident.archive_path.isnot(None), has_events)
+    )]
+
+def _markers_from_events(db: Session, incident_id: str) -> Tuple:
+    # The rollup query's values in one pass over the events, grouped by type; nothing is written
+    from . import archive # archive imports this module
+
+    archive_path = db.query(models.Incident.archive_path).filter(models.Incident.id == incident_id).scalar()
+    if archive_path:
+        spans: Dict[str, Tuple[datetime, datetime]] = {}
+        for e in archive.iter_events(archive_path):
+            first, last = spans.get(e.event_type, (e.timestamp, e.timestamp))
+            spans[e.event_type] = (min(first, e.timestamp), max(last, e.timestamp))
+        rows = [(event_type, first, last) for event_type, (first, last) in spans.items()]
+    else:
+        rows = db.query(models.Event.event_type, func.min(models.Event.timestamp), func.max(models.Event.timestamp)).filter(
+            models.Event.incident_id == incident_id
+        ).group_by(models.Event.event_type).all()
+
+    first_ts = last_ts = first_error = first_alert = first_recovery = None
+    for event_type, first, last in rows:
+        first, last = replay.normalize_timestamp(first), replay.normalize_timestamp(last)
+        flags = replay.classify_event_type(event_type)
+        first_ts = _earliest(first_ts, first)
+        if last_ts is None or last > last_ts:
+            last_ts = last
+        if flags & (replay.ERROR | replay.CRASH):
+            first_error = _earliest(first_error, first)
+        if flags & replay.ALERT:
+            first_alert = _earliest(first_alert, first)
+        if flags & (replay.RECOVERY | replay.RESOLVE):
+            first_recovery = _earliest(first_recovery, first)
+    return first_ts, last_ts, first_error, first_alert, first_recovery
+
+def incident_markers(db: Session, incident_id: str) -> Dict[str, Any]:
+    """
+    Event span and first error/alert/recovery timestamps for an incident, read
+    from the coarsest rollup level. Read-only: an incident whose rollup lacks
+    that level (ingested before the pyramid, not yet backfilled) gets them from
+    its events instead, with `rollup` False so callers skip the rollup too.
+    """
+    bucket = models.ReplayBucket
+    row = db.query(
+        func.min(bucket.first_timestamp),
+        func.max(bucket.last_timestamp),
+        func.min(bucket.first_error_at),
+        func.min(bucket.first_alert_at),
+        func.min(bucket.first_recovery_at),
+    ).filter(bucket.incident_id == incident_id, bucket.bucket_size == ROLLUP_BUCKET_SIZES[-1]).one()
+    rollup = row[0] is not None
+    if not rollup:
+        row = _markers_from_events(db, incident_id)
+
+    first_ts, last_ts, first_error, first_alert, first_recovery = row
+    return {
+        "first_timestamp": first_ts,
+        "last_timestamp": last_ts,
+        "first_error": first_error,
+        "first_alert": first_alert,
+        "first_recovery": first_recovery,
+        "rollup": rollup,
+    }
+
+def compute_buckets(db: Session, incident_id: str, bucket_size: int, start: datetime = None, end: datetime = None) -> List[models.ReplayBucket]:
+    """
+    load_buckets for an incident that is not backfilled yet: the level is
+    folded from the raw events in memory (transient rows, never added to the
+    session). Costs a scan of the incident's events.
+    """
+    rows = [
+        models.ReplayBucket(**_row_values(incident_id, size, bucket_start, delta))
+        for (size, bucket_start), delta in accumulate(_event_rows(db, incident_id)).items()
+        if size == bucket_size and (start is None or bucket_start >= start) and (end is None or bucket_start < end)
+    ]
+    return sorted(rows, key=lambda row: row.bucket_start)
+
+def load_buckets(db: Session, incident_id: str, bucket_size: int, start: datetime = None, end: datetime = None) -> List[models.ReplayBucket]:
+    query = db.query(models.ReplayBucket).filter(
+        models.ReplayBucket.incident_id == incident_id,
+        models.ReplayBucket.bucket_size == bucket_size
+    )
+    if start is not None:
+        query = query.filter(models.ReplayBucket.bucket_start >= start)
+    if end is not None:
+        query = query.filter(models.ReplayBucket.bucket_start < end)
+    return query.order_by(models.ReplayBucket.bucket_start.asc()).all()
+
+def level_bucket_count(start: datetime, end: datetime, bucket_size: int) -> int:
+    """Number of `bucket_size` buckets covering [start, end)."""
+    delta = timedelta(seconds=bucket_size)
+    last = max(end - timedelta(microseconds=1), start)
+    return (replay.bucket_floor(last, bucket_size) - replay.bucket_floor(start, bucket_size)) // delta + 1
+
+def choose_level(start: datetime, end: datetime, target_buckets: int) -> int:
+    """The finest rollup level that covers [start, end) in at most `target_buckets` buckets."""
+    for size in ROLLUP_BUCKET_SIZES:
+        if level_bucket_count(start, end, size) <= target_buckets:
+            return size
+    return ROLLUP_BUCKET_SIZES[-1]
+
+if __name__ == "__main__":
+    # Backfill step, run once after `alembic upgrade head`: builds the rollup of
+    # incidents ingested before it (or its coarsest level) existed. --all
+    # rebuilds every incident, e.g. after levels were added to ROLLUP_BUCKET_SIZES.
+    import argparse
+    from ..database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Backfill or rebuild the replay rollup")
+    parser.add_argument("--all", action="store_true", help="rebuild every incident, not only those missing the rollup")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.all:
+            incident_ids = [incident_id for (incident_id,) in db.query(models.Incident.id).all()]
+        else:
+            incident_ids = missing_incidents(db)
+        for incident_id in incident_ids:
+            rebuild(db, incident_id)
+            db.commit()
+        print(f"Rebuilt the replay rollup of {len(incident_ids)} incidents")
+    finally:
+        db.close()
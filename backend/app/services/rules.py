@@ -0,0 +1,118 @@
+import os
+from array import array
+from bisect import bisect_left
+from datetime import timedelta
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+from pydantic import BaseModel
+from .event_store import ColumnarEvents
+
+_MICROSECOND = timedelta(microseconds=1)
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), "default_rules.json")
+
+# --- RULE CONFIG ---
+
+class TriggerRule(BaseModel):
+    name: str
+    event_types: List[str]
+    confidence: float
+    root_cause: str # formatted with {time}, {event_type}, {actor_id}, {resource_id}
+    trigger_desc: str
+    effect_desc: str # additionally formatted with {effect_event_type}
+    recommendations: List[str] = []
+
+class RuleSet(BaseModel):
+    lookback_minutes: float = 15
+    onset_gap_minutes: float = 15 # effects closer than this to the previous one belong to the same onset
+    effect_event_type_contains: List[str] = ["error", "crash"]
+    key_event_types: List[str] = []
+    triggers: List[TriggerRule] = []
+
+# --- COMPILED RULES ---
+
+class CompiledRules:
+    """
+    A RuleSet compiled into lookup tables: event_type -> trigger rule, and a
+    per-event_type memo of whether it counts as an effect (error onset).
+    """
+
+    def __init__(self, rule_set: RuleSet):
+        self.rule_set = rule_set
+        self.lookback = timedelta(minutes=rule_set.lookback_minutes)
+        self.onset_gap = timedelta(minutes=rule_set.onset_gap_minutes)
+        self.trigger_by_event_type: Dict[str, TriggerRule] = {}
+        for rule in rule_set.triggers:
+            for event_type in rule.event_types:
+                # First rule listing an event type wins
+                self.trigger_by_event_type.setdefault(event_type, rule)
+        self.key_event_types = frozenset(rule_set.key_event_types)
+        self._effect_patterns = tuple(p.lower() for p in rule_set.effect_event_type_contains)
+        self._effect_memo: Dict[str, bool] = {}
+
+    def is_effect(self, event_type: str) -> bool:
+        result = self._effect_memo.get(event_type)
+        if result is None:
+            lowered = event_type.lower()
+            result = self._effect_memo[event_type] = any(p in lowered for p in self._effect_patterns)
+        return result
+
+@lru_cache(maxsize=8)
+def load_rules(path: str = None) -> CompiledRules:
+    """Load and compile a rule file (ANALYZER_RULES_PATH, or the bundled defaults)."""
+    path = path or os.getenv("ANALYZER_RULES_PATH") or DEFAULT_RULES_PATH
+    with open(path) as f:
+        return CompiledRules(RuleSet.model_validate_json(f.read()))
+
+# --- TRIGGER INDEX ---
+
+class TriggerIndex:
+    """Time-sorted trigger candidates per rule over columnar events, searched by bisection."""
+
+    def __init__(self, rules: CompiledRules, columns: ColumnarEvents):
+        self.rules = rules
+        self.columns = columns
+        # Resolve each distinct event type once, then walk the integer codes
+        rule_by_code = [rules.trigger_by_event_type.get(t) if t is not None else None for t in columns.dictionaries["event_type"].values]
+        self._timestamps: Dict[str, array] = {}
+        self._rows: Dict[str, List[int]] = {}
+        self._rules_by_name = {rule.name: rule for rule in rules.rule_set.triggers}
+        timestamps = columns.timestamps
+        for i, code in enumerate(columns.codes["event_type"]):
+            rule = rule_by_code[code]
+            if rule is not None:
+                self._timestamps.setdefault(rule.name, array("q")).append(timestamps[i])
+                self._rows.setdefault(rule.name, []).append(i)
+
+    def closest_before(self, onset_micros: int) -> Optional[Tuple[TriggerRule, int]]:
+        """The trigger row closest before `onset_micros` within the lookback window, across all rules."""
+        best = None
+        best_ts = None
+        window_start = onset_micros - self.rules.lookback // _MICROSECOND
+        for name, timestamps in self._timestamps.items():
+            i = bisect_left(timestamps, onset_micros) - 1
+            if i < 0 or timestamps[i] < window_start:
+                continue
+            row = self._rows[name][i]
+            if best is None or timestamps[i] > best_ts or (timestamps[i] == best_ts and row > best[1]):
+                best = (self._rules_by_name[name], row)
+                best_ts = timestamps[i]
+        return best
+
+def find_onsets(rules: CompiledRules, columns: ColumnarEvents) -> List[int]:
+    """Rows of effects that start a new error episode (no effect in the preceding onset gap)."""
+    effect_by_code = [t is not None and rules.is_effect(t) for t in columns.dictionaries["event_type"].values]
+    gap = rules.onset_gap // _MICROSECOND
+    timestamps = columns.timestamps
+    onsets = []
+    previous = None
+    for i, code in enumerate(columns.codes["event_type"]):
+        if effect_by_code[code]:
+            if previous is None or timestamps[i] - previous > gap:
+                onsets.append(i)
+            previous = timestamps[i]
+    return onsets
+
+def key_event_rows(rules: CompiledRules, columns: ColumnarEvents) -> List[int]:
+    key_codes = {code for value, code in columns.dictionaries["event_type"].codes.items() if value in rules.key_event_types}
+    return [i for i, code in enumerate(columns.codes["event_type"]) if code in key_codes]
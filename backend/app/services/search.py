@@ -0,0 +1,91 @@
+import json
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from sqlalchemy import select, func, literal_column, table, column
+from sqlalchemy.orm import Session
+from .. import models
+from .serialization import EVENT_COLUMNS
+
+# Search over event messages, types, resources and metadata, backed by the
+# full-text index the database maintains at ingest (see models.EVENT_SEARCH_DDL):
+# FTS5 with bm25 ranking on SQLite, tsvector/GIN with ts_rank on Postgres.
+# Every term of `q` must match. `metadata` is a JSON object the event metadata
+# must contain (@> on Postgres, served by the jsonb_path_ops index).
+# Archived incidents are not searched; their events have left the table.
+
+MAX_RESULTS = 500
+
+def fts5_query(q: str) -> str:
+    # Each whitespace-separated term becomes a quoted FTS5 string, so user
+    # input never reaches the query syntax and "max_replicas" matches as a phrase
+    return " ".join('"' + term.replace('"', '""') + '"' for term in q.split())
+
+def _text_match(db: Session, q: str):
+    """(where clause, rank column) for the backend's full-text index. Higher rank is better."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        vector = literal_column("events.search_vector")
+        tsquery = func.plainto_tsquery("simple", q)
+        return vector.op("@@")(tsquery), func.ts_rank(vector, tsquery)
+    if dialect == "sqlite":
+        fts = literal_column("events_fts")
+        # bm25() is lower-is-better
+        return fts.op("MATCH")(fts5_query(q)), -func.bm25(fts)
+    raise ValueError(f"Full-text search is not supported on {dialect}")
+
+def _metadata_filters(db: Session, metadata: Dict[str, Any]):
+    if db.get_bind().dialect.name == "postgresql":
+        return [models.Event.event_metadata.contains(metadata)]
+    filters = []
+    for key, value in metadata.items():
+        path = '$."' + key.replace('"', '\\"') + '"'
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value, separators=(",", ":"))
+        filters.append(func.json_extract(models.Event.event_metadata, path) == value)
+    return filters
+
+def search_events(
+    db: Session,
+    q: Optional[str] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    incident_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    source_type: Optional[str] = None,
+    event_type: Optional[str] = None,
+    limit: int = 50
+) -> List[Any]:
+    """
+    EVENT_COLUMNS rows plus a `rank`, best match first (newest first without
+    `q`). At least one of `q` and `metadata` is required.
+    """
+    if not (q and q.strip()) and not metadata:
+        raise ValueError("A search query or metadata filter is required")
+
+    if q and q.strip():
+        match, rank = _text_match(db, q)
+        query = select(*EVENT_COLUMNS, rank.label("rank")).where(match)
+        if db.get_bind().dialect.name == "sqlite":
+            query = query.select_from(models.Event).join(
+                table("events_fts", column("rowid")), literal_column("events_fts.rowid") == literal_column("events.search_rowid")
+            )
+        order = [literal_column("rank").desc(), models.Event.timestamp.desc()]
+    else:
+        query = select(*EVENT_COLUMNS, literal_column("NULL").label("rank"))
+        order = [models.Event.timestamp.desc()]
+
+    if metadata:
+        query = query.where(*_metadata_filters(db, metadata))
+    for col, value in (
+        (models.Event.incident_id, incident_id),
+        (models.Event.source_type, source_type),
+        (models.Event.event_type, event_type),
+    ):
+        if value is not None:
+            query = query.where(col == value)
+    if start is not None:
+        query = query.where(models.Event.timestamp >= start)
+    if end is not None:
+        query = query.where(models.Event.timestamp < end)
+
+    return db.execute(query.order_by(*order).limit(min(limit, MAX_RESULTS))).all()
@@ -0,0 +1,207 @@
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence
+import time
+import orjson
+from .. import models, schemas, metrics
+from . import replay
+from .event_store import to_micros
+
+# Fast response path for large event lists: rows are selected as plain tuples
+# and encoded straight to JSON with orjson, in chunks suitable for a
+# StreamingResponse, skipping ORM instances, EventResponse validation and
+# jsonable_encoder. The output matches the pydantic-rendered responses.
+#
+# The "columns" format instead sends one array per field, with low-cardinality
+# strings dictionary-encoded and timestamps as epoch microseconds:
+#   {"count": n, "incident_id": ..., "columns": {field: [...]}, "dictionaries": {field: [values]}}
+# where columns[field][i] indexes dictionaries[field] for dictionary-encoded fields.
+
+CHUNK_BYTES = 64 * 1024
+FORMATS = ("json", "columns")
+
+# Selected columns, in EventResponse field order
+EVENT_COLUMNS = (
+    models.Event.timestamp,
+    models.Event.source_type,
+    models.Event.event_type,
+    models.Event.actor_type,
+    models.Event.actor_id,
+    models.Event.resource_id,
+    models.Event.message,
+    models.Event.event_metadata,
+    models.Event.occurrences,
+    models.Event.last_timestamp,
+    models.Event.id,
+    models.Event.incident_id,
+)
+EVENT_FIELDS = tuple(c.key for c in EVENT_COLUMNS)
+DICTIONARY_FIELDS = ("source_type", "event_type", "actor_type", "actor_id", "resource_id")
+TIMESTAMP_FIELDS = ("timestamp", "last_timestamp")
+BUCKET_COLUMNS = ("timestamp_start", "phase", "event_count", "counts_by_source", "truncated", "event_offsets")
+
+def chunked(parts: Iterable[bytes], chunk_bytes: int = CHUNK_BYTES) -> Iterator[bytes]:
+    """Coalesce small encoded parts into chunks of roughly `chunk_bytes`."""
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_bytes:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+def _timed(buckets: Iterable[Any], spent: List[float]) -> Iterator[Any]:
+    # Adds the time spent producing each bucket to spent[0], excluding the caller's work
+    iterator = iter(buckets)
+    while True:
+        started = time.perf_counter()
+        bucket = next(iterator, None)
+        spent[0] += time.perf_counter() - started
+        if bucket is None:
+            return
+        yield bucket
+
+def _encode_events(rows: Sequence[Any]) -> bytes:
+    return orjson.dumps([dict(zip(EVENT_FIELDS, row)) for row in rows])
+
+def event_page_chunks(rows: Sequence[Any], next_cursor: Optional[str]) -> Iterator[bytes]:
+    """An EventPage ({"items": [...], "next_cursor": ...}) encoded from EVENT_COLUMNS rows."""
+    def parts():
+        yield b'{"items":['
+        for start in range(0, len(rows), 1000):
+            encoded = _encode_events(rows[start:start + 1000])
+            # Splice batch arrays together without their brackets
+            yield (b"," if start else b"") + encoded[1:-1]
+        yield b'],"next_cursor":' + orjson.dumps(next_cursor) + b"}"
+    return chunked(parts())
+
+def event_columns(rows: Sequence[Any], incident_id: str = None) -> Dict[str, Any]:
+    """EVENT_COLUMNS rows as one array per field (see module comment)."""
+    dictionaries: Dict[str, Dict[Any, int]] = {name: {} for name in DICTIONARY_FIELDS}
+    columns: Dict[str, List[Any]] = {name: [] for name in EVENT_FIELDS if name != "incident_id"}
+    for row in rows:
+        for name, value in zip(EVENT_FIELDS, row):
+            if name == "incident_id":
+                continue
+            if name in TIMESTAMP_FIELDS:
+                value = to_micros(value) if value is not None else None
+            elif name in dictionaries:
+                codes = dictionaries[name]
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(codes)
+                value = code
+            columns[name].append(value)
+    return {
+        "count": len(rows),
+        "incident_id": incident_id,
+        "columns": columns,
+        "dictionaries": {name: list(codes) for name, codes in dictionaries.items()},
+    }
+
+def event_page_columns(rows: Sequence[Any], incident_id: str, next_cursor: Optional[str]) -> bytes:
+    return orjson.dumps({"events": event_columns(rows, incident_id), "next_cursor": next_cursor})
+
+def replay_chunks(
+    incident_id: str,
+    rows: Sequence[Any],
+    bucket_seconds: int = None,
+    max_events_per_bucket: int = None,
+    markers: Dict[str, Any] = None,
+    next_cursor: str = None,
+    format: str = "json"
+) -> Iterator[bytes]:
+    """
+    A ReplayResponse for timestamp-sorted EVENT_COLUMNS rows, encoded bucket
+    by bucket. See replay.generate_replay for `markers`. In the "columns"
+    format, bucket fields are arrays and the sampled events of bucket i are
+    events[event_offsets[i]:event_offsets[i + 1]].
+    """
+    if bucket_seconds is None and rows:
+        bucket_seconds = replay.choose_bucket_seconds((rows[-1].timestamp - rows[0].timestamp).total_seconds())
+
+    window_markers: Dict[str, Any] = {}
+    buckets = replay.iter_buckets(rows, bucket_seconds, window_markers) if rows else iter(())
+
+    def tail(last_phase: str) -> Dict[str, Any]:
+        mttd, mttr = replay.compute_mttd_mttr(**replay._marker_args(markers or window_markers)) if (markers or rows) else (None, None)
+        return {
+            "mttd_minutes": mttd,
+            "mttr_minutes": mttr,
+            "current_phase": last_phase,
+            "bucket_size_seconds": bucket_seconds,
+            "next_cursor": next_cursor,
+        }
+
+    # Grouping rows into buckets and encoding them interleave; both are reported
+    # as their own stages, like replay.build_buckets does
+    bucketing = [0.0]
+    buckets = _timed(buckets, bucketing)
+
+    if format == "columns":
+        started = time.perf_counter()
+        columns = {name: [] for name in BUCKET_COLUMNS}
+        sampled: List[Any] = []
+        last_phase = "pre-incident"
+        for start, end, bucket_events, flags, count, sources in buckets:
+            sample = bucket_events if max_events_per_bucket is None else bucket_events[:max_events_per_bucket]
+            last_phase = replay.phase_for_flags(flags)
+            columns["timestamp_start"].append(to_micros(start))
+            columns["phase"].append(last_phase)
+            columns["event_count"].append(count)
+            columns["counts_by_source"].append(sources)
+            columns["truncated"].append(len(sample) < len(bucket_events))
+            columns["event_offsets"].append(len(sampled))
+            sampled.extend(sample)
+        columns["event_offsets"].append(len(sampled))
+        body = {"incident_id": incident_id, "buckets": columns, "events": event_columns(sampled, incident_id)}
+        body.update(tail(last_phase))
+        encoded = orjson.dumps(body)
+        metrics.observe_stage("replay.bucketing", bucketing[0])
+        metrics.observe_stage("replay.serialize", time.perf_counter() - started - bucketing[0])
+        return iter((encoded,))
+
+    def parts():
+        # Time the consumer spends between chunks is not counted
+        serialize = 0.0
+        last_phase = "pre-incident"
+        try:
+            yield b'{"incident_id":' + orjson.dumps(incident_id) + b',"buckets":['
+            for i, (start, end, bucket_events, flags, count, sources) in enumerate(buckets):
+                started = time.perf_counter()
+                sample = bucket_events if max_events_per_bucket is None else bucket_events[:max_events_per_bucket]
+                last_phase = replay.phase_for_flags(flags)
+                bucket = orjson.dumps({
+                    "timestamp_start": start,
+                    "timestamp_end": end,
+                    "events": [dict(zip(EVENT_FIELDS, row)) for row in sample],
+                    "phase": last_phase,
+                    "event_count": count,
+                    "counts_by_source": sources,
+                    "truncated": len(sample) < len(bucket_events),
+                })
+                serialize += time.perf_counter() - started
+                yield b"," + bucket if i else bucket
+            # Markers are complete once the buckets are exhausted
+            yield b"]," + orjson.dumps(tail(last_phase))[1:]
+        finally:
+            metrics.observe_stage("replay.bucketing", bucketing[0])
+            metrics.observe_stage("replay.serialize", serialize)
+
+    return chunked(parts())
+
+def replay_response_columns(response: schemas.ReplayResponse) -> bytes:
+    """A counts-only ReplayResponse (no sampled events) in the "columns" format."""
+    columns = {name: [] for name in BUCKET_COLUMNS}
+    for bucket in response.buckets:
+        columns["timestamp_start"].append(to_micros(bucket.timestamp_start))
+        columns["phase"].append(bucket.phase)
+        columns["event_count"].append(bucket.event_count)
+        columns["counts_by_source"].append(bucket.counts_by_source)
+        columns["truncated"].append(bucket.truncated)
+        columns["event_offsets"].append(0)
+    columns["event_offsets"].append(0)
+    body = response.model_dump(include={"incident_id", "mttd_minutes", "mttr_minutes", "current_phase", "bucket_size_seconds", "next_cursor"})
+    body.update(buckets=columns, events=event_columns([], response.incident_id))
+    return orjson.dumps(body)
@@ -0,0 +1,62 @@
+from typing import Tuple, Optional
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from .. import models, metrics
+from . import analyzer, correlation, archive
+from .event_store import event_watermark, store
+from .cache import cache as response_cache
+
+def is_fresh(summary: Optional[models.IncidentSummary], watermark: Tuple[int, Optional[datetime]]) -> bool:
+    return summary is not None and (summary.source_event_count, summary.source_last_event_at) == watermark
+
+def summarize(db: Session, incident_id: str, force: bool = False) -> Tuple[Optional[models.IncidentSummary], bool]:
+    """
+    Return the incident's summary, recomputing it only when events were
+    ingested since it was generated (or when forced). The second element is
+    True on a cache hit.
+    """
+    incident = db.query(models.Incident).filter(models.Incident.id == incident_id).first()
+    if not incident:
+        return None, False
+
+    existing_summary = db.query(models.IncidentSummary).filter(models.IncidentSummary.incident_id == incident_id).first()
+    if incident.archive_path:
+        # Archived events no longer change; the summary was frozen when they were archived
+        if not force and existing_summary is not None:
+            return existing_summary, True
+        with metrics.stage("summarize.load"):
+            columns = archive.read_columns(incident.archive_path)
+        watermark = (columns.total_occurrences, columns.last_timestamp())
+    else:
+        watermark = event_watermark(db, incident_id)
+        if not force and is_fresh(existing_summary, watermark):
+            return existing_summary, True
+
+        # Generate summary from the columnar event store (loaded only if not already hot)
+        with metrics.stage("summarize.load"):
+            columns = store.get(db, incident_id, watermark)
+
+    def correlate(actor_id, resource_id, event_type, timestamp):
+        since = timestamp - timedelta(days=correlation.DEFAULT_LOOKBACK_DAYS)
+        return correlation.lookup(db, actor_id, resource_id, event_type, exclude_incident_id=incident_id, since=since, limit=correlation.MAX_RELATED_INCIDENTS)
+
+    summary_model = analyzer.analyze_columns(incident, columns, correlate=correlate)
+
+    # Store or update in DB
+    if existing_summary:
+        existing_summary.probable_root_cause = summary_model.probable_root_cause
+        existing_summary.causal_chain = summary_model.causal_chain
+        existing_summary.key_events = summary_model.key_events
+        existing_summary.recommendations = summary_model.recommendations
+        existing_summary.confidence_score = summary_model.confidence_score
+        existing_summary.generated_at = datetime.utcnow()
+        summary_to_return = existing_summary
+    else:
+        db.add(summary_model)
+        summary_to_return = summary_model
+    summary_to_return.source_event_count, summary_to_return.source_last_event_at = watermark
+
+    db.commit()
+    db.refresh(summary_to_return)
+    response_cache.invalidate(incident_id)
+    return summary_to_return, False
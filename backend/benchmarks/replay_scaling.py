@@ -0,0 +1,67 @@
+"""
+Replay bucketing scaling benchmark.
+
+Runs services.replay.generate_replay over synthetic incidents of increasing
+size and prints the time per event, which should stay roughly flat if the
+bucketing engine is linear.
+
+    cd backend
+    python -m benchmarks.replay_scaling --sizes 1000 10000 100000 1000000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from app.services import replay
+
+EVENT_TYPES = [
+    "deploy_started", "config_change", "latency_spike", "pod_crash",
+    "error_rate_spike", "alert_fired", "rollback", "recovery", "heartbeat",
+]
+
+def make_events(count: int, duration: timedelta, seed: int = 42):
+    rng = random.Random(seed)
+    start = datetime(2024, 5, 10, 12, 0, 0)
+    span = duration.total_seconds()
+    events = []
+    for i in range(count):
+        events.append(SimpleNamespace(
+            id=f"evt-{i}",
+            incident_id="bench",
+            timestamp=start + timedelta(seconds=rng.random() * span),
+            source_type="app",
+            event_type=rng.choice(EVENT_TYPES),
+            actor_type="system",
+            actor_id="bench",
+            resource_id="svc:bench",
+            message=None,
+            event_metadata=None,
+        ))
+    events.sort(key=lambda e: e.timestamp)
+    return events
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--duration-hours", type=float, default=72.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    incident = SimpleNamespace(id="bench")
+    duration = timedelta(hours=args.duration_hours)
+
+    print(f"{'events':>10} {'buckets':>8} {'best_s':>10} {'us/event':>10}")
+    for size in args.sizes:
+        events = make_events(size, duration)
+        best = None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = replay.generate_replay(incident, events)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{size:>10} {len(result.buckets):>8} {best:>10.3f} {best / size * 1e6:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import re
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+from app.database import Base, SQLALCHEMY_DATABASE_URL, engine_options
+from app import models  # noqa: F401  (registers tables on Base.metadata)
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# Database objects maintained outside the ORM models: the monthly event
+# partitions (0006) and the full-text search index (0008, 0011)
+UNMODELED_TABLES = re.compile(r"^events_(y\d{4}m\d{2}|default|fts(_\w+)?)$")
+UNMODELED_COLUMNS = {"search_vector", "search_rowid"}
+UNMODELED_INDEXES = {"ix_events_search_vector", "ix_events_metadata", "ux_events_search_rowid"}
+# Unique indexes that also hold the partition key on Postgres (0006, 0009)
+PARTITION_KEYED_INDEXES = {"ux_events_incident_content_hash"}
+
+def include_object(obj, name, type_, reflected, compare_to):
+    if type_ == "table":
+        return not UNMODELED_TABLES.match(name)
+    if type_ == "column":
+        return name not in UNMODELED_COLUMNS
+    if type_ == "index":
+        if name in PARTITION_KEYED_INDEXES and context.get_context().dialect.name == "postgresql":
+            return False
+        return name not in UNMODELED_INDEXES
+    return True
+
+def run_migrations_offline():
+    context.configure(
+        url=SQLALCHEMY_DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=SQLALCHEMY_DATABASE_URL.startswith("sqlite"),
+        include_object=include_object,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    connectable = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            render_as_batch=connection.dialect.name == "sqlite",
+            include_object=include_object,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,74 @@
+"""Baseline schema: incidents, events and incident summaries, as first created by Base.metadata.create_all
+
+Databases created by create_all before migrations existed should be stamped
+with `alembic stamp 0001` before running `alembic upgrade head` (see the
+README for databases created later in the series).
+
+Revision ID: 0001
+Revises:
+Create Date: 2024-05-10 12:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "incidents",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("environment", sa.String(), nullable=False),
+        sa.Column("start_time", sa.DateTime(), nullable=False),
+        sa.Column("end_time", sa.DateTime(), nullable=True),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("severity", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_incidents_id", "incidents", ["id"])
+
+    op.create_table(
+        "events",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("incident_id", sa.String(), nullable=True),
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.Column("source_type", sa.String(), nullable=False),
+        sa.Column("event_type", sa.String(), nullable=False),
+        sa.Column("actor_type", sa.String(), nullable=True),
+        sa.Column("actor_id", sa.String(), nullable=True),
+        sa.Column("resource_id", sa.String(), nullable=True),
+        sa.Column("message", sa.String(), nullable=True),
+        sa.Column("event_metadata", sa.JSON(), nullable=True),
+        sa.ForeignKeyConstraint(["incident_id"], ["incidents.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_events_id", "events", ["id"])
+    op.create_index("ix_events_incident_id", "events", ["incident_id"])
+    op.create_index("ix_events_timestamp", "events", ["timestamp"])
+
+    op.create_table(
+        "incident_summaries",
+        sa.Column("incident_id", sa.String(), nullable=False),
+        sa.Column("generated_at", sa.DateTime(), nullable=True),
+        sa.Column("probable_root_cause", sa.String(), nullable=True),
+        sa.Column("causal_chain", sa.JSON(), nullable=True),
+        sa.Column("key_events", sa.JSON(), nullable=True),
+        sa.Column("recommendations", sa.JSON(), nullable=True),
+        sa.Column("confidence_score", sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(["incident_id"], ["incidents.id"]),
+        sa.PrimaryKeyConstraint("incident_id"),
+    )
+
+def downgrade():
+    op.drop_table("incident_summaries")
+    op.drop_index("ix_events_timestamp", table_name="events")
+    op.drop_index("ix_events_incident_id", table_name="events")
+    op.drop_index("ix_events_id", table_name="events")
+    op.drop_table("events")
+    op.drop_index("ix_incidents_id", table_name="incidents")
+    op.drop_table("incidents")
@@ -0,0 +1,42 @@
+"""Replay rollup table
+
+Databases created by create_all after the rollup table existed (but before
+migrations did) are stamped 0001 like any other pre-migration database, so
+the table is only created if it is missing.
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2024-05-10 12:00:00
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0001a"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    if not context.is_offline_mode() and sa.inspect(op.get_bind()).has_table("replay_buckets"):
+        return
+    op.create_table(
+        "replay_buckets",
+        sa.Column("incident_id", sa.String(), nullable=False),
+        sa.Column("bucket_size", sa.Integer(), nullable=False),
+        sa.Column("bucket_start", sa.DateTime(), nullable=False),
+        sa.Column("event_count", sa.Integer(), nullable=False),
+        sa.Column("counts_by_source", sa.JSON(), nullable=True),
+        sa.Column("counts_by_event_type", sa.JSON(), nullable=True),
+        sa.Column("flags", sa.Integer(), nullable=False),
+        sa.Column("phase", sa.String(), nullable=False),
+        sa.Column("first_timestamp", sa.DateTime(), nullable=True),
+        sa.Column("last_timestamp", sa.DateTime(), nullable=True),
+        sa.Column("first_error_at", sa.DateTime(), nullable=True),
+        sa.Column("first_alert_at", sa.DateTime(), nullable=True),
+        sa.Column("first_recovery_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["incident_id"], ["incidents.id"]),
+        sa.PrimaryKeyConstraint("incident_id", "bucket_size", "bucket_start"),
+    )
+
+def downgrade():
+    op.drop_table("replay_buckets")
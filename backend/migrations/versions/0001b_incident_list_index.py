@@ -0,0 +1,25 @@
+"""Keyset pagination index on the incident list
+
+Created only if missing, for the same reason as 0001a.
+
+Revision ID: 0001b
+Revises: 0001a
+Create Date: 2024-05-10 12:00:00
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0001b"
+down_revision = "0001a"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    if not context.is_offline_mode():
+        existing = {index["name"] for index in sa.inspect(op.get_bind()).get_indexes("incidents")}
+        if "ix_incidents_created_at_id" in existing:
+            return
+    op.create_index("ix_incidents_created_at_id", "incidents", ["created_at", "id"])
+
+def downgrade():
+    op.drop_index("ix_incidents_created_at_id", table_name="incidents")
@@ -0,0 +1,28 @@
+"""Composite event indexes for keyset pagination and filtered event queries
+
+The single-column incident_id index is superseded by the
+(incident_id, timestamp, id) index, which shares its prefix.
+
+Revision ID: 0002
+Revises: 0001b
+Create Date: 2024-05-10 12:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001b"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index("ix_events_incident_timestamp_id", "events", ["incident_id", "timestamp", "id"])
+    op.create_index("ix_events_incident_event_type_timestamp", "events", ["incident_id", "event_type", "timestamp"])
+    op.create_index("ix_events_incident_resource_timestamp", "events", ["incident_id", "resource_id", "timestamp"])
+    op.drop_index("ix_events_incident_id", table_name="events")
+
+def downgrade():
+    op.create_index("ix_events_incident_id", "events", ["incident_id"])
+    op.drop_index("ix_events_incident_resource_timestamp", table_name="events")
+    op.drop_index("ix_events_incident_event_type_timestamp", table_name="events")
+    op.drop_index("ix_events_incident_timestamp_id", table_name="events")
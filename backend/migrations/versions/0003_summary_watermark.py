@@ -0,0 +1,23 @@
+"""Ingest watermark on incident summaries
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2024-05-10 12:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table("incident_summaries") as batch_op:
+        batch_op.add_column(sa.Column("source_event_count", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("source_last_event_at", sa.DateTime(), nullable=True))
+
+def downgrade():
+    with op.batch_alter_table("incident_summaries") as batch_op:
+        batch_op.drop_column("source_last_event_at")
+        batch_op.drop_column("source_event_count")
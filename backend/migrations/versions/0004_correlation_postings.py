@@ -0,0 +1,34 @@
+"""Cross-incident correlation postings
+
+Existing incidents can be indexed with `python -m app.services.correlation`.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2024-05-10 12:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "correlation_postings",
+        sa.Column("actor_id", sa.String(), nullable=False),
+        sa.Column("resource_id", sa.String(), nullable=False),
+        sa.Column("event_type", sa.String(), nullable=False),
+        sa.Column("incident_id", sa.String(), nullable=False),
+        sa.Column("first_seen", sa.DateTime(), nullable=False),
+        sa.Column("last_seen", sa.DateTime(), nullable=False),
+        sa.Column("occurrences", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["incident_id"], ["incidents.id"]),
+        sa.PrimaryKeyConstraint("actor_id", "resource_id", "event_type", "incident_id"),
+    )
+    op.create_index("ix_correlation_postings_incident_id", "correlation_postings", ["incident_id"])
+
+def downgrade():
+    op.drop_index("ix_correlation_postings_incident_id", table_name="correlation_postings")
+    op.drop_table("correlation_postings")
@@ -0,0 +1,27 @@
+"""Content hash and burst compaction columns on events
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2024-05-24 12:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table("events") as batch_op:
+        batch_op.add_column(sa.Column("content_hash", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("occurrences", sa.Integer(), server_default="1", nullable=False))
+        batch_op.add_column(sa.Column("last_timestamp", sa.DateTime(), nullable=True))
+        batch_op.create_index("ux_events_incident_content_hash", ["incident_id", "content_hash"], unique=True)
+
+def downgrade():
+    with op.batch_alter_table("events") as batch_op:
+        batch_op.drop_index("ux_events_incident_content_hash")
+        batch_op.drop_column("last_timestamp")
+        batch_op.drop_column("occurrences")
+        batch_op.drop_column("content_hash")
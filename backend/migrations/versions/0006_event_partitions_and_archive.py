@@ -0,0 +1,88 @@
+"""Monthly range partitions for events (Postgres) and incident archive columns
+
+On Postgres the events table is rebuilt as a table partitioned by month on
+`timestamp`, with a DEFAULT partition as a catch-all; new monthly partitions
+are created on demand at ingest (services/partitions.py). Unique indexes on a
+partitioned table must include the partition key, so the content-hash index
+gains `timestamp` on every backend. SQLite keeps a single events table.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2024-05-31 12:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+EVENT_INDEXES = (
+    ("ix_events_id", ["id"], False),
+    ("ix_events_timestamp", ["timestamp"], False),
+    ("ix_events_incident_timestamp_id", ["incident_id", "timestamp", "id"], False),
+    ("ix_events_incident_event_type_timestamp", ["incident_id", "event_type", "timestamp"], False),
+    ("ix_events_incident_resource_timestamp", ["incident_id", "resource_id", "timestamp"], False),
+)
+
+def _rebuild_events_postgres(partitioned: bool, content_hash_columns):
+    op.execute("ALTER TABLE events RENAME TO events_old")
+    for name, _, _ in EVENT_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    op.execute("DROP INDEX IF EXISTS ux_events_incident_content_hash")
+    op.execute("ALTER TABLE events_old DROP CONSTRAINT IF EXISTS events_pkey")
+    op.execute("ALTER TABLE events_old DROP CONSTRAINT IF EXISTS events_incident_id_fkey")
+
+    if partitioned:
+        op.execute('CREATE TABLE events (LIKE events_old INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")')
+        op.execute('ALTER TABLE events ADD CONSTRAINT events_pkey PRIMARY KEY (id, "timestamp")')
+        op.execute("CREATE TABLE events_default PARTITION OF events DEFAULT")
+        # One partition per month that already holds events
+        op.execute("""
+            DO $$
+            DECLARE month date;
+            BEGIN
+                FOR month IN SELECT DISTINCT date_trunc('month', "timestamp")::date FROM events_old LOOP
+                    EXECUTE format(
+                        'CREATE TABLE %I PARTITION OF events FOR VALUES FROM (%L) TO (%L)',
+                        'events_y' || to_char(month, 'YYYY') || 'm' || to_char(month, 'MM'),
+                        month, (month + interval '1 month')::date
+                    );
+                END LOOP;
+            END $$
+        """)
+    else:
+        op.execute("CREATE TABLE events (LIKE events_old INCLUDING DEFAULTS)")
+        op.execute("ALTER TABLE events ADD CONSTRAINT events_pkey PRIMARY KEY (id)")
+
+    op.execute("INSERT INTO events SELECT * FROM events_old")
+    op.execute("DROP TABLE events_old CASCADE")
+    op.create_foreign_key("events_incident_id_fkey", "events", "incidents", ["incident_id"], ["id"])
+    for name, columns, unique in EVENT_INDEXES:
+        op.create_index(name, "events", columns, unique=unique)
+    op.create_index("ux_events_incident_content_hash", "events", content_hash_columns, unique=True)
+
+def upgrade():
+    with op.batch_alter_table("incidents") as batch_op:
+        batch_op.add_column(sa.Column("archived_at", sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column("archive_path", sa.String(), nullable=True))
+
+    if op.get_bind().dialect.name == "postgresql":
+        _rebuild_events_postgres(True, ["incident_id", "content_hash", "timestamp"])
+        return
+    with op.batch_alter_table("events") as batch_op:
+        batch_op.drop_index("ux_events_incident_content_hash")
+        batch_op.create_index("ux_events_incident_content_hash", ["incident_id", "content_hash", "timestamp"], unique=True)
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        _rebuild_events_postgres(False, ["incident_id", "content_hash"])
+    else:
+        with op.batch_alter_table("events") as batch_op:
+            batch_op.drop_index("ux_events_incident_content_hash")
+            batch_op.create_index("ux_events_incident_content_hash", ["incident_id", "content_hash"], unique=True)
+
+    with op.batch_alter_table("incidents") as batch_op:
+        batch_op.drop_column("archive_path")
+        batch_op.drop_column("archived_at")
@@ -0,0 +1,23 @@
+"""Detection key on auto-detected incidents
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2024-06-07 12:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table("incidents") as batch_op:
+        batch_op.add_column(sa.Column("detection_key", sa.String(), nullable=True))
+        batch_op.create_index("ix_incidents_detection_key_status", ["detection_key", "status"])
+
+def downgrade():
+    with op.batch_alter_table("incidents") as batch_op:
+        batch_op.drop_index("ix_incidents_detection_key_status")
+        batch_op.drop_column("detection_key")
@@ -0,0 +1,63 @@
+"""Full-text search index over events; JSONB event metadata on Postgres
+
+SQLite: an external-content FTS5 table over message, event_type,
+resource_id and event_metadata, kept in sync by triggers and backfilled with
+a rebuild. Postgres: event_metadata becomes JSONB, with a generated tsvector
+column, a GIN index on it and a GIN (jsonb_path_ops) index on the metadata.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2024-06-14 12:00:00
+"""
+from alembic import op
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+SEARCH_COLUMNS = "message, event_type, resource_id, event_metadata"
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("ALTER TABLE events ALTER COLUMN event_metadata TYPE JSONB USING event_metadata::jsonb")
+        op.execute("""
+            ALTER TABLE events ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                to_tsvector('simple', coalesce(message, '') || ' ' || event_type || ' ' || coalesce(resource_id, '') || ' ' || coalesce(event_metadata::text, ''))
+            ) STORED
+        """)
+        op.execute("CREATE INDEX ix_events_search_vector ON events USING gin (search_vector)")
+        op.execute("CREATE INDEX ix_events_metadata ON events USING gin (event_metadata jsonb_path_ops)")
+        return
+
+    op.execute(f"CREATE VIRTUAL TABLE events_fts USING fts5({SEARCH_COLUMNS}, content='events', content_rowid='rowid')")
+    op.execute(f"""
+        CREATE TRIGGER events_fts_insert AFTER INSERT ON events BEGIN
+            INSERT INTO events_fts(rowid, {SEARCH_COLUMNS}) VALUES (new.rowid, new.message, new.event_type, new.resource_id, new.event_metadata);
+        END
+    """)
+    op.execute(f"""
+        CREATE TRIGGER events_fts_delete AFTER DELETE ON events BEGIN
+            INSERT INTO events_fts(events_fts, rowid, {SEARCH_COLUMNS}) VALUES ('delete', old.rowid, old.message, old.event_type, old.resource_id, old.event_metadata);
+        END
+    """)
+    op.execute(f"""
+        CREATE TRIGGER events_fts_update AFTER UPDATE OF {SEARCH_COLUMNS} ON events BEGIN
+            INSERT INTO events_fts(events_fts, rowid, {SEARCH_COLUMNS}) VALUES ('delete', old.rowid, old.message, old.event_type, old.resource_id, old.event_metadata);
+            INSERT INTO events_fts(rowid, {SEARCH_COLUMNS}) VALUES (new.rowid, new.message, new.event_type, new.resource_id, new.event_metadata);
+        END
+    """)
+    # Index the existing events
+    op.execute("INSERT INTO events_fts(events_fts) VALUES ('rebuild')")
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_events_metadata")
+        op.execute("DROP INDEX IF EXISTS ix_events_search_vector")
+        op.execute("ALTER TABLE events DROP COLUMN IF EXISTS search_vector")
+        op.execute("ALTER TABLE events ALTER COLUMN event_metadata TYPE JSON USING event_metadata::json")
+        return
+
+    for trigger in ("events_fts_insert", "events_fts_delete", "events_fts_update"):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS events_fts")
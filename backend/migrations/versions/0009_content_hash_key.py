@@ -0,0 +1,41 @@
+"""Content-hash unique index without timestamp
+
+0006 added `timestamp` to the content-hash index on every backend. Content
+hashes already cover the event timestamp, and a compacted burst row's
+timestamp moves as earlier events merge into it, so outside Postgres the
+index goes back to (incident_id, content_hash). Postgres keeps the 0006 index
+because unique indexes on its partitioned events table must contain the
+partition key. Rows that share a hash (possible only under the old key) keep
+it on the earliest-id row and have it cleared on the rest, which are then just
+never merged into.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2024-06-21 12:00:00
+"""
+from alembic import op
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        return
+    op.execute("""
+        UPDATE events SET content_hash = NULL
+        WHERE content_hash IS NOT NULL AND id NOT IN (
+            SELECT MIN(id) FROM events WHERE content_hash IS NOT NULL GROUP BY incident_id, content_hash
+        )
+    """)
+    with op.batch_alter_table("events") as batch_op:
+        batch_op.drop_index("ux_events_incident_content_hash")
+        batch_op.create_index("ux_events_incident_content_hash", ["incident_id", "content_hash"], unique=True)
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        return
+    with op.batch_alter_table("events") as batch_op:
+        batch_op.drop_index("ux_events_incident_content_hash")
+        batch_op.create_index("ux_events_incident_content_hash", ["incident_id", "content_hash", "timestamp"], unique=True)
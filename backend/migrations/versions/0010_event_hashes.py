@@ -0,0 +1,40 @@
+"""Ledger of ingested content and burst hashes
+
+Deduplication and compaction claim hashes here instead of looking them up on
+events: compaction keeps the per-event content hashes it folds into a burst,
+so a re-delivered batch stays a no-op, and the ledger's key is the same on
+Postgres, where the events content-hash index also holds the partition key.
+Existing hashed rows are copied over; the events of bursts compacted before
+this revision are not known individually.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2024-06-28 12:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "event_hashes",
+        sa.Column("incident_id", sa.String(), nullable=False),
+        sa.Column("content_hash", sa.String(), nullable=False),
+        sa.Column("event_id", sa.String(), nullable=True),
+        sa.Column("timestamp", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["incident_id"], ["incidents.id"]),
+        sa.PrimaryKeyConstraint("incident_id", "content_hash"),
+    )
+    op.execute("""
+        INSERT INTO event_hashes (incident_id, content_hash, event_id, timestamp)
+        SELECT incident_id, content_hash, id, timestamp FROM events
+        WHERE content_hash IS NOT NULL AND incident_id IS NOT NULL
+        ON CONFLICT DO NOTHING
+    """)
+
+def downgrade():
+    op.drop_table("event_hashes")
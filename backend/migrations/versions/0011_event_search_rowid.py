@@ -0,0 +1,81 @@
+"""Key the SQLite full-text index on an explicit integer column
+
+0008 keyed the external-content FTS5 table on the implicit rowid of events,
+whose primary key is a String; VACUUM and batch migrations that recreate the
+table may renumber it, after which searches join to the wrong events. Events
+get a search_rowid column (unique, assigned by the insert trigger), backfilled
+from the current rowids, and the FTS5 table and its triggers are recreated on
+it and rebuilt. Postgres is unchanged.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2024-07-05 12:00:00
+"""
+from alembic import op
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+SEARCH_COLUMNS = "message, event_type, resource_id, event_metadata"
+TRIGGERS = ("events_fts_insert", "events_fts_delete", "events_fts_update")
+
+def _drop_index():
+    for trigger in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS events_fts")
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        return
+    _drop_index()
+    op.execute("ALTER TABLE events ADD COLUMN search_rowid INTEGER")
+    op.execute("UPDATE events SET search_rowid = rowid")
+    op.execute("CREATE UNIQUE INDEX ux_events_search_rowid ON events (search_rowid)")
+
+    op.execute(f"CREATE VIRTUAL TABLE events_fts USING fts5({SEARCH_COLUMNS}, content='events', content_rowid='search_rowid')")
+    op.execute(f"""
+        CREATE TRIGGER events_fts_insert AFTER INSERT ON events BEGIN
+            UPDATE events SET search_rowid = (SELECT coalesce(max(search_rowid), 0) + 1 FROM events) WHERE rowid = new.rowid;
+            INSERT INTO events_fts(rowid, {SEARCH_COLUMNS}) SELECT search_rowid, {SEARCH_COLUMNS} FROM events WHERE rowid = new.rowid;
+        END
+    """)
+    op.execute(f"""
+        CREATE TRIGGER events_fts_delete AFTER DELETE ON events BEGIN
+            INSERT INTO events_fts(events_fts, rowid, {SEARCH_COLUMNS}) VALUES ('delete', old.search_rowid, old.message, old.event_type, old.resource_id, old.event_metadata);
+        END
+    """)
+    op.execute(f"""
+        CREATE TRIGGER events_fts_update AFTER UPDATE OF {SEARCH_COLUMNS} ON events BEGIN
+            INSERT INTO events_fts(events_fts, rowid, {SEARCH_COLUMNS}) VALUES ('delete', old.search_rowid, old.message, old.event_type, old.resource_id, old.event_metadata);
+            INSERT INTO events_fts(rowid, {SEARCH_COLUMNS}) VALUES (new.search_rowid, new.message, new.event_type, new.resource_id, new.event_metadata);
+        END
+    """)
+    op.execute("INSERT INTO events_fts(events_fts) VALUES ('rebuild')")
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        return
+    _drop_index()
+    op.execute("DROP INDEX IF EXISTS ux_events_search_rowid")
+    op.execute("ALTER TABLE events DROP COLUMN search_rowid")
+
+    op.execute(f"CREATE VIRTUAL TABLE events_fts USING fts5({SEARCH_COLUMNS}, content='events', content_rowid='rowid')")
+    op.execute(f"""
+        CREATE TRIGGER events_fts_insert AFTER INSERT ON events BEGIN
+            INSERT INTO events_fts(rowid, {SEARCH_COLUMNS}) VALUES (new.rowid, new.message, new.event_type, new.resource_id, new.event_metadata);
+        END
+    """)
+    op.execute(f"""
+        CREATE TRIGGER events_fts_delete AFTER DELETE ON events BEGIN
+            INSERT INTO events_fts(events_fts, rowid, {SEARCH_COLUMNS}) VALUES ('delete', old.rowid, old.message, old.event_type, old.resource_id, old.event_metadata);
+        END
+    """)
+    op.execute(f"""
+        CREATE TRIGGER events_fts_update AFTER UPDATE OF {SEARCH_COLUMNS} ON events BEGIN
+            INSERT INTO events_fts(events_fts, rowid, {SEARCH_COLUMNS}) VALUES ('delete', old.rowid, old.message, old.event_type, old.resource_id, old.event_metadata);
+            INSERT INTO events_fts(rowid, {SEARCH_COLUMNS}) VALUES (new.rowid, new.message, new.event_type, new.resource_id, new.event_metadata);
+        END
+    """)
+    op.execute("INSERT INTO events_fts(events_fts) VALUES ('rebuild')")
@@ -0,0 +1,43 @@
+import os
+import tempfile
+
+# The engines and services read their settings at import time, so point them
+# at a scratch database and directories before anything imports the app
+_scratch = tempfile.mkdtemp(prefix="ifr-tests-")
+os.environ["SYNC_DATABASE_URL"] = f"sqlite:///{_scratch}/test.db"
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_scratch}/test.db"
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ["ARCHIVE_DIR"] = os.path.join(_scratch, "archive")
+os.environ["EXPORT_DIR"] = os.path.join(_scratch, "exports")
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database import Base, SessionLocal, engine, run_migrations
+from app.main import app
+
+@pytest.fixture(scope="session", autouse=True)
+def migrated():
+    run_migrations()
+
+@pytest.fixture(autouse=True)
+def empty_tables(migrated):
+    # Every test starts from empty tables; in-process caches are keyed by
+    # incident id, so fresh incidents never see another test's entries
+    yield
+    with engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.execute(table.delete())
+
+@pytest.fixture
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,64 @@
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import replay
+
+START = datetime(2024, 5, 10, 12, 0, 0)
+EVENT_TYPES = ["deploy_started", "config_change", "pod_crash", "error_rate_spike", "alert_fired", "rollback", "recovery", "heartbeat"]
+
+def make_events(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [
+        SimpleNamespace(
+            id=str(i), incident_id="inc", timestamp=START + timedelta(seconds=rng.uniform(0, 7200)),
+            source_type=rng.choice(["k8s", "app", "cicd"]), event_type=rng.choice(EVENT_TYPES),
+            actor_type=None, actor_id=None, resource_id=None, message=None, event_metadata=None,
+            occurrences=1, last_timestamp=None,
+        )
+        for i in range(count)
+    ]
+
+def reference_buckets(events, bucket_seconds):
+    # One dict entry per non-empty bucket, computed independently of the engine
+    buckets = {}
+    for e in events:
+        start = replay.bucket_floor(e.timestamp, bucket_seconds)
+        bucket = buckets.setdefault(start, {"count": 0, "flags": 0, "sources": {}})
+        bucket["count"] += 1
+        bucket["flags"] |= replay.classify_event_type(e.event_type)
+        bucket["sources"][e.source_type] = bucket["sources"].get(e.source_type, 0) + 1
+    return [
+        (start, b["count"], replay.phase_for_flags(b["flags"]), b["sources"])
+        for start, b in sorted(buckets.items())
+    ]
+
+@pytest.mark.parametrize("bucket_seconds", [1, 60, 300, 3600])
+def test_buckets_match_reference(bucket_seconds):
+    events = make_events(2000)
+    response = replay.generate_replay(SimpleNamespace(id="inc"), events, bucket_seconds=bucket_seconds)
+    assert [(b.timestamp_start, b.event_count, b.phase, b.counts_by_source) for b in response.buckets] == reference_buckets(events, bucket_seconds)
+    assert all(b.timestamp_end - b.timestamp_start == timedelta(seconds=bucket_seconds) for b in response.buckets)
+
+def test_gaps_are_not_materialized_and_input_order_does_not_matter():
+    events = make_events(50)
+    # A month-long gap costs nothing: only the two occupied buckets come back
+    late = SimpleNamespace(**{**vars(events[0]), "id": "late", "timestamp": START + timedelta(days=30)})
+    shuffled = events + [late]
+    random.Random(1).shuffle(shuffled)
+    response = replay.generate_replay(SimpleNamespace(id="inc"), shuffled, bucket_seconds=86400)
+    assert [b.event_count for b in response.buckets] == [50, 1]
+    assert [e.timestamp for e in response.buckets[0].events] == sorted(e.timestamp for e in events)
+
+def test_sampling_and_markers():
+    events = make_events(500)
+    response = replay.generate_replay(SimpleNamespace(id="inc"), events, bucket_seconds=600, max_events_per_bucket=3)
+    assert all(len(b.events) == min(3, b.event_count) for b in response.buckets)
+    assert all(b.truncated == (b.event_count > 3) for b in response.buckets)
+
+    def first(flags):
+        return min(e.timestamp for e in events if replay.classify_event_type(e.event_type) & flags)
+    expected = replay.compute_mttd_mttr(first(replay.ERROR | replay.CRASH), first(replay.ALERT), first(replay.RECOVERY | replay.RESOLVE))
+    assert (response.mttd_minutes, response.mttr_minutes) == expected
@@ -0,0 +1,77 @@
+import random
+import threading
+from datetime import datetime, timedelta
+
+from app import models, schemas
+from app.database import SessionLocal
+from app.services import correlation
+
+START = datetime(2024, 3, 1, 9, 0, 0)
+
+def change(seconds: int, actor_id: str = "deployer", resource_id: str = "checkout", event_type: str = "config_change"):
+    return schemas.EventCreate(
+        timestamp=START + timedelta(seconds=seconds), source_type="cicd", event_type=event_type,
+        actor_type="human", actor_id=actor_id, resource_id=resource_id,
+    )
+
+def postings(db, incident_id):
+    posting = models.CorrelationPosting
+    rows = db.query(posting).filter(posting.incident_id == incident_id).order_by(posting.actor_id, posting.resource_id, posting.event_type)
+    return [(p.actor_id, p.resource_id, p.event_type, p.first_seen, p.last_seen, p.occurrences) for p in rows]
+
+def test_concurrent_writers_add_up(client, db):
+    # Writers on their own sessions fold into the same postings at once; the
+    # upsert must neither lose occurrences nor fail on a posting just created
+    incident_id = client.post("/api/incidents", json={"title": "concurrent postings"}).json()["id"]
+    rng = random.Random(5)
+    batches = [
+        [change(rng.randint(0, 3600), rng.choice(["deployer", "bot"]), rng.choice(["checkout", "search", None])) for _ in range(100)]
+        for _ in range(8)
+    ]
+    barrier = threading.Barrier(len(batches))
+    errors = []
+
+    def write(batch):
+        session = SessionLocal()
+        try:
+            barrier.wait()
+            correlation.apply_events(session, incident_id, batch)
+            session.commit()
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=write, args=(batch,)) for batch in batches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+    written = postings(db, incident_id)
+    assert sum(p[-1] for p in written) == 800
+    # The same events folded by one writer, left uncommitted
+    correlation.apply_events(db, "reference", [e for batch in batches for e in batch])
+    assert written == postings(db, "reference")
+    db.rollback()
+
+def test_incident_correlations_match_lookups(client, db):
+    ids = [client.post("/api/incidents", json={"title": f"incident {n}"}).json()["id"] for n in range(6)]
+    for n, incident_id in enumerate(ids):
+        events = [change(n * 60), change(n * 60 + 5, "bot", "search", "deploy_started")]
+        if n % 2:
+            events.append(change(n * 60 + 9, "deployer", "search", "feature_flag_change"))
+        correlation.apply_events(db, incident_id, events)
+    db.commit()
+
+    types = ["config_change", "deploy_started", "feature_flag_change"]
+    batched = correlation.incident_correlations(db, ids[1], types, limit=2)
+    expected = [
+        correlation.lookup(db, actor_id, resource_id, event_type, exclude_incident_id=ids[1], limit=2)
+        for actor_id, resource_id, event_type in [("deployer", "checkout", "config_change"), ("bot", "search", "deploy_started"), ("deployer", "search", "feature_flag_change")]
+    ]
+    key = lambda r: (r["actor_id"], r["resource_id"], r["event_type"])
+    assert sorted(batched, key=key) == sorted(expected, key=key)
+    assert [r["total"] for r in batched] == [5, 5, 2]
+    assert all(len(r["matches"]) == 2 for r in batched)
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from app import models
+from app.main import app
+from app.services import detection, ingest
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+@pytest.fixture(autouse=True)
+def detector(monkeypatch):
+    # A fresh detector per test; the module-level one would remember other tests' incidents
+    fresh = detection.Detector()
+    monkeypatch.setattr(detection, "detector", fresh)
+    return fresh
+
+def event(seconds: int, event_type: str, service: str = "checkout"):
+    return {
+        "timestamp": (START + timedelta(seconds=seconds)).isoformat(),
+        "source_type": "monitoring",
+        "event_type": event_type,
+        "resource_id": service,
+        "message": f"{event_type} on {service}",
+    }
+
+def test_alert_opens_and_recovery_resolves(client, db):
+    lookback = [event(i, "deploy_started") for i in range(3)]
+    response = client.post("/api/events/bulk", json=lookback + [event(10, "alert_fired")])
+    assert response.status_code == 200
+    opened = response.json()["opened"]
+    assert len(opened) == 1
+
+    incident = db.get(models.Incident, opened[0])
+    assert incident.status == "open"
+    assert incident.detection_key == "checkout"
+    assert db.query(models.Event).filter(models.Event.incident_id == incident.id).count() == 4
+
+    # Other services stay out of the incident; the service's next events join it until recovery
+    response = client.post("/api/events/bulk", json=[event(20, "request_error"), event(25, "deploy_started", "search"), event(30, "service_recovered")])
+    assert response.json()["resolved"] == [incident.id]
+    db.expire_all()
+    assert db.get(models.Incident, incident.id).status == "resolved"
+    assert db.get(models.Incident, incident.id).end_time == START + timedelta(seconds=30)
+    assert db.query(models.Event).filter(models.Event.incident_id == incident.id).count() == 6
+
+def test_error_threshold_opens(client):
+    errors = [event(i, "request_error") for i in range(detection.DETECT_ERROR_THRESHOLD)]
+    response = client.post("/api/events/bulk", json=errors[:-1])
+    assert response.json()["opened"] == []
+    response = client.post("/api/events/bulk", json=errors[-1:])
+    assert len(response.json()["opened"]) == 1
+
+def test_failed_apply_leaves_no_phantom_incident(client, db, detector, monkeypatch):
+    # The alert batch fails before anything is committed: the service must not
+    # stay attached to the incident that was never created
+    apply = detector.apply
+    def failing_apply(db, changes):
+        raise RuntimeError("database unavailable")
+    monkeypatch.setattr(detector, "apply", failing_apply)
+    with pytest.raises(RuntimeError):
+        client.post("/api/events/bulk", json=[event(0, "deploy_started"), event(10, "alert_fired")])
+    assert detector.stats()["open_incidents"] == 0
+
+    # Redelivered, the alert opens the incident
+    monkeypatch.setattr(detector, "apply", apply)
+    response = client.post("/api/events/bulk", json=[event(10, "alert_fired")])
+    assert len(response.json()["opened"]) == 1
+    assert db.query(models.Incident).filter(models.Incident.detection_key == "checkout").count() == 1
+
+def test_failed_resolve_keeps_incident_attached(client, db, detector, monkeypatch):
+    opened = client.post("/api/events/bulk", json=[event(0, "alert_fired")]).json()["opened"]
+
+    # Attaching the recovery fails, so the incident is not resolved and keeps the service
+    write_batch = ingest.write_batch
+    def failing_write_batch(*args, **kwargs):
+        raise RuntimeError("database unavailable")
+    monkeypatch.setattr(ingest, "write_batch", failing_write_batch)
+    with pytest.raises(RuntimeError):
+        client.post("/api/events/bulk", json=[event(20, "service_recovered")])
+    assert detector.windows["checkout"].incident_id == opened[0]
+
+    monkeypatch.setattr(ingest, "write_batch", write_batch)
+    assert client.post("/api/events/bulk", json=[event(20, "service_recovered")]).json()["resolved"] == opened
+    db.expire_all()
+    assert db.get(models.Incident, opened[0]).status == "resolved"
+
+def test_concurrent_bulk_requests(db):
+    # Every request opens an incident for its own service and feeds a shared one;
+    # the requests must all complete (the detector used to deadlock the event loop)
+    requests = 8
+    bodies = [
+        [event(i, "alert_fired", f"svc-{n}"), event(i + 1, "request_error", f"svc-{n}"), event(i, "heartbeat", "shared")]
+        for n, i in enumerate(range(0, requests * 10, 10))
+    ]
+    results = []
+
+    async def post_all():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            responses = await asyncio.gather(*(http.post("/api/events/bulk", json=body) for body in bodies))
+        results.extend(responses)
+
+    worker = threading.Thread(target=asyncio.run, args=(post_all(),), daemon=True)
+    worker.start()
+    worker.join(timeout=30)
+    assert not worker.is_alive(), "concurrent bulk requests did not complete"
+
+    assert [r.status_code for r in results] == [200] * requests
+    assert sum(len(r.json()["opened"]) for r in results) == requests
+    assert sum(r.json()["attached"] for r in results) == requests * 2
+    assert db.query(models.Incident).filter(models.Incident.detection_key.isnot(None)).count() == requests
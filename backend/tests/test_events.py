@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+
+from app import models
+
+def test_event_pages_follow_timestamp_then_id(client, db):
+    incident_id = client.post("/api/incidents", json={"title": "paged"}).json()["id"]
+    base = datetime(2024, 5, 10, 12, 0, 0)
+    events = [
+        {"timestamp": (base + timedelta(seconds=i // 4)).isoformat(), "source_type": "app" if i % 3 else "k8s", "event_type": f"e{i}"}
+        for i in range(30)
+    ]
+    assert client.post(f"/api/incidents/{incident_id}/events/bulk", json=events).status_code == 200
+    rows = db.query(models.Event).filter_by(incident_id=incident_id).order_by(models.Event.timestamp, models.Event.id).all()
+
+    for params, expected in (
+        ({}, [e.id for e in rows]),
+        ({"source_type": "app"}, [e.id for e in rows if e.source_type == "app"]),
+    ):
+        seen, cursor = [], None
+        while True:
+            page = client.get(f"/api/incidents/{incident_id}/events", params={"limit": 4, **params, **({"cursor": cursor} if cursor else {})}).json()
+            seen += [item["id"] for item in page["items"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == expected
+
+def test_invalid_event_cursor_is_rejected(client):
+    incident_id = client.post("/api/incidents", json={"title": "paged"}).json()["id"]
+    assert client.get(f"/api/incidents/{incident_id}/events", params={"cursor": "not-a-cursor"}).status_code == 400
@@ -0,0 +1,63 @@
+import csv
+import gzip
+import io
+import json
+import os
+import time
+
+
+def create_incident(client):
+    incident_id = client.post("/api/demo").json()["incident_id"]
+    event_count = len(client.get(f"/api/incidents/{incident_id}/events").json()["items"])
+    return incident_id, event_count
+
+def test_ndjson_export_frames_the_events(client):
+    incident_id, event_count = create_incident(client)
+    response = client.get(f"/api/incidents/{incident_id}/export", params={"format": "ndjson"})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["type"] for line in lines] == ["incident"] + ["event"] * event_count + ["summary"]
+    timestamps = [line["timestamp"] for line in lines[1:-1]]
+    assert timestamps == sorted(timestamps)
+
+def test_csv_export_has_one_row_per_event(client):
+    incident_id, event_count = create_incident(client)
+    rows = list(csv.reader(io.StringIO(client.get(f"/api/incidents/{incident_id}/export", params={"format": "csv"}).text)))
+    assert rows[0][:3] == ["timestamp", "source_type", "event_type"]
+    assert len(rows) == event_count + 1
+
+def test_report_export(client):
+    incident_id, _ = create_incident(client)
+    client.post(f"/api/incidents/{incident_id}/summarize")
+    report = client.get(f"/api/incidents/{incident_id}/export").json()
+    assert report["incident_id"] == incident_id
+    assert report["summary"]["root_cause"] != "Not generated"
+    assert client.get("/api/incidents/missing/export").status_code == 404
+
+def test_parquet_export(client, tmp_path):
+    incident_id, event_count = create_incident(client)
+    response = client.get(f"/api/incidents/{incident_id}/export", params={"format": "parquet"})
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        assert response.status_code == 501
+        return
+    path = tmp_path / "export.parquet"
+    path.write_bytes(response.content)
+    table = pq.read_table(path)
+    assert table.num_rows == event_count
+    assert json.loads(table.schema.metadata[b"incident"])["id"] == incident_id
+
+def test_batch_export_writes_one_file_per_incident(client):
+    incidents = dict(create_incident(client) for _ in range(3))
+    batch = client.post("/api/exports", json={"format": "ndjson", "incident_ids": list(incidents)}).json()
+    assert batch["incident_count"] == 3
+
+    deadline = time.monotonic() + 60
+    while batch["status"] == "running" and time.monotonic() < deadline:
+        time.sleep(0.2)
+        batch = client.get(f"/api/exports/{batch['id']}").json()
+    assert batch["status"] == "succeeded"
+    for incident_id, event_count in incidents.items():
+        with gzip.open(os.path.join(batch["directory"], f"{incident_id}.ndjson.gz")) as f:
+            assert len(f.read().splitlines()) == event_count + 2
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+from app import models
+
+def test_incident_list_pages_cover_every_incident_once(client, db):
+    # Ties on created_at are broken by id, so equal timestamps never drop or repeat an item
+    tied = datetime(2024, 5, 10, 12, 0, 0)
+    for i in range(12):
+        created_at = tied if i < 7 else tied + timedelta(minutes=i)
+        db.add(models.Incident(title=f"incident {i}", created_at=created_at))
+    db.commit()
+    expected = [incident.id for incident in db.query(models.Incident).order_by(models.Incident.created_at.desc(), models.Incident.id.desc())]
+
+    seen, cursor = [], None
+    while True:
+        page = client.get("/api/incidents", params={"limit": 5, **({"cursor": cursor} if cursor else {})}).json()
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+
+def test_invalid_cursor_is_rejected(client):
+    assert client.get("/api/incidents", params={"cursor": "not-a-cursor"}).status_code == 400
+
+def test_list_stats_come_from_the_rollup_or_the_events(client, db):
+    def create(title, count):
+        incident_id = client.post("/api/incidents", json={"title": title}).json()["id"]
+        if count:
+            client.post(f"/api/incidents/{incident_id}/events/bulk", json=[
+                {"timestamp": (base + timedelta(hours=i * 7)).isoformat(), "source_type": "app", "event_type": "request_error"}
+                for i in range(count)
+            ])
+        return incident_id
+
+    base = datetime(2024, 5, 10, 12, 0, 0)
+    rolled_up, not_backfilled, empty = create("rolled up", 9), create("not backfilled", 4), create("empty", 0)
+    # As if ingested before the rollup pyramid existed
+    db.query(models.ReplayBucket).filter_by(incident_id=not_backfilled).delete()
+    db.commit()
+
+    items = {item["id"]: item for item in client.get("/api/incidents").json()["items"]}
+    last = lambda count: (base + timedelta(hours=(count - 1) * 7)).isoformat()
+    assert (items[rolled_up]["event_count"], items[rolled_up]["first_event_at"], items[rolled_up]["last_event_at"]) == (9, base.isoformat(), last(9))
+    assert (items[not_backfilled]["event_count"], items[not_backfilled]["first_event_at"], items[not_backfilled]["last_event_at"]) == (4, base.isoformat(), last(4))
+    assert (items[empty]["event_count"], items[empty]["first_event_at"], items[empty]["last_event_at"]) == (0, None, None)
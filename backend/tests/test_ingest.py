@@ -0,0 +1,139 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from app import models
+from app.main import app
+from app.services import rollups
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+@pytest.fixture
+def incident_id(client):
+    response = client.post("/api/incidents", json={"title": "Checkout errors", "environment": "prod", "severity": 2, "start_time": START.isoformat()})
+    return response.json()["id"]
+
+def event(seconds: float, event_type: str = "request_error", resource_id: str = "checkout", message: str = "upstream timeout"):
+    return {
+        "timestamp": (START + timedelta(seconds=seconds)).isoformat(),
+        "source_type": "app",
+        "event_type": event_type,
+        "resource_id": resource_id,
+        "message": message,
+    }
+
+def stored(db, incident_id):
+    return db.query(models.Event).filter(models.Event.incident_id == incident_id).order_by(models.Event.timestamp).all()
+
+def assert_rollup_matches_rows(db, incident_id):
+    db.expire_all()
+    for size in (1, 60, 300):
+        loaded = [(b.bucket_start, b.event_count, b.first_timestamp) for b in rollups.load_buckets(db, incident_id, size)]
+        assert loaded == [(b.bucket_start, b.event_count, b.first_timestamp) for b in rollups.compute_buckets(db, incident_id, size)]
+
+def test_dedup_is_opt_in(client, db, incident_id):
+    batch = [event(0), event(1), event(1)]
+    assert client.post(f"/api/incidents/{incident_id}/events/bulk", json=batch).json()["count"] == 3
+    assert client.post(f"/api/incidents/{incident_id}/events/bulk", json=batch).json()["count"] == 3
+    assert len(stored(db, incident_id)) == 6
+
+def test_dedup_drops_redelivered_events(client, db, incident_id):
+    url = f"/api/incidents/{incident_id}/events/bulk"
+    first = client.post(url, params={"dedup": True}, json=[event(0), event(1), event(1)]).json()
+    assert (first["accepted"], first["duplicates"], first["inserted"]) == (2, 1, 2)
+
+    # A re-delivered batch is a no-op; only the new event lands
+    again = client.post(url, params={"dedup": True}, json=[event(0), event(1), event(2)]).json()
+    assert (again["accepted"], again["duplicates"], again["inserted"]) == (1, 2, 1)
+    assert len(stored(db, incident_id)) == 3
+
+def test_compaction_merges_bursts_across_requests(client, db, incident_id):
+    url = f"/api/incidents/{incident_id}/events/bulk"
+    first = client.post(url, params={"compact_window": 60}, json=[event(10), event(20), event(70), event(15, "deploy_started")]).json()
+    assert (first["accepted"], first["inserted"], first["merged"]) == (4, 3, 0)
+
+    # A later request folds into the stored bursts, including an earlier event of
+    # the window; the stored row keeps its timestamp and so its rollup bucket
+    second = client.post(url, params={"compact_window": 60}, json=[event(5), event(50), event(65)]).json()
+    assert (second["accepted"], second["inserted"], second["merged"]) == (3, 0, 2)
+
+    rows = [(r.event_type, r.timestamp, r.occurrences, r.last_timestamp) for r in stored(db, incident_id)]
+    assert rows == [
+        ("request_error", START + timedelta(seconds=10), 4, START + timedelta(seconds=50)),
+        ("deploy_started", START + timedelta(seconds=15), 1, START + timedelta(seconds=15)),
+        ("request_error", START + timedelta(seconds=70), 2, START + timedelta(seconds=70)),
+    ]
+
+    # Replay counts every occurrence of a compacted burst, and the rollup agrees with the rows
+    replay = client.get(f"/api/incidents/{incident_id}/replay", params={"bucket_size": 60}).json()
+    assert [b["event_count"] for b in replay["buckets"]] == [5, 2]
+    assert_rollup_matches_rows(db, incident_id)
+
+def test_compaction_is_idempotent(client, db, incident_id):
+    url = f"/api/incidents/{incident_id}/events/bulk"
+    batch = [event(10), event(20), event(25, message="pool exhausted"), event(70)]
+    first = client.post(url, params={"compact_window": 60}, json=batch).json()
+    assert (first["accepted"], first["inserted"], first["merged"]) == (4, 2, 0)
+
+    # Re-delivering folded events adds nothing; only the new one is merged
+    again = client.post(url, params={"compact_window": 60}, json=batch + [event(30)]).json()
+    assert (again["accepted"], again["duplicates"], again["inserted"], again["merged"]) == (1, 4, 0, 1)
+    assert [(r.timestamp, r.occurrences) for r in stored(db, incident_id)] == [
+        (START + timedelta(seconds=10), 4),
+        (START + timedelta(seconds=70), 1),
+    ]
+    assert_rollup_matches_rows(db, incident_id)
+
+def test_concurrent_compacting_deliveries(client, db, incident_id):
+    # The same bursts delivered by several requests at once: one request stores
+    # each event, the rest see duplicates, and none fails on the unique keys
+    url = f"/api/incidents/{incident_id}/events/bulk"
+    bodies = [[event(n * 7 + i) for i in range(20)] for n in range(6)]
+    results = []
+
+    async def run_all():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            requests = [http.post(url, params={"compact_window": 60}, json=body) for body in bodies + bodies]
+            results.extend(await asyncio.gather(*requests))
+
+    worker = threading.Thread(target=asyncio.run, args=(run_all(),), daemon=True)
+    worker.start()
+    worker.join(timeout=60)
+    assert not worker.is_alive(), "concurrent requests did not complete"
+
+    assert [r.status_code for r in results] == [200] * len(results)
+    distinct = {n * 7 + i for n in range(6) for i in range(20)}
+    assert sum(r.json()["accepted"] for r in results) == len(distinct)
+    rows = stored(db, incident_id)
+    assert sum(r.occurrences for r in rows) == len(distinct)
+    assert len(rows) == len({s // 60 for s in distinct})
+    assert_rollup_matches_rows(db, incident_id)
+
+def test_concurrent_ingest_and_replay(client, db, incident_id):
+    # Writes run on worker threads with their own sessions; interleaved
+    # requests to one incident must all land, and replays keep being served
+    url = f"/api/incidents/{incident_id}/events/bulk"
+    bodies = [[event(n * 100 + i, message=f"batch {n}") for i in range(50)] for n in range(8)]
+    results = []
+
+    async def run_all():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            requests = [http.post(url, json=body) for body in bodies]
+            requests += [http.get(f"/api/incidents/{incident_id}/replay", params={"max_events_per_bucket": 0}) for _ in range(4)]
+            results.extend(await asyncio.gather(*requests))
+
+    worker = threading.Thread(target=asyncio.run, args=(run_all(),), daemon=True)
+    worker.start()
+    worker.join(timeout=60)
+    assert not worker.is_alive(), "concurrent requests did not complete"
+
+    assert [r.status_code for r in results] == [200] * len(results)
+    assert sum(r.json()["count"] for r in results[:len(bodies)]) == 400
+    assert len(stored(db, incident_id)) == 400
+    replay = client.get(f"/api/incidents/{incident_id}/replay/overview").json()
+    assert sum(replay["counts_by_phase"].values()) == 400
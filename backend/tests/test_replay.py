@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+import pytest
+
+from app import models
+from app.services import demo_data, rollups
+from app.services.cache import cache as response_cache
+
+def bucket_counts(replay):
+    return [(b["timestamp_start"], b["event_count"], b["phase"], b["counts_by_source"]) for b in replay["buckets"]]
+
+@pytest.fixture
+def incident_id(db):
+    return demo_data.create_synthetic_incident(db, 3000, duration=timedelta(hours=3), bursts=2, burst_size=200).id
+
+def test_windowed_pages_add_up_to_the_full_replay(client, incident_id):
+    full = client.get(f"/api/incidents/{incident_id}/replay", params={"bucket_size": 300}).json()
+    buckets, cursor = [], None
+    while True:
+        params = {"bucket_size": 300, "max_buckets": 7, **({"cursor": cursor} if cursor else {})}
+        page = client.get(f"/api/incidents/{incident_id}/replay", params=params).json()
+        buckets += page["buckets"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert bucket_counts({"buckets": buckets}) == bucket_counts(full)
+
+def test_time_window_selects_whole_buckets(client, incident_id):
+    full = client.get(f"/api/incidents/{incident_id}/replay", params={"bucket_size": 300}).json()
+    start, end = full["buckets"][3]["timestamp_start"], full["buckets"][9]["timestamp_start"]
+    window = client.get(f"/api/incidents/{incident_id}/replay", params={"bucket_size": 300, "from": start, "to": end}).json()
+    assert bucket_counts(window) == bucket_counts({"buckets": full["buckets"][3:9]})
+    # Incident-wide markers, not the window's
+    assert (window["mttd_minutes"], window["mttr_minutes"]) == (full["mttd_minutes"], full["mttr_minutes"])
+
+def test_overview_zooms_down_to_seconds(client, incident_id):
+    overview = client.get(f"/api/incidents/{incident_id}/replay/overview", params={"target_buckets": 40}).json()
+    assert len(overview["buckets"]) <= 40
+    assert sum(overview["counts_by_phase"].values()) == sum(overview["counts_by_source"].values()) == 3000
+
+    sizes = [overview["bucket_size_seconds"]]
+    while sizes[-1] > 1:
+        bucket = max(overview["buckets"], key=lambda b: b["event_count"])
+        params = {"from": bucket["timestamp_start"], "to": bucket["timestamp_end"], "target_buckets": 40}
+        overview = client.get(f"/api/incidents/{incident_id}/replay/overview", params=params).json()
+        raw = client.get(f"/api/incidents/{incident_id}/replay", params={**params, "bucket_size": overview["bucket_size_seconds"]}).json()
+        # Each level is the raw bucketing of the zoomed window, and splits the parent bucket exactly
+        assert bucket_counts(overview) == bucket_counts(raw)
+        assert sum(b["event_count"] for b in overview["buckets"]) == bucket["event_count"]
+        assert overview["bucket_size_seconds"] < sizes[-1]
+        sizes.append(overview["bucket_size_seconds"])
+    assert sizes[-1] == 1
+
+def test_invalid_replay_cursor_is_rejected(client, incident_id):
+    assert client.get(f"/api/incidents/{incident_id}/replay", params={"cursor": "nope"}).status_code == 400
+
+def test_replay_without_backfilled_rollup_is_read_only(client, db, incident_id):
+    # An incident ingested before the pyramid: replays compute from the events and write nothing
+    paths = [
+        ("/replay", {"max_events_per_bucket": 0}),
+        ("/replay", {"bucket_size": 300, "max_events_per_bucket": 0}),
+        ("/replay/overview", {}),
+    ]
+    expected = [client.get(f"/api/incidents/{incident_id}{path}", params=params).json() for path, params in paths]
+    db.query(models.ReplayBucket).filter(models.ReplayBucket.incident_id == incident_id).delete()
+    db.commit()
+    response_cache.invalidate(incident_id)
+
+    assert rollups.incident_markers(db, incident_id)["rollup"] is False
+    assert [client.get(f"/api/incidents/{incident_id}{path}", params=params).json() for path, params in paths] == expected
+    assert db.query(models.ReplayBucket).count() == 0
+
+    # The backfill entry point picks the incident up once
+    assert rollups.missing_incidents(db) == [incident_id]
+    rollups.rebuild(db, incident_id)
+    db.commit()
+    assert rollups.missing_incidents(db) == []
+    assert rollups.incident_markers(db, incident_id)["rollup"] is True
+
+def stage_count(client, stage):
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith(f'ifr_stage_duration_seconds_count{{stage="{stage}"}}'):
+            return int(float(line.split()[-1]))
+    return 0
+
+@pytest.mark.parametrize("format", ["json", "columns"])
+def test_streamed_replay_reports_stage_timers(client, incident_id, format):
+    before = {stage: stage_count(client, stage) for stage in ("replay.bucketing", "replay.serialize")}
+    response = client.get(f"/api/incidents/{incident_id}/replay", params={"format": format})
+    assert response.status_code == 200
+    assert {stage: stage_count(client, stage) for stage in before} == {stage: count + 1 for stage, count in before.items()}
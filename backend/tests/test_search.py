@@ -0,0 +1,63 @@
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+
+from app import models
+from app.database import engine
+
+def search(client, **params):
+    response = client.get("/api/search", params=params)
+    assert response.status_code == 200
+    return [hit["message"] for hit in response.json()["items"]]
+
+def test_index_follows_inserts_updates_and_deletes(client, db):
+    incident_id = client.post("/api/incidents", json={"title": "search"}).json()["id"]
+    client.post(f"/api/incidents/{incident_id}/events/bulk", json=[
+        {"timestamp": "2024-05-10T12:00:00", "source_type": "k8s", "event_type": "pod_crash", "message": "OOMKilled checkout pod", "event_metadata": {"max_replicas": 10}},
+        {"timestamp": "2024-05-10T12:01:00", "source_type": "app", "event_type": "error_rate_spike", "message": "500 errors on cart"},
+    ])
+    assert search(client, q="oomkilled") == ["OOMKilled checkout pod"]
+    assert search(client, q="cart errors") == ["500 errors on cart"]
+    assert search(client, metadata='{"max_replicas": 10}') == ["OOMKilled checkout pod"]
+
+    event = db.query(models.Event).filter_by(event_type="error_rate_spike").one()
+    event.message = "latency on payments"
+    db.commit()
+    assert search(client, q="cart") == []
+    assert search(client, q="payments") == ["latency on payments"]
+
+    db.delete(event)
+    db.commit()
+    assert search(client, q="payments") == []
+
+def test_query_syntax_is_not_interpreted(client):
+    assert search(client, q='"!! OR') == []
+    assert client.get("/api/search").status_code == 400
+
+def test_search_after_vacuum_and_table_rebuild(client, db):
+    # VACUUM and batch migrations that copy the events table may renumber the
+    # implicit rowids of the String-keyed table; the index is keyed on
+    # search_rowid, so hits still join to the right events
+    incident_id = client.post("/api/incidents", json={"title": "vacuum"}).json()["id"]
+    client.post(f"/api/incidents/{incident_id}/events/bulk", json=[
+        {"timestamp": f"2024-05-10T12:00:{i:02d}", "source_type": "app", "event_type": "request_error", "message": f"error {i} on {'cart' if i % 3 else 'payments'}"}
+        for i in range(30)
+    ])
+    for event in db.query(models.Event).filter(models.Event.message.like("% on cart")).limit(10):
+        db.delete(event)
+    db.commit()
+    with engine.begin() as connection:
+        operations = Operations(MigrationContext.configure(connection))
+        with operations.batch_alter_table("events", recreate="always"):
+            pass
+        # Dropping the old table dropped its triggers
+        for statement in models.EVENT_SEARCH_DDL["sqlite"][2:]:
+            connection.exec_driver_sql(statement)
+    with engine.connect() as connection:
+        connection.execution_options(isolation_level="AUTOCOMMIT").exec_driver_sql("VACUUM")
+
+    assert sorted(search(client, q="payments")) == sorted(f"error {i} on payments" for i in range(0, 30, 3))
+    assert len(search(client, q="cart")) == 10
+    client.post(f"/api/incidents/{incident_id}/events/bulk", json=[
+        {"timestamp": "2024-05-10T12:01:00", "source_type": "app", "event_type": "request_error", "message": "timeout on payments"},
+    ])
+    assert search(client, q="timeout payments") == ["timeout on payments"]
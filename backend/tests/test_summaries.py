@@ -0,0 +1,20 @@
+import time
+
+def wait_for(client, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] not in ("pending", "running") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.1)
+
+def test_demo_summarizes_in_a_job(client):
+    demo = client.post("/api/demo").json()
+    job = wait_for(client, demo["summary_job_id"])
+    assert (job["status"], job["kind"], job["incident_id"]) == ("succeeded", "analysis", demo["incident_id"])
+    assert client.get(f"/api/incidents/{demo['incident_id']}").json()["summary"]["probable_root_cause"] == job["result"]["probable_root_cause"]
+
+    # A fresh summary is served without submitting another job
+    again = client.post(f"/api/incidents/{demo['incident_id']}/summarize/jobs")
+    assert again.status_code == 202
+    assert (again.json()["id"], again.json()["status"]) == ("cached", "succeeded")
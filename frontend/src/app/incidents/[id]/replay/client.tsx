@@ -236,6 +236,9 @@ export default function ReplayClient({ id }: { id: string }) {
                                     <div className="flex flex-col min-w-0 flex-1">
                                         <div className="flex items-center gap-2 flex-wrap">
                                             <span className={`font-semibold ${textColor}`}>{event.event_type}</span>
+                                            {event.occurrences > 1 && (
+                                                <span className="text-[10px] text-slate-400">×{event.occurrences}</span>
+                                            )}
                                             <span className="px-1.5 py-0.5 bg-slate-900 rounded text-[10px] text-slate-500 border border-slate-800">
                                                 {event.source_type}
                                             </span>
@@ -94,6 +94,7 @@ export default function Dashboard() {
                 </div>
                 <div className="border-t border-slate-800 p-4 bg-slate-900/50 group-hover:bg-slate-800/50 flex justify-between items-center text-xs text-slate-500 mt-auto shrink-0">
                   <span>Env: <span className="text-slate-300 font-medium">{incident.environment}</span></span>
+                  <span>{incident.event_count} events</span>
                   <span>{formatDistanceToNow(new Date(incident.start_time), { addSuffix: true })}</span>
                 </div>
               </div>
@@ -1,9 +1,11 @@
 export const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000/api";
 
-export async function fetchIncidents() {
-    const res = await fetch(`${API_BASE_URL}/incidents`, { cache: 'no-store' });
+export async function fetchIncidents(cursor?: string) {
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+    const res = await fetch(`${API_BASE_URL}/incidents${query}`, { cache: 'no-store' });
     if (!res.ok) throw new Error("Failed to fetch incidents");
-    return res.json();
+    const page = await res.json();
+    return page.items;
 }
 
 export async function fetchIncidentDetails(id: string) {
@@ -12,25 +14,91 @@ export async function fetchIncidentDetails(id: string) {
     return res.json();
 }
 
+const EVENT_PAGE_SIZE = 10000; // the endpoint's maximum
+
+// All of an incident's events, oldest first: follows next_cursor until the last page
 export async function fetchIncidentEvents(id: string) {
-    const res = await fetch(`${API_BASE_URL}/incidents/${id}/events`, { cache: 'no-store' });
-    if (!res.ok) throw new Error("Failed to fetch events");
-    return res.json();
+    const events: any[] = [];
+    let cursor: string | null = null;
+    do {
+        const query: string = cursor ? `&cursor=${encodeURIComponent(cursor)}` : '';
+        const res = await fetch(`${API_BASE_URL}/incidents/${id}/events?limit=${EVENT_PAGE_SIZE}${query}`, { cache: 'no-store' });
+        if (!res.ok) throw new Error("Failed to fetch events");
+        const page = await res.json();
+        events.push(...page.items);
+        cursor = page.next_cursor;
+    } while (cursor);
+    return events;
+}
+
+// Columnar payloads: one array per field, dictionary-encoded strings and
+// epoch-microsecond timestamps (see backend services/serialization.py).
+// Timestamps are decoded to the naive ISO strings the JSON responses use
+// (no "Z"), so they compare like incident.start_time/end_time.
+const microsToIso = (us: number | null) => {
+    if (us === null) return null;
+    const seconds = new Date(Math.floor(us / 1000)).toISOString().slice(0, 19);
+    const fraction = ((us % 1000000) + 1000000) % 1000000;
+    return fraction ? `${seconds}.${String(fraction).padStart(6, '0')}` : seconds;
+};
+
+export function decodeEventColumns(payload: any): any[] {
+    const { columns, dictionaries, count, incident_id } = payload;
+    const events = new Array(count);
+    for (let i = 0; i < count; i++) {
+        const event: any = { incident_id };
+        for (const field of Object.keys(columns)) {
+            const value = columns[field][i];
+            if (dictionaries[field]) event[field] = dictionaries[field][value];
+            else if (field === 'timestamp' || field === 'last_timestamp') event[field] = microsToIso(value);
+            else event[field] = value;
+        }
+        events[i] = event;
+    }
+    return events;
+}
+
+export function decodeReplayColumns(payload: any) {
+    const { buckets: columns, events: eventColumns, ...rest } = payload;
+    const events = decodeEventColumns(eventColumns);
+    const size = (payload.bucket_size_seconds || 0) * 1000000;
+    const buckets = columns.timestamp_start.map((start: number, i: number) => ({
+        timestamp_start: microsToIso(start),
+        timestamp_end: microsToIso(start + size),
+        events: events.slice(columns.event_offsets[i], columns.event_offsets[i + 1]),
+        phase: columns.phase[i],
+        event_count: columns.event_count[i],
+        counts_by_source: columns.counts_by_source[i],
+        truncated: columns.truncated[i],
+    }));
+    return { ...rest, buckets };
 }
 
 export async function fetchIncidentReplay(id: string) {
-    const res = await fetch(`${API_BASE_URL}/incidents/${id}/replay`, { cache: 'no-store' });
+    const res = await fetch(`${API_BASE_URL}/incidents/${id}/replay?format=columns`, { cache: 'no-store' });
     if (!res.ok) throw new Error("Failed to fetch replay data");
-    return res.json();
+    return decodeReplayColumns(await res.json());
 }
 
+const JOB_POLL_INTERVAL_MS = 1000;
+
+// Summaries are computed in the backend's worker pool: submit a job and poll it
+// until it finishes (a summary that is still fresh comes back already succeeded).
 export async function summarizeIncident(id: string) {
-    const res = await fetch(`${API_BASE_URL}/incidents/${id}/summarize`, {
+    const res = await fetch(`${API_BASE_URL}/incidents/${id}/summarize/jobs`, {
         method: 'POST',
         cache: 'no-store'
     });
     if (!res.ok) throw new Error("Failed to generate summary");
-    return res.json();
+    let job = await res.json();
+    while (job.status === 'pending' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+        const poll = await fetch(`${API_BASE_URL}/jobs/${job.id}`, { cache: 'no-store' });
+        if (!poll.ok) throw new Error("Failed to generate summary");
+        job = await poll.json();
+    }
+    if (job.status !== 'succeeded') throw new Error(job.error || "Failed to generate summary");
+    return job.result;
 }
 
 export async function generateDemoData() {